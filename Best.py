@@ -1,26 +1,19 @@
-import pandas as pd
-import heapq
-from collections import deque, defaultdict
 import time
-
-# Load dataset
-df = pd.read_csv('shinkansen.csv')
+from alternatives import k_shortest_paths
+from graph import load_graph
+from pareto import pareto_search
+from raptor import Timetable, earliest_arrival, format_time, parse_time
+from route_table import RouteTable, lookup_or_search
 
 # ------------------------------------------------------------------------------------
 #                                   CONSTRUCT GRAPH
 # ------------------------------------------------------------------------------------
 
-# Create a graph from the dataset
-graph = defaultdict(list)
-for _, row in df.iterrows():
-    source = row['Source_Stations']
-    destination = row['Destination_Stations']
-    line = row['Line']
-    distance = row['Distance_(Km)']
-    cost = row['Cost_(Yen)']
-    duration = row['Durations_(Min)']
-    graph[source].append((destination, line, distance, cost, duration))
-    graph[destination].append((source, line, distance, cost, duration))  # Undirected graph
+# Load dataset into the shared CSR graph
+graph = load_graph('shinkansen.csv')
+
+# Precomputed all-pairs tables (python route_table.py build), None if missing or stale
+table = RouteTable.open('tables', 'shinkansen.csv')
 
 # ------------------------------------------------------------------------------------
 #                               SEARCH ALGORITHM FUNCTIONS
@@ -33,109 +26,6 @@ def timed_search(search_function, *args):
     elapsed_time = end_time - start_time
     return result, elapsed_time
 
-# Function to rank and retrieve the best route based on a chosen criterion
-def get_best_route(routes, criterion):
-    best_route = None
-    best_score = float('inf')
-    
-    # Evaluate routes based on the selected criterion
-    for route in routes:
-        if route[0]:  # Only consider valid routes
-            path, lines, distance, cost, duration, transits = route
-            if criterion == 'fastest':
-                score = duration
-            elif criterion == 'least_transit':
-                score = transits
-            elif criterion == 'cheapest':
-                score = cost
-            if score < best_score:
-                best_route = (path, lines, distance, cost, duration, transits)
-                best_score = score
-    
-    return best_route
-
-# Route-finding algorithms
-def least_transits_search(graph, start, goal):
-    queue = deque([(start, [start], [], 0)])  # (station, path, lines, transit_count)
-    visited = set([(start, None)])
-    
-    while queue:
-        current, path, lines, transit_count = queue.popleft()
-        
-        if current == goal:
-            return path, lines, 0, 0, 0, transit_count
-        
-        for neighbor, line, _, _, _ in graph[current]:
-            if (neighbor, line) not in visited:
-                visited.add((neighbor, line))
-                new_lines = lines.copy()
-                new_transit_count = transit_count
-                
-                if not lines or lines[-1] != line:
-                    new_lines.append(line)
-                    new_transit_count += 1 if lines else 0
-                
-                queue.append((neighbor, path + [neighbor], new_lines, new_transit_count))
-    
-    return None, None, None, None, None, None
-
-def best_first_search(graph, start, goal):
-    queue = [(0, start, [start], [], 0, 0, 0, 0)]
-    visited = set()
-    while queue:
-        _, current, path, lines, total_distance, total_cost, total_duration, transit_count = heapq.heappop(queue)
-        if current == goal:
-            return path, lines, total_distance, total_cost, total_duration, transit_count
-        if current not in visited:
-            visited.add(current)
-            for neighbor, line, dist, cost, dur in graph[current]:
-                if neighbor not in visited:
-                    new_transit_count = transit_count
-                    new_lines = lines.copy()
-                    if not lines or lines[-1] != line:
-                        new_lines.append(line)
-                        new_transit_count += 1 if lines else 0
-                    heapq.heappush(queue, (dist, neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
-    return None, None, None, None, None, None
-
-def bfs(graph, start, goal):
-    queue = deque([(start, [start], [], 0, 0, 0, 0)])
-    visited = set([start])
-    while queue:
-        current, path, lines, total_distance, total_cost, total_duration, transit_count = queue.popleft()
-        if current == goal:
-            return path, lines, total_distance, total_cost, total_duration, transit_count
-        for neighbor, line, dist, cost, dur in graph[current]:
-            if neighbor not in visited:
-                visited.add(neighbor)
-                new_transit_count = transit_count
-                new_lines = lines.copy()
-                if not lines or lines[-1] != line:
-                    new_lines.append(line)
-                    new_transit_count += 1 if lines else 0
-                queue.append((neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
-    return None, None, None, None, None, None
-
-def dijkstra_search(graph, start, goal):
-    queue = [(0, start, [start], [], 0, 0, 0, 0)]
-    visited = set()
-    while queue:
-        _, current, path, lines, total_distance, total_cost, total_duration, transit_count = heapq.heappop(queue)
-        if current == goal:
-            return path, lines, total_distance, total_cost, total_duration, transit_count
-        if current not in visited:
-            visited.add(current)
-            for neighbor, line, dist, cost, dur in graph[current]:
-                if neighbor not in visited:
-                    heuristic = 0
-                    new_transit_count = transit_count
-                    new_lines = lines.copy()
-                    if not lines or lines[-1] != line:
-                        new_lines.append(line)
-                        new_transit_count += 1 if lines else 0
-                    heapq.heappush(queue, (total_distance + heuristic, neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
-    return None, None, None, None, None, None
-
 # ------------------------------------------------------------------------------------
 #                                  INPUT FROM USERS 
 # ------------------------------------------------------------------------------------
@@ -146,7 +36,10 @@ print("\nPlease select your primary travel preference:")
 print("1. Fastest route (if you're in a rush)")
 print("2. Least transit route (if carrying heavy items or tired)")
 print("3. Cheapest route (if you're on a budget)")
-choice = input("Enter the number of your preference (1, 2, or 3): ")
+print("4. Show every sensible trade-off between time, cost and transits")
+print("5. Earliest arrival when leaving at a given time (uses timetable.csv)")
+print("6. Several alternative routes, fastest first")
+choice = input("Enter the number of your preference (1, 2, 3, 4, 5, or 6): ")
 
 # Map user choice to criteria
 if choice == '1':
@@ -155,39 +48,73 @@ elif choice == '2':
     selected_criterion = 'least_transit'
 elif choice == '3':
     selected_criterion = 'cheapest'
+elif choice == '4':
+    selected_criterion = 'pareto'
+elif choice == '5':
+    selected_criterion = 'timetable'
+elif choice == '6':
+    selected_criterion = 'alternatives'
 else:
     print("Invalid choice. Please restart and choose a valid option.")
     exit()
 
-# Run each search with timing
-print("\nCalculating the best route based on your preference...\n")
-
-(dijkstra_path, dijkstra_lines, dijkstra_dist, dijkstra_cost, dijkstra_dur, dijkstra_transits), dijkstra_time = timed_search(dijkstra_search, graph, start_station, goal_station)
-(transits_path, transits_lines, transits_dist, transits_cost, transits_dur, transits_transits), transits_time = timed_search(least_transits_search, graph, start_station, goal_station)
-(bfs_path, bfs_lines, bfs_dist, bfs_cost, bfs_dur, bfs_transits), bfs_time = timed_search(bfs, graph, start_station, goal_station)
-(best_first_path, best_first_lines, best_first_dist, best_first_cost, best_first_dur, best_first_transits), best_first_time = timed_search(best_first_search, graph, start_station, goal_station)
-
-# Collect all routes in a list
-routes = [
-    (dijkstra_path, dijkstra_lines, dijkstra_dist, dijkstra_cost, dijkstra_dur, dijkstra_transits),
-    (transits_path, transits_lines, transits_dist, transits_cost, transits_dur, transits_transits),
-    (bfs_path, bfs_lines, bfs_dist, bfs_cost, bfs_dur, bfs_transits),
-    (best_first_path, best_first_lines, best_first_dist, best_first_cost, best_first_dur, best_first_transits)
-]
-
-# Get the best route based on the user's chosen criterion
-best_route = get_best_route(routes, selected_criterion)
-
-# Display the best route
-if best_route:
-    path, lines, distance, cost, duration, transits = best_route
-    print("\nBest Route Based on Your Preference:")
-    print("Route:", " -> ".join(path))
-    print("Lines:", " -> ".join(lines))
-    print("Total Distance:", f"{distance:.2f}", "km")
-    print("Total Cost:", f"{cost:.2f}", "Yen")
-    print("Total Duration:", f"{duration:.2f}", "minutes")
-    print("Total Transits:", transits)
+# Departure-time-aware routing needs a timetable (python raptor.py generate)
+if selected_criterion == 'timetable':
+    timetable = Timetable.open('timetable.csv')
+    if timetable is None:
+        print("No timetable found. Create one with: python raptor.py generate")
+        exit()
+    try:
+        departure_time = parse_time(input("What time do you leave? (HH:MM): "))
+    except ValueError:
+        print("Invalid time. Please restart and enter it as HH:MM, e.g. 08:30.")
+        exit()
+    print("\nCalculating the earliest arrival...\n")
+    journey, search_time = timed_search(earliest_arrival, timetable, start_station, goal_station, departure_time)
+    options = []
+# All Pareto-optimal routes come from one multi-criteria search
+elif selected_criterion == 'pareto':
+    print("\nCalculating every trade-off between time, cost and transits...\n")
+    options, search_time = timed_search(pareto_search, graph, start_station, goal_station)
+# Distinct routes in order of duration, from one k-shortest-paths search
+elif selected_criterion == 'alternatives':
+    print("\nCalculating alternative routes, fastest first...\n")
+    options, search_time = timed_search(k_shortest_paths, graph, start_station, goal_station, 5, 'duration')
+else:
+    # Look the route up in the tables, or run a single search that optimises the chosen criterion
+    print("\nCalculating the best route based on your preference...\n")
+    best_route, search_time = timed_search(lookup_or_search, table, graph, start_station, goal_station, selected_criterion)
+    options = [best_route] if best_route[0] else []
+
+# Display the timetabled journey, the best route, or every trade-off
+if selected_criterion == 'timetable':
+    if journey:
+        path, lines, departure, arrival, transits, legs = journey
+        print("\nEarliest Arrival:")
+        print("Route:", " -> ".join(path))
+        print("Lines:", " -> ".join(lines))
+        for trip, line, board, leave, alight, reach in legs:
+            print(f"  {format_time(leave)} {board} -> {format_time(reach)} {alight} ({line.strip()}, trip {trip})")
+        print("Departure:", format_time(departure))
+        print("Arrival:", format_time(arrival))
+        print("Total Duration:", arrival - departure_time, "minutes (including waiting)")
+        print("Total Transits:", transits)
+        print("Search Time:", f"{search_time * 1000:.2f}", "ms")
+    else:
+        print("No train gets there after that time.")
+elif options:
+    for number, (path, lines, distance, cost, duration, transits) in enumerate(options, 1):
+        if selected_criterion in ('pareto', 'alternatives'):
+            print(f"\nOption {number}:")
+        else:
+            print("\nBest Route Based on Your Preference:")
+        print("Route:", " -> ".join(path))
+        print("Lines:", " -> ".join(lines))
+        print("Total Distance:", f"{distance:.2f}", "km")
+        print("Total Cost:", f"{cost:.2f}", "Yen")
+        print("Total Duration:", f"{duration:.2f}", "minutes")
+        print("Total Transits:", transits)
+    print("Search Time:", f"{search_time * 1000:.2f}", "ms")
 else:
     print("No suitable route found based on your preference.")
 
@@ -0,0 +1,119 @@
+# Alternative routes: the k shortest loopless paths (Yen's algorithm).
+#
+# Routes are ranked by one weight ('duration', 'cost' or 'distance'); two
+# routes count as different when they pass through different stations. Each
+# route rides the lines that give it the lowest weight, with as few transfers
+# as possible among those, and equal weights rank by transfers.
+#
+# Yen's algorithm takes every route found so far, and for each station on it
+# (the spur) searches for a way to the goal that leaves the route there: the
+# part before the spur stays, the stations before it are blocked and the next
+# hops of earlier routes sharing that part are banned. The best of all those
+# candidates is the next route.
+#
+# The spur searches are cheap because:
+#   - one Dijkstra on the reversed graph gives the exact weight from every
+#     station to the goal. Banning arcs only makes routes longer, so it stays a
+#     consistent A* heuristic for every spur search and they head straight for
+#     the goal. It also bounds each candidate before searching, so spurs that
+#     cannot beat the candidates already waiting are skipped.
+#   - arcs are banned in a mask and stations blocked through the heuristic,
+#     both set and reset around each search instead of copying the graph.
+
+import heapq
+
+from astar import _astar, _check_weight, _distances
+from router import _components
+from search import _endpoints, _result
+
+# The arcs of the lowest-weight way to ride the station `path`, fewest
+# transfers breaking ties, and its (weight, transfers). None if a hop has no
+# open arc.
+def _best_arcs(graph, path, weight, closed):
+    offsets, neighbors, line_ids, _, _, _ = graph.as_lists()
+    column = _components(graph, (weight,))[0]
+    labels = {None: (0, 0, None)}  # line of the last hop -> (weight, transfers, (arc, previous))
+    for u, v in zip(path, path[1:]):
+        hop = {}
+        for e in range(offsets[u], offsets[u + 1]):
+            if neighbors[e] != v or closed[e]:
+                continue
+            line = line_ids[e]
+            for previous, (total, transfers, link) in labels.items():
+                candidate = (total + column[e], transfers + (previous is not None and previous != line), (e, link))
+                if line not in hop or candidate[:2] < hop[line][:2]:
+                    hop[line] = candidate
+        if not hop:
+            return None, None
+        labels = hop
+    total, transfers, link = min(labels.values(), key=lambda label: label[:2])
+    arcs = []
+    while link is not None:
+        e, link = link
+        arcs.append(e)
+    arcs.reverse()
+    return arcs, (total, transfers)
+
+# Up to `k` routes from `start` to `goal` in order of `weight`, as result tuples.
+# `stats` (instrument.SearchStats), if given, counts the backward search, the
+# spur searches and the candidate heap.
+def k_shortest_paths(graph, start, goal, k=3, weight='duration', stats=None):
+    _check_weight(weight)
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None or k <= 0:
+        return []
+    offsets, neighbors, _, _, _, _ = graph.as_lists()
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+    h = _distances(graph.reverse(), g, weight, stats).tolist()
+    inf = float('inf')
+    if h[s] == inf:
+        return []
+
+    column = _components(graph, (weight,))[0]
+    mask = list(graph.closures())  # closed arcs plus the ones banned for a spur
+    path = _astar(graph, s, g, weight, h, mask, stats)[0]
+    found = [(path, _best_arcs(graph, path, weight, mask)[0])]
+    candidates = []  # heap of (weight, transfers, path, arcs)
+    seen = {tuple(path)}
+    while len(found) < k:
+        previous = found[-1][0]
+        # Weight of the part before each spur, summed along the last route
+        prefix = [0]
+        for e in found[-1][1]:
+            prefix.append(prefix[-1] + column[e])
+        for i in range(len(previous) - 1):
+            spur, root = previous[i], previous[:i + 1]
+            # Skip a spur whose best possible candidate is worse than enough
+            # candidates already waiting
+            needed = k - len(found)
+            if len(candidates) >= needed and prefix[i] + h[spur] > heapq.nsmallest(needed, candidates)[-1][0]:
+                continue
+
+            banned = []
+            for route, _ in found:
+                if route[:i + 1] == root and len(route) > i + 1:
+                    u, v = route[i], route[i + 1]
+                    for e in range(offsets[u], offsets[u + 1]):
+                        if neighbors[e] == v and not mask[e]:
+                            mask[e] = True
+                            banned.append(e)
+            blocked = [(v, h[v]) for v in root[:-1]]
+            for v, _ in blocked:
+                h[v] = inf
+            spur_path = _astar(graph, spur, g, weight, h, mask, stats)[0]
+            for v, bound in blocked:
+                h[v] = bound
+            for e in banned:
+                mask[e] = False
+
+            if spur_path is not None:
+                path = root[:-1] + spur_path
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    arcs, key = _best_arcs(graph, path, weight, mask)
+                    push(candidates, (key[0], key[1], path, arcs))
+        if not candidates:
+            break
+        _, _, path, arcs = pop(candidates)
+        found.append((path, arcs))
+    return [_result(graph, stats, lambda: route) for route in found]
@@ -0,0 +1,263 @@
+# A* search with admissible heuristics for the Shinkansen graph.
+#
+# Two lower bounds are available and can be combined (their maximum is still a
+# lower bound):
+#   - CoordinateHeuristic: great-circle distance to the goal from the station
+#     coordinates in stations.csv, scaled so it never exceeds the real weight.
+#   - Landmarks (ALT): exact distances from / to a few landmark stations, turned
+#     into bounds through the triangle inequality.
+#
+# Both stay valid lower bounds when arcs close or get heavier on the live
+# graph. When a weight gets lower they are refreshed before the next search:
+# the coordinate factor from the changed arcs only, and the distances of just
+# those landmarks that the lighter or reopened arcs give a shorter route.
+
+import csv
+import heapq
+
+import numpy as np
+
+from graph import change_affects
+from router import _components, _dijkstra
+from search import NOT_FOUND, _endpoints, _result
+
+COORDINATES_PATH = 'stations.csv'
+WEIGHTS = ('duration', 'cost', 'distance')
+EARTH_RADIUS_KM = 6371.0
+
+# Read the Station,Latitude,Longitude table into {name: (lat, lon)}
+def load_coordinates(path=COORDINATES_PATH):
+    with open(path, newline='') as f:
+        return {row['Station'].strip(): (float(row['Latitude']), float(row['Longitude'])) for row in csv.DictReader(f)}
+
+# Great-circle distance in km between arrays of points given in radians
+def _haversine(lat1, lon1, lat2, lon2):
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def _check_weight(weight):
+    if weight not in WEIGHTS:
+        raise ValueError(f"Unknown weight {weight!r}, expected one of: " + ", ".join(WEIGHTS))
+
+# ------------------------------------------------------------------------------------
+#                                     HEURISTICS
+# ------------------------------------------------------------------------------------
+
+class CoordinateHeuristic:
+    def __init__(self, graph, weight='duration', coordinates=None):
+        _check_weight(weight)
+        if coordinates is None:
+            coordinates = load_coordinates()
+        self.weight = weight
+        self.version = graph.version
+
+        # Stations without coordinates get NaN and a bound of 0
+        latlon = np.array([coordinates.get(name.strip(), (np.nan, np.nan)) for name in graph.stations], dtype=np.float64)
+        self.lat = np.radians(latlon[:, 0])
+        self.lon = np.radians(latlon[:, 1])
+
+        # The largest factor with weight >= factor * straight-line km on every
+        # arc. By the triangle inequality it then holds for whole routes too.
+        self.factor = self._factor(graph, np.arange(graph.num_edges))
+        if self.factor == float('inf'):
+            self.factor = 0.0  # No arc has a length to scale
+
+    # Largest factor that holds on `arcs`, inf if none of them has a length
+    def _factor(self, graph, arcs):
+        tails = np.searchsorted(graph.offsets, arcs, side='right') - 1
+        heads = graph.neighbors[arcs]
+        km = _haversine(self.lat[tails], self.lon[tails], self.lat[heads], self.lon[heads])
+        usable = np.isfinite(km) & (km > 0)
+        if not usable.any():
+            return float('inf')
+        values = getattr(graph, self.weight)[arcs].astype(np.float64)
+        return float(np.min(values[usable] / km[usable]))
+
+    # Lower the factor for arcs whose weight went down since the last refresh,
+    # or compute it again when the log no longer reaches back that far
+    def refresh(self, graph):
+        changes = graph.changes_since(self.version)
+        if changes is None:
+            self.factor = min(self.factor, self._factor(graph, np.arange(graph.num_edges)))
+        else:
+            for _, arcs, weights, worse in changes:
+                if not worse and weights is not None and self.weight in weights:
+                    self.factor = min(self.factor, self._factor(graph, np.fromiter(arcs, dtype=np.int64)))
+        self.version = graph.version
+
+    # Lower bound on the weight from every station to station id `goal`
+    def bound(self, goal):
+        km = _haversine(self.lat, self.lon, self.lat[goal], self.lon[goal])
+        return np.nan_to_num(km * self.factor, nan=0.0)
+
+class Landmarks:
+    def __init__(self, stations, weights, forward, backward, version=0):
+        self.stations = stations  # landmark station ids
+        self.weights = weights
+        self.forward = forward    # weight -> float64[k, n], distance from landmark to station
+        self.backward = backward  # weight -> float64[k, n], distance from station to landmark
+        self.version = version    # graph version the distances were computed at
+
+    # Pick `count` landmarks by farthest-point selection on `select_by` and store
+    # exact distance vectors for every weight
+    @classmethod
+    def build(cls, graph, count=8, weights=WEIGHTS, select_by='duration'):
+        reverse = graph.reverse()
+        count = min(count, graph.num_stations)
+
+        # Start from the station farthest from station 0, then keep adding the
+        # station farthest from all landmarks chosen so far
+        landmarks = []
+        nearest = _distances(graph, 0, select_by)
+        for _ in range(count):
+            candidates = np.where(np.isfinite(nearest), nearest, -1.0)
+            candidates[landmarks] = -1.0
+            if candidates.max() < 0:
+                break
+            landmark = int(np.argmax(candidates))
+            landmarks.append(landmark)
+            distances = _distances(graph, landmark, select_by)
+            nearest = distances if len(landmarks) == 1 else np.minimum(nearest, distances)
+
+        forward, backward = {}, {}
+        for weight in weights:
+            _check_weight(weight)
+            forward[weight], backward[weight] = _landmark_distances(graph, reverse, landmarks, weight)
+        return cls(landmarks, tuple(weights), forward, backward, graph.version)
+
+    # Search again from the landmarks whose distances an arc that got lighter
+    # or reopened since the last refresh can shorten: arc u -> v of weight w
+    # does if forward[u] + w < forward[v], or backward[v] + w < backward[u].
+    # Distances that only heavier or closed arcs changed are too short, but
+    # still give lower bounds. When the log no longer reaches back that far,
+    # every arc is checked.
+    def refresh(self, graph):
+        changes = graph.changes_since(self.version)
+        for weight in self.weights:
+            if changes is None:
+                arcs = np.arange(graph.num_edges)
+            else:
+                lighter = set()
+                for change in changes:
+                    if change_affects(change, (weight,), ()):
+                        lighter |= change[1]
+                arcs = np.fromiter(lighter, dtype=np.int64, count=len(lighter))
+            arcs = arcs[~graph.closed[arcs]]
+            if not len(arcs):
+                continue
+            u = np.searchsorted(graph.offsets, arcs, side='right') - 1
+            v, w = graph.neighbors[arcs], getattr(graph, weight)[arcs]
+            forward, backward = self.forward[weight], self.backward[weight]
+            for i, landmark in enumerate(self.stations):
+                if np.any(forward[i, u] + w < forward[i, v]):
+                    forward[i] = _distances(graph, landmark, weight)
+                if np.any(backward[i, v] + w < backward[i, u]):
+                    backward[i] = _distances(graph.reverse(), landmark, weight)
+        self.version = graph.version
+
+    # Lower bound on the weight from every station to station id `goal`:
+    # d(v, g) >= d(L, g) - d(L, v) and d(v, g) >= d(v, L) - d(g, L)
+    def bound(self, weight, goal):
+        forward, backward = self.forward[weight], self.backward[weight]
+        with np.errstate(invalid='ignore'):
+            bounds = np.concatenate([
+                forward[:, goal:goal + 1] - forward,
+                backward - backward[:, goal:goal + 1],
+            ])
+        # inf - inf carries no information; +inf means the goal is unreachable
+        bounds = np.nan_to_num(bounds, nan=0.0, posinf=np.inf, neginf=0.0)
+        if not len(bounds):
+            return np.zeros(forward.shape[1])
+        return np.maximum(bounds.max(axis=0), 0.0)
+
+# Distances from and to every landmark, as float64[k, n] arrays
+def _landmark_distances(graph, reverse, landmarks, weight):
+    forward = np.array([_distances(graph, l, weight) for l in landmarks]).reshape(len(landmarks), graph.num_stations)
+    backward = np.array([_distances(reverse, l, weight) for l in landmarks]).reshape(len(landmarks), graph.num_stations)
+    return forward, backward
+
+# Exact one-to-all distances from station id `s` as a float array (inf if unreachable)
+def _distances(graph, s, weight, stats=None):
+    tree = _dijkstra(graph, s, (weight,), stats=stats)
+    result = np.full(graph.num_stations, np.inf)
+    for v, state in tree.best.items():
+        result[v] = tree.key[state][0]
+    return result
+
+# ------------------------------------------------------------------------------------
+#                                     A* SEARCH
+# ------------------------------------------------------------------------------------
+
+# Station path and arcs to `g` from the parents A* recorded
+def _walk(parent, g):
+    path, arcs = [g], []
+    while parent[path[-1]] is not None:
+        previous, e = parent[path[-1]]
+        arcs.append(e)
+        path.append(previous)
+    path.reverse()
+    arcs.reverse()
+    return path, arcs
+
+# A* from station id `s` to `g`. `h` is a list of lower bounds to `g`. Returns the
+# station path, its arcs and how many stations were settled. `closed` stands in
+# for the graph's closed flags, so a caller can ban arcs for one search.
+def _astar(graph, s, g, weight, h, closed=None, stats=None):
+    offsets, neighbors, _, _, _, _ = graph.as_lists()
+    if closed is None:
+        closed = graph.closures()
+    column = _components(graph, (weight,))[0]
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+
+    best = {s: 0}
+    parent = {s: None}
+    settled = 0
+    queue = [(h[s], s, 0)]  # (estimated total, station, weight so far)
+    while queue:
+        _, current, so_far = pop(queue)
+        if so_far != best[current]:
+            if stats is not None:
+                stats.stale += 1
+            continue  # Stale entry
+        settled += 1
+        if current == g:
+            if stats is not None:
+                return stats.timed('reconstruct', _walk, parent, g) + (settled,)
+            return _walk(parent, g) + (settled,)
+        if stats is not None:
+            stats.settle(offsets[current + 1] - offsets[current])
+        for e in range(offsets[current], offsets[current + 1]):
+            if closed[e]:
+                continue
+            neighbor = neighbors[e]
+            new_weight = so_far + column[e]
+            old_weight = best.get(neighbor)
+            if (old_weight is None or new_weight < old_weight) and h[neighbor] != float('inf'):
+                best[neighbor] = new_weight
+                parent[neighbor] = (current, e)
+                push(queue, (new_weight + h[neighbor], neighbor, new_weight))
+    return None, None, settled
+
+# Lower bounds to station id `g` from every station, the maximum of all heuristics
+def _bounds(graph, g, weight, heuristics):
+    h = np.zeros(graph.num_stations)
+    for heuristic in heuristics:
+        if heuristic.version != graph.version:
+            heuristic.refresh(graph)
+        if isinstance(heuristic, Landmarks):
+            h = np.maximum(h, heuristic.bound(weight, g))
+        elif heuristic.weight == weight:
+            h = np.maximum(h, heuristic.bound(g))
+    return h.tolist()
+
+# Search the route using A* Search on a single weight. `heuristics` holds
+# CoordinateHeuristic and/or Landmarks objects; with none it is plain Dijkstra.
+def astar_search(graph, start, goal, weight='duration', heuristics=(), stats=None):
+    _check_weight(weight)
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    path, arcs, _ = _astar(graph, s, g, weight, _bounds(graph, g, weight, heuristics), stats=stats)
+    if path is None:
+        return NOT_FOUND
+    return _result(graph, stats, lambda: (path, arcs))
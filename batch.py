@@ -0,0 +1,158 @@
+# Batch origin-destination routing.
+#
+# Routes a whole file of (start, goal) pairs in one process launch instead of
+# one input() query per run:
+#     python batch.py pairs.csv routes.jsonl --criterion fastest
+#
+# Pairs are read as a stream from CSV (columns start,goal) or JSONL (objects
+# with "start" and "goal"). They are taken a chunk at a time and grouped by
+# start station, so every start in a chunk needs one one-to-all search whose
+# tree answers all of its goals. The groups run on a process pool where each
+# worker loads the graph once, and results are written as soon as their group
+# finishes, with the fields Best.py prints. At most one chunk of pairs and a
+# bounded number of finished groups are held in memory, whatever the input size.
+
+import argparse
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from graph import CSV_PATH, load_graph
+from router import resolve_criterion, shortest_path_tree
+from search import NOT_FOUND
+
+CHUNK_SIZE = 100000  # Pairs grouped by start station at a time
+FIELDS = ('index', 'start', 'goal', 'route', 'lines', 'distance', 'cost', 'duration', 'transits')
+
+# ------------------------------------------------------------------------------------
+#                                      WORKERS
+# ------------------------------------------------------------------------------------
+
+_worker_graph = None
+
+def _init_worker(csv_path):
+    global _worker_graph
+    _worker_graph = load_graph(csv_path)
+
+# Route every goal of one start station from a single shortest path tree.
+# `pairs` holds (index, goal) and comes back as (index, start, goal, result).
+def _route_group(start, pairs, criterion):
+    graph = _worker_graph
+    if graph.index(start) is None:
+        return [(index, start, goal, NOT_FOUND) for index, goal in pairs]
+    tree = shortest_path_tree(graph, start, criterion)
+    return [(index, start, goal, tree.route(goal)) for index, goal in pairs]
+
+# ------------------------------------------------------------------------------------
+#                                   INPUT / OUTPUT
+# ------------------------------------------------------------------------------------
+
+def _format(path, requested=None):
+    if requested:
+        return requested
+    return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.json', '.ndjson') else 'csv'
+
+# Yield (index, start, goal) for every pair in the file, one line at a time
+def read_pairs(path, file_format=None):
+    with open(path, newline='') as f:
+        if _format(path, file_format) == 'jsonl':
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for index, row in enumerate(rows):
+            yield index, row['start'], row['goal']
+
+# One output record per pair, with the fields Best.py prints
+def _record(index, start, goal, result):
+    path, lines, distance, cost, duration, transits = result
+    return {
+        'index': index,
+        'start': start,
+        'goal': goal,
+        'route': path,
+        'lines': lines,
+        'distance': distance,
+        'cost': cost,
+        'duration': duration,
+        'transits': transits,
+    }
+
+class _Writer:
+    def __init__(self, f, file_format):
+        self.f = f
+        self.file_format = file_format
+        if file_format == 'csv':
+            self.writer = csv.DictWriter(f, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.file_format == 'jsonl':
+            self.f.write(json.dumps(record) + '\n')
+        else:
+            row = dict(record)
+            row['route'] = " -> ".join(record['route']) if record['route'] else ''
+            row['lines'] = " -> ".join(record['lines']) if record['lines'] else ''
+            self.writer.writerow(row)
+
+# ------------------------------------------------------------------------------------
+#                                       BATCH
+# ------------------------------------------------------------------------------------
+
+# Group one chunk of pairs by start station, keeping first-seen order
+def _groups(chunk):
+    groups = {}
+    for index, start, goal in chunk:
+        groups.setdefault(start, []).append((index, goal))
+    return groups.items()
+
+# Route every pair in `input_path` and stream the records to `output_path`.
+# Records come out grouped by start station; `index` is the input row number.
+def run_batch(input_path, output_path, criterion='fastest', csv_path=CSV_PATH, workers=None, chunk_size=CHUNK_SIZE, input_format=None, output_format=None):
+    resolve_criterion(criterion)  # Fail before starting the pool
+    output_format = _format(output_path, output_format)
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4  # Finished groups waiting to be written
+
+    routed = 0
+    pairs = read_pairs(input_path, input_format)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(csv_path,)) as executor, \
+            open(output_path, 'w', newline='') as f:
+        writer = _Writer(f, output_format)
+        pending = deque()
+
+        # Groups are written in submission order as they finish
+        def write_oldest():
+            rows = pending.popleft().result()
+            for row in rows:
+                writer.write(_record(*row))
+            return len(rows)
+
+        while True:
+            chunk = list(islice(pairs, chunk_size))
+            if not chunk:
+                break
+            for start, group in _groups(chunk):
+                if len(pending) >= max_pending:
+                    routed += write_oldest()
+                pending.append(executor.submit(_route_group, start, group, criterion))
+        while pending:
+            routed += write_oldest()
+    return routed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Route a file of origin-destination pairs")
+    parser.add_argument('input', help="CSV with start,goal columns, or JSONL objects with start and goal")
+    parser.add_argument('output', help="results as .jsonl or .csv")
+    parser.add_argument('--criterion', default='fastest', help="fastest, cheapest, least_transit, duration, cost, distance or transfers")
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), default=None)
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'), default=None)
+    args = parser.parse_args()
+
+    count = run_batch(args.input, args.output, args.criterion, args.csv, args.workers, args.chunk_size, args.input_format, args.output_format)
+    print(f"{count} routes written to {args.output}")
@@ -0,0 +1,279 @@
+# Benchmark suite for every search engine.
+#
+# For each network (the real dataset and synthetic networks of growing size,
+# see synthetic.py) it measures:
+#   - graph build time and peak memory, from CSV to CSR arrays,
+#   - per engine: preprocessing time and peak memory (landmarks, CH, ...),
+#   - per engine: latency percentiles and throughput over a fixed random query
+#     set, timed with perf_counter after a warm-up, repeated several times,
+#   - per engine: peak memory of a single query,
+# and writes everything as JSON, so two versions can be compared:
+#     python benchmark.py run --output before.json
+#     python benchmark.py run --output after.json
+#     python benchmark.py compare before.json after.json
+# The default sizes run up to a million segments; pass --sizes for a quicker
+# run. Size 0 is shinkansen.csv itself. Engines that are too slow for a network
+# are skipped above their size limit (see ENGINES) unless named with --engines.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from alternatives import k_shortest_paths
+from astar import Landmarks, astar_search
+from bidirectional import bidirectional_bfs, bidirectional_dijkstra
+from contraction import ContractionHierarchy, ch_search
+from graph import CSV_PATH, benchmark_startup, load_graph
+from pareto import pareto_search
+from raptor import Timetable, earliest_arrival, generate_timetable
+from router import optimal_search
+from search import best_first_search, bfs, dijkstra_search, least_transits_search
+from synthetic import generate_network
+
+DEFAULT_SIZES = (0, 1000, 10000, 100000, 1000000)
+QUERIES = 200
+WARMUP = 20
+REPEATS = 3
+
+# ------------------------------------------------------------------------------------
+#                                      ENGINES
+# ------------------------------------------------------------------------------------
+
+def _prepare_nothing(graph, csv_path):
+    return None
+
+def _prepare_landmarks(graph, csv_path):
+    return (Landmarks.build(graph, weights=('duration',)),)
+
+def _prepare_hierarchy(graph, csv_path):
+    return ContractionHierarchy.build(graph, 'duration')
+
+def _prepare_timetable(graph, csv_path):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'timetable.csv')
+        generate_timetable(csv_path, path, headway=60)
+        return Timetable.open(path)
+
+# RAPTOR answers with arrival times rather than the usual six-tuple
+def _raptor(graph, timetable, start, goal, stats=None):
+    journey = earliest_arrival(timetable, start, goal, '08:00', stats=stats)
+    if journey is None:
+        return (None,) * 6
+    path, lines, departure, arrival, transits, _ = journey
+    return path, lines, None, None, arrival - departure, transits
+
+# Every Pareto-optimal option is returned; the fastest one stands for the query
+def _pareto(graph, context, start, goal, stats=None):
+    options = pareto_search(graph, start, goal, 3, stats)
+    return options[0] if options else (None,) * 6
+
+# The best of the alternatives stands for the query; timing covers all three
+def _alternatives(graph, context, start, goal, stats=None):
+    routes = k_shortest_paths(graph, start, goal, 3, stats=stats)
+    return routes[0] if routes else (None,) * 6
+
+# name -> (prepare(graph, csv_path) -> context,
+#          search(graph, context, start, goal, stats=None),
+#          largest network in segments it runs on by default, None for no limit)
+ENGINES = {
+    'bfs': (_prepare_nothing, lambda graph, context, start, goal, stats=None: bfs(graph, start, goal, stats), None),
+    'best_first_search': (_prepare_nothing, lambda graph, context, start, goal, stats=None: best_first_search(graph, start, goal, stats), None),
+    'dijkstra_search': (_prepare_nothing, lambda graph, context, start, goal, stats=None: dijkstra_search(graph, start, goal, stats), 100000),
+    'least_transits_search': (_prepare_nothing, lambda graph, context, start, goal, stats=None: least_transits_search(graph, start, goal, stats), None),
+    'optimal_search': (_prepare_nothing, lambda graph, context, start, goal, stats=None: optimal_search(graph, start, goal, 'fastest', stats), None),
+    'astar_landmarks': (_prepare_landmarks, lambda graph, context, start, goal, stats=None: astar_search(graph, start, goal, 'duration', context, stats), None),
+    'bidirectional_dijkstra': (_prepare_nothing, lambda graph, context, start, goal, stats=None: bidirectional_dijkstra(graph, start, goal, 'duration', stats), None),
+    'bidirectional_bfs': (_prepare_nothing, lambda graph, context, start, goal, stats=None: bidirectional_bfs(graph, start, goal, stats), None),
+    'contraction_hierarchy': (_prepare_hierarchy, lambda graph, context, start, goal, stats=None: ch_search(graph, context, start, goal, stats), 20000),
+    'pareto_search': (_prepare_nothing, _pareto, 10000),
+    'k_shortest_paths': (_prepare_nothing, _alternatives, 100000),
+    'raptor': (_prepare_timetable, _raptor, 10000),
+}
+
+# ------------------------------------------------------------------------------------
+#                                    MEASUREMENT
+# ------------------------------------------------------------------------------------
+
+def _percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'mean': float(samples.mean()),
+        'p50': float(np.percentile(samples, 50)),
+        'p90': float(np.percentile(samples, 90)),
+        'p99': float(np.percentile(samples, 99)),
+        'max': float(samples.max()),
+    }
+
+# Run `function` once under tracemalloc and return (result, peak MB)
+def _peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / 2 ** 20
+
+# The same query set for every engine on a network
+def query_set(graph, count=QUERIES, seed=0):
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(graph.num_stations, size=(count, 2))
+    return [(graph.stations[s], graph.stations[g]) for s, g in pairs]
+
+def _bench_engine(name, graph, csv_path, queries, warmup, repeats):
+    prepare, search, _ = ENGINES[name]
+    # One preprocessing run gives its time, its peak memory and the context
+    # the queries use. Its time includes the tracemalloc overhead, the same
+    # for every version compared.
+    began = time.perf_counter()
+    context, prepare_peak = _peak_memory(prepare, graph, csv_path)
+    prepare_s = time.perf_counter() - began
+
+    for start, goal in queries[:warmup]:
+        search(graph, context, start, goal)
+
+    samples = []
+    began = time.perf_counter()
+    for _ in range(repeats):
+        for start, goal in queries:
+            t0 = time.perf_counter()
+            search(graph, context, start, goal)
+            samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - began
+
+    # Peak memory of the heaviest single query, and a checksum of the answers
+    # so a faster version that returns different routes stands out
+    query_peak, found, duration_sum = 0.0, 0, 0
+    for start, goal in queries:
+        result, peak = _peak_memory(search, graph, context, start, goal)
+        query_peak = max(query_peak, peak)
+        if result[0] is not None:
+            found += 1
+            duration_sum += result[4]
+    return {
+        'engine': name,
+        'prepare_s': prepare_s,
+        'prepare_peak_mb': prepare_peak,
+        'queries': len(queries),
+        'repeats': repeats,
+        'latency_ms': _percentiles(samples),
+        'throughput_qps': len(samples) / total,
+        'query_peak_mb': query_peak,
+        'found': found,
+        'duration_sum': duration_sum,
+    }
+
+def bench_network(size, engines, queries=QUERIES, warmup=WARMUP, repeats=REPEATS, seed=0, forced=False, log=print):
+    with tempfile.TemporaryDirectory() as directory:
+        if size == 0:
+            csv_path, network = CSV_PATH, 'shinkansen'
+        else:
+            csv_path, network = os.path.join(directory, 'network.csv'), f'synthetic-{size}'
+            generate_network(size, csv_path, seed=seed)
+
+        load_graph(csv_path, snapshot_directory=None)  # Imports pandas outside the timing
+        began = time.perf_counter()
+        graph = load_graph(csv_path, snapshot_directory=None)
+        build_s = time.perf_counter() - began
+        _, build_peak = _peak_memory(load_graph, csv_path, True, None)
+        log(f"{network}: {graph.num_stations} stations, {graph.num_edges} arcs, built in {build_s:.3f} s")
+
+        query_pairs = query_set(graph, queries, seed)
+        results = []
+        for name in engines:
+            limit = ENGINES[name][2]
+            if not forced and limit is not None and graph.num_edges // 2 > limit:
+                log(f"  {name}: skipped above {limit} segments")
+                continue
+            result = _bench_engine(name, graph, csv_path, query_pairs, warmup, repeats)
+            result.update({
+                'network': network,
+                'stations': graph.num_stations,
+                'segments': graph.num_edges // 2,
+                'build_s': build_s,
+                'build_peak_mb': build_peak,
+            })
+            log(f"  {name}: p50 {result['latency_ms']['p50']:.3f} ms, {result['throughput_qps']:.0f} queries/s")
+            results.append(result)
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes=DEFAULT_SIZES, engines=tuple(ENGINES), queries=QUERIES, warmup=WARMUP, repeats=REPEATS, seed=0, startup=False, forced=False, log=print):
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'sizes': list(sizes),
+            'queries': queries,
+            'warmup': warmup,
+            'repeats': repeats,
+            'seed': seed,
+        },
+        'results': [],
+    }
+    if startup:
+        report['startup_ms'] = benchmark_startup()
+    for size in sizes:
+        report['results'].extend(bench_network(size, engines, queries, warmup, repeats, seed, forced, log))
+    return report
+
+# Side-by-side p50 latency and throughput of two reports
+def compare(before, after):
+    old = {(r['network'], r['engine']): r for r in before['results']}
+    print(f"{'network':20s} {'engine':24s} {'p50 before':>11s} {'p50 after':>11s} {'speed-up':>9s}  answers")
+    for r in after['results']:
+        key = (r['network'], r['engine'])
+        if key not in old:
+            continue
+        a, b = old[key]['latency_ms']['p50'], r['latency_ms']['p50']
+        same = (old[key]['found'], old[key]['duration_sum']) == (r['found'], r['duration_sum'])
+        print(f"{key[0]:20s} {key[1]:24s} {a:11.3f} {b:11.3f} {a / b if b else float('inf'):8.2f}x  {'same' if same else 'DIFFERENT'}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the search engines on real and synthetic networks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="run the suite and write a JSON report")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="network sizes in segments, 0 for shinkansen.csv")
+    run_parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=None)
+    run_parser.add_argument('--queries', type=int, default=QUERIES)
+    run_parser.add_argument('--warmup', type=int, default=WARMUP)
+    run_parser.add_argument('--repeats', type=int, default=REPEATS)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--startup', action='store_true', help="also time cold starts (graph.py benchmark)")
+    run_parser.add_argument('--output', default=None, help="JSON file, stdout if omitted")
+    compare_parser = commands.add_parser('compare', help="compare two JSON reports")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.before) as f, open(args.after) as g:
+            compare(json.load(f), json.load(g))
+    else:
+        # Progress goes to stderr so stdout stays valid JSON
+        engines = args.engines or list(ENGINES)
+        report = run(args.sizes, engines, args.queries, args.warmup, args.repeats, args.seed, args.startup,
+                     forced=args.engines is not None, log=lambda message: print(message, file=sys.stderr))
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
@@ -0,0 +1,145 @@
+# Bidirectional point-to-point searches.
+#
+# A forward search from `start` on the graph and a backward search from `goal`
+# on the reversed graph grow towards each other and stop once the best meeting
+# point can no longer improve. Both return the usual
+# (path, lines, total_distance, total_cost, total_duration, transit_count).
+
+import heapq
+
+from astar import _check_weight
+from router import _components
+from search import NOT_FOUND, _endpoints, _result
+
+# Join the forward half (start -> meet) and the backward half (meet -> goal).
+# Backward parents hold arcs of the reversed graph, mapped back with arc_ids.
+def _join(graph, meet, forward_parent, backward_parent):
+    path, arcs = [meet], []
+    v = meet
+    while forward_parent[v] is not None:
+        v, e = forward_parent[v]
+        path.append(v)
+        arcs.append(e)
+    path.reverse()
+    arcs.reverse()
+
+    arc_ids = graph.reverse().arc_ids
+    v = meet
+    while backward_parent[v] is not None:
+        v, e = backward_parent[v]
+        path.append(v)
+        arcs.append(int(arc_ids[e]))
+    return path, arcs
+
+# ------------------------------------------------------------------------------------
+#                               BIDIRECTIONAL DIJKSTRA
+# ------------------------------------------------------------------------------------
+
+def bidirectional_dijkstra(graph, start, goal, weight='duration', stats=None):
+    _check_weight(weight)
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+
+    sides = []
+    for side_graph, origin in ((graph, s), (graph.reverse(), g)):
+        offsets, neighbors, _, _, _, _ = side_graph.as_lists()
+        column = _components(side_graph, (weight,))[0]
+        # (offsets, neighbors, closed, weights, tentative, parent, settled, queue)
+        sides.append((offsets, neighbors, side_graph.closures(), column, {origin: 0}, {origin: None}, set(), [(0, origin)]))
+
+    best, meet = float('inf'), None
+    if s == g:
+        best, meet = 0, s
+    while sides[0][7] and sides[1][7]:
+        # Once the two queue tops together reach the best meeting cost, no
+        # unexplored route can be shorter
+        if sides[0][7][0][0] + sides[1][7][0][0] >= best:
+            break
+        # Expand the side with the smaller queue
+        side = 0 if len(sides[0][7]) <= len(sides[1][7]) else 1
+        offsets, neighbors, closed, column, tentative, parent, settled, queue = sides[side]
+        other_tentative = sides[1 - side][4]
+
+        so_far, current = pop(queue)
+        if current in settled or so_far != tentative[current]:
+            if stats is not None:
+                stats.stale += 1
+            continue  # Stale entry
+        settled.add(current)
+        if stats is not None:
+            stats.settle(offsets[current + 1] - offsets[current])
+        for e in range(offsets[current], offsets[current + 1]):
+            if closed[e]:
+                continue
+            neighbor = neighbors[e]
+            new_weight = so_far + column[e]
+            old_weight = tentative.get(neighbor)
+            if old_weight is None or new_weight < old_weight:
+                tentative[neighbor] = new_weight
+                parent[neighbor] = (current, e)
+                push(queue, (new_weight, neighbor))
+            # Every arc touching the other search is a candidate meeting point
+            other = other_tentative.get(neighbor)
+            if other is not None and tentative[neighbor] + other < best:
+                best, meet = tentative[neighbor] + other, neighbor
+
+    if meet is None:
+        return NOT_FOUND
+    return _result(graph, stats, _join, graph, meet, sides[0][5], sides[1][5])
+
+# ------------------------------------------------------------------------------------
+#                                  BIDIRECTIONAL BFS
+# ------------------------------------------------------------------------------------
+
+# Route with the fewest stations, searching from both ends one level at a time
+def bidirectional_bfs(graph, start, goal, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    if s == g:
+        return _result(graph, stats, lambda: ([s], []))
+
+    sides = []
+    for side_graph, origin in ((graph, s), (graph.reverse(), g)):
+        offsets, neighbors, _, _, _, _ = side_graph.as_lists()
+        # (offsets, neighbors, closed, depth, parent, frontier)
+        sides.append((offsets, neighbors, side_graph.closures(), {origin: 0}, {origin: None}, [origin]))
+
+    while sides[0][5] and sides[1][5]:
+        # Grow the smaller frontier by one full level. The first level that
+        # touches the other search contains the shortest route, but only after
+        # every meeting in that level has been compared.
+        side = 0 if len(sides[0][5]) <= len(sides[1][5]) else 1
+        offsets, neighbors, closed, depth, parent, frontier = sides[side]
+        other_depth = sides[1 - side][3]
+
+        best, meet = None, None
+        next_frontier = []
+        for current in frontier:
+            if stats is not None:
+                stats.settle(offsets[current + 1] - offsets[current])
+            for e in range(offsets[current], offsets[current + 1]):
+                if closed[e]:
+                    continue
+                neighbor = neighbors[e]
+                if neighbor not in depth:
+                    depth[neighbor] = depth[current] + 1
+                    parent[neighbor] = (current, e)
+                    next_frontier.append(neighbor)
+                if neighbor in other_depth:
+                    hops = depth[neighbor] + other_depth[neighbor]
+                    if best is None or hops < best:
+                        best, meet = hops, neighbor
+        sides[side] = (offsets, neighbors, closed, depth, parent, next_frontier)
+        if stats is not None:
+            # A level is taken off the queue and the next one put on at once
+            stats.pops += len(frontier)
+            stats.pushes += len(next_frontier)
+            stats.max_frontier = max(stats.max_frontier, len(next_frontier))
+
+        if meet is not None:
+            return _result(graph, stats, _join, graph, meet, sides[0][4], sides[1][4])
+
+    return NOT_FOUND
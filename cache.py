@@ -0,0 +1,217 @@
+# Caching layer in front of the searches.
+#
+# Query traffic is skewed towards a few pairs (Tokyo - Shin-Osaka, Tokyo -
+# Sendai, ...), so two bounded LRU caches sit in front of the searches:
+#   - results per (start, goal, criterion), answered without any work,
+#   - one-to-all shortest path trees per (start, criterion), so any later goal
+#     from the same start is a walk up the tree instead of a search.
+# Both are dropped when the graph is rebuilt from a changed CSV.
+#
+# Live updates to the graph (closures and delays, see disruptions.py) only
+# drop what they touch. A closed or slower arc stales the results that use it
+# and, in a tree, the stations below it, which are then searched point to
+# point; the rest of the tree stays good. An arc that got cheaper or reopened
+# drops the trees it gives a route at least as good as one they hold (see
+# PathTree.improvable). It may improve any route, so results under a
+# criterion that weighs it are dropped too.
+#
+#     cache = RouteCache('shinkansen.csv')
+#     cache.route('Tokyo', 'Sendai', 'fastest')
+#     cache.call(dijkstra_search, 'Tokyo', 'Sendai')
+#     cache.stats()
+
+import os
+import time
+from collections import OrderedDict
+
+from graph import CSV_PATH, change_affects, file_hash, load_graph, load_versioned_graph
+from router import _dijkstra, resolve_criterion, shortest_path_tree
+from search import NOT_FOUND
+
+RESULT_CAPACITY = 4096
+TREE_CAPACITY = 64
+CHECK_INTERVAL = 1.0  # Seconds between checks of the CSV for changes
+
+class LRUCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Cached value for `key` (now the most recently used), or `default`
+    def get(self, key, default=None):
+        value = self.entries.get(key, self)
+        if value is self:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    # Remove every entry for which `predicate(key, value)` holds; returns how many
+    def drop(self, predicate):
+        keys = [key for key, value in self.entries.items() if predicate(key, value)]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else None,
+        }
+
+class RouteCache:
+    # `graph`, if given, is used instead of loading csv_path; `version` is the
+    # hash of the CSV it was built from
+    def __init__(self, csv_path=CSV_PATH, result_capacity=RESULT_CAPACITY, tree_capacity=TREE_CAPACITY, check_interval=CHECK_INTERVAL, graph=None, version=None):
+        self.csv_path = csv_path
+        self.check_interval = check_interval
+        self.results = LRUCache(result_capacity)
+        self.trees = LRUCache(tree_capacity)
+        self.invalidations = 0
+        self.repaired = 0  # entries dropped or trees patched after live updates
+        if graph is None:
+            graph, version = load_versioned_graph(csv_path)
+        self._graph = graph
+        self._graph_version = self._graph.version
+        self._version = version
+        self._mtime = os.stat(csv_path).st_mtime
+        self._checked = time.monotonic()
+
+    # The current graph, rebuilt (and both caches emptied) if the CSV has
+    # changed. The file is looked at no more than once per check_interval;
+    # live updates to the graph are caught up with on every access.
+    @property
+    def graph(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            mtime = os.stat(self.csv_path).st_mtime
+            if mtime != self._mtime:
+                self._mtime = mtime
+                version = file_hash(self.csv_path)
+                if version != self._version:
+                    self._graph = load_graph(self.csv_path)
+                    self._graph_version = self._graph.version
+                    self._version = version
+                    self.invalidate()
+        if self._graph.version != self._graph_version:
+            changes = self._graph.changes_since(self._graph_version)
+            if changes is None:
+                self.invalidate()  # More updates than the graph keeps a log of
+            else:
+                self._repair(changes)
+            self._graph_version = self._graph.version
+        return self._graph
+
+    # Drop every cached result and tree, e.g. after the graph was edited
+    def invalidate(self):
+        self.results.clear()
+        self.trees.clear()
+        self.invalidations += 1
+
+    # Drop or patch the entries that the logged `changes` may have made wrong.
+    # Results are stored as (result, criterion, arcs); arcs is None for call()
+    # results, whose route is unknown, so those go on any change. Trees are
+    # stored as (tree, stale station ids).
+    def _repair(self, changes):
+        def stale_result(key, value):
+            _, components, arcs = value
+            return arcs is None or any(change_affects(change, components, arcs) for change in changes)
+
+        def stale_tree(key, value):
+            lighter = set()
+            for change in changes:
+                if change_affects(change, key[1], ()):
+                    lighter |= change[1]
+            return value[0].improvable(lighter)
+
+        self.repaired += self.results.drop(stale_result) + self.trees.drop(stale_tree)
+        for tree, stale in self.trees.entries.values():
+            for _, arcs, _, worse in changes:
+                if worse:
+                    affected = tree.affected(arcs)
+                    self.repaired += bool(affected - stale)
+                    stale |= affected
+
+    # (tree, stale station ids) from `start`, searched if not cached
+    def _tree(self, start, criterion):
+        graph = self.graph
+        key = (start, criterion)
+        entry = self.trees.get(key)
+        if entry is None:
+            entry = (shortest_path_tree(graph, start, criterion), set())
+            self.trees.put(key, entry)
+        return entry
+
+    # Shortest path tree from `start` under `criterion`, searched at most once
+    # while it stays in the cache. A tree with stations staled by live updates
+    # is searched again.
+    def tree(self, start, criterion='fastest'):
+        criterion = resolve_criterion(criterion)
+        tree, stale = self._tree(start, criterion)
+        if stale:
+            tree = shortest_path_tree(self.graph, start, criterion)
+            self.trees.put((start, criterion), (tree, set()))
+        return tree
+
+    # Same result tuple as router.optimal_search
+    def route(self, start, goal, criterion='fastest'):
+        graph = self.graph
+        criterion = resolve_criterion(criterion)
+        key = ('route', start, goal, criterion)
+        entry = self.results.get(key)
+        if entry is not None:
+            return entry[0]
+        g = graph.index(goal)
+        if graph.index(start) is None or g is None:
+            result, arcs = NOT_FOUND, ()
+        else:
+            tree, stale = self._tree(start, criterion)
+            if g in stale:
+                # The tree's route to this goal was hit by an update
+                tree = _dijkstra(graph, tree.source, criterion, goal=g)
+            result, arcs = tree.route(goal), tree.trace(g)[1] or ()
+        self.results.put(key, (result, criterion, frozenset(arcs)))
+        return result
+
+    # Memoised call of any search function taking (graph, start, goal, *args)
+    def call(self, search_function, start, goal, *args):
+        graph = self.graph
+        key = (search_function.__module__, search_function.__name__, start, goal, args)
+        entry = self.results.get(key)
+        if entry is None:
+            entry = (search_function(graph, start, goal, *args), None, None)
+            self.results.put(key, entry)
+        return entry[0]
+
+    def stats(self):
+        return {
+            'results': self.results.stats(),
+            'trees': self.trees.stats(),
+            'invalidations': self.invalidations,
+            'repaired': self.repaired,
+        }
@@ -0,0 +1,98 @@
+# Fixtures shared by the tests, run with: python -m pytest -q
+
+import os
+import random
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+
+from graph import build_graph, load_graph
+from route_table import precompute
+from router import resolve_criterion
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+COLUMNS = ['Source_Stations', 'Destination_Stations', 'Line', 'Distance_(Km)', 'Cost_(Yen)', 'Durations_(Min)']
+
+# Every test runs in its own empty directory, so files that default to paths
+# relative to the working directory (snapshots/, tables/, ch/) never land
+# next to the code
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture(scope='session')
+def csv_path():
+    return os.path.join(DIRECTORY, 'shinkansen.csv')
+
+# The real dataset, shared by every test that only reads it
+@pytest.fixture(scope='session')
+def graph(csv_path):
+    return load_graph(csv_path, snapshot_directory=None)
+
+# The adjacency the planner used to build row by row: station ->
+# [(destination, line, distance, cost, duration)], in file order
+@pytest.fixture(scope='session')
+def row_graph(csv_path):
+    adjacency = defaultdict(list)
+    for _, row in pd.read_csv(csv_path).iterrows():
+        source, destination = row['Source_Stations'], row['Destination_Stations']
+        values = (row['Line'], row['Distance_(Km)'], row['Cost_(Yen)'], row['Durations_(Min)'])
+        adjacency[source].append((destination,) + values)
+        adjacency[destination].append((source,) + values)
+    return adjacency
+
+# key(result, criterion): the criterion's key of a result tuple, None for no
+# route. Distances are rounded, since engines may add them in another order.
+@pytest.fixture(scope='session')
+def key():
+    def key(result, criterion):
+        if result[0] is None:
+            return None
+        totals = {'distance': round(result[2], 6), 'cost': result[3], 'duration': result[4], 'transfers': result[5]}
+        return tuple(totals[name] for name in resolve_criterion(criterion))
+    return key
+
+# Route tables of shinkansen.csv for every criterion, built once per run
+@pytest.fixture(scope='session')
+def table_directory(csv_path, tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tables'))
+    precompute(csv_path, directory, workers=2)
+    return directory
+
+# random_network(seed): a small random network with parallel lines and cycles
+@pytest.fixture(scope='session')
+def random_network():
+    def random_network(seed, stations=7, segments=12):
+        rng = random.Random(seed)
+        rows = []
+        for _ in range(segments):
+            a, b = rng.sample(range(stations), 2)
+            rows.append((f'S{a}', f'S{b}', rng.choice('ABC'), rng.randint(1, 50) / 2, rng.randint(1, 9) * 100, rng.randint(1, 9)))
+        return build_graph(pd.DataFrame(rows, columns=COLUMNS))
+    return random_network
+
+# simple_routes(graph, s, g): the totals {'distance', 'cost', 'duration',
+# 'transfers'} of every route from station id s to g that visits no station
+# twice. Optimal routes never need to, so trying these finds every optimum.
+@pytest.fixture(scope='session')
+def simple_routes():
+    def simple_routes(graph, s, g):
+        offsets, neighbors, line_ids, distance, cost, duration = graph.as_lists()
+        found = []
+
+        def extend(v, visited, arcs):
+            if v == g:
+                lines = [line_ids[e] for e in arcs]
+                totals = {name: sum(column[e] for e in arcs) for name, column in (('distance', distance), ('cost', cost), ('duration', duration))}
+                totals['distance'] = round(totals['distance'], 6)
+                totals['transfers'] = sum(a != b for a, b in zip(lines, lines[1:]))
+                found.append(totals)
+                return
+            for e in range(offsets[v], offsets[v + 1]):
+                if neighbors[e] not in visited:
+                    extend(neighbors[e], visited | {neighbors[e]}, arcs + [e])
+
+        extend(s, {s}, [])
+        return found
+    return simple_routes
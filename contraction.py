@@ -0,0 +1,393 @@
+# Contraction Hierarchies (CH) for fast point-to-point queries.
+#
+# Offline, stations are contracted one at a time in order of importance. When a
+# station is removed, a shortcut edge is added between two of its neighbours
+# whenever the route through it is the only shortest one (no "witness" path).
+# Every shortcut remembers the station it skips, so it can be unpacked into the
+# original arcs, and from those the lines and transits of the route.
+#
+# Online, a query runs two small Dijkstra searches that only climb to more
+# important stations: forward from the start and backward from the goal.
+#
+# One hierarchy is built per weight and saved as an .npz file, e.g.
+#     python contraction.py build shinkansen.csv ch
+# writes ch/ch_duration.npz, ch/ch_cost.npz and ch/ch_distance.npz. Each file
+# records the hash of the CSV it was built from and is rebuilt when that
+# changes. Hierarchies built on a graph with live updates are never saved.
+#
+# After live updates to the graph a hierarchy is not rebuilt. Its answer is
+# kept while the graph's net difference from the state it was built on shows
+# it is still optimal (closures and delays on arcs it does not use), and the
+# query falls back to a bidirectional Dijkstra on the live graph otherwise.
+
+import argparse
+import heapq
+import os
+
+import numpy as np
+
+from astar import WEIGHTS, _check_weight
+from bidirectional import bidirectional_dijkstra
+from graph import CSV_PATH, file_hash, load_graph
+from router import _components
+from search import NOT_FOUND, _endpoints, _result
+
+# Witness searches give up after settling this many stations. Giving up only
+# adds a shortcut that was not strictly needed, never a wrong answer.
+WITNESS_SETTLE_LIMIT = 500
+
+# ------------------------------------------------------------------------------------
+#                                   PREPROCESSING
+# ------------------------------------------------------------------------------------
+
+class _Contractor:
+    def __init__(self, graph, weight):
+        offsets, neighbors, _, _, _, _ = graph.as_lists()
+        closed = graph.closures()
+        column = _components(graph, (weight,))[0]
+        n = graph.num_stations
+
+        self.out_edges = [{} for _ in range(n)]  # u -> {x: weight} among uncontracted stations
+        self.in_edges = [{} for _ in range(n)]   # x -> {u: weight}
+        self.edges = {}                          # (u, x) -> (weight, via station or -1, arc or -1)
+        self.contracted = [False] * n
+        self.deleted_neighbors = [0] * n
+
+        # Keep the lightest of any parallel open arcs between two stations
+        for u in range(n):
+            for e in range(offsets[u], offsets[u + 1]):
+                x, w = neighbors[e], column[e]
+                if x != u and not closed[e] and ((u, x) not in self.edges or w < self.edges[u, x][0]):
+                    self.edges[u, x] = (w, -1, e)
+                    self.out_edges[u][x] = w
+                    self.in_edges[x][u] = w
+
+    # Dijkstra from `source` that ignores `skip`, stops past `limit` and after
+    # WITNESS_SETTLE_LIMIT settled stations
+    def _witness(self, source, skip, limit):
+        dist = {source: 0}
+        queue = [(0, source)]
+        settled = 0
+        while queue and settled < WITNESS_SETTLE_LIMIT:
+            d, u = heapq.heappop(queue)
+            if d > dist[u]:
+                continue
+            if d > limit:
+                break
+            settled += 1
+            for x, w in self.out_edges[u].items():
+                if x == skip:
+                    continue
+                nd = d + w
+                if nd <= limit and (x not in dist or nd < dist[x]):
+                    dist[x] = nd
+                    heapq.heappush(queue, (nd, x))
+        return dist
+
+    # Shortcuts (u, x, weight) needed if station v were contracted now
+    def shortcuts(self, v):
+        result = []
+        outs = self.out_edges[v]
+        if not outs:
+            return result
+        max_out = max(outs.values())
+        for u, w_in in self.in_edges[v].items():
+            dist = self._witness(u, v, w_in + max_out)
+            for x, w_out in outs.items():
+                if x == u:
+                    continue
+                through = w_in + w_out
+                witness = dist.get(x)
+                if witness is None or witness > through:
+                    result.append((u, x, through))
+        return result
+
+    # Edge difference plus contracted neighbours: cheap stations go first
+    def priority(self, v):
+        added = len(self.shortcuts(v))
+        removed = len(self.in_edges[v]) + len(self.out_edges[v])
+        return added - removed + self.deleted_neighbors[v]
+
+    def contract(self, v):
+        for u, x, w in self.shortcuts(v):
+            old = self.out_edges[u].get(x)
+            if old is None or w < old:
+                self.edges[u, x] = (w, v, -1)
+                self.out_edges[u][x] = w
+                self.in_edges[x][u] = w
+        for u in self.in_edges[v]:
+            del self.out_edges[u][v]
+            self.deleted_neighbors[u] += 1
+        for x in self.out_edges[v]:
+            del self.in_edges[x][v]
+            self.deleted_neighbors[x] += 1
+        self.contracted[v] = True
+
+    # Contract every station with lazy priority updates; returns the ranks
+    def run(self):
+        n = len(self.contracted)
+        queue = [(self.priority(v), v) for v in range(n)]
+        heapq.heapify(queue)
+        rank = [0] * n
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if self.contracted[v]:
+                continue
+            # Priorities go stale as neighbours are contracted; re-check before
+            # committing to this station
+            current = self.priority(v)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+            self.contract(v)
+            rank[v] = order
+            order += 1
+        return rank
+
+# ------------------------------------------------------------------------------------
+#                                     HIERARCHY
+# ------------------------------------------------------------------------------------
+
+class ContractionHierarchy:
+    def __init__(self, weight, stations, num_arcs, rank, tail, head, edge_weight, via, arc, baseline=None, csv_hash=None):
+        self.weight = weight
+        self.baseline = baseline  # Graph.track() when built on an updated graph, None for the graph as built
+        self.csv_hash = csv_hash  # hash of the CSV the graph came from, set when saved or loaded
+        self.stations = list(stations)
+        self.num_arcs = int(num_arcs)
+        self.rank = np.asarray(rank, dtype=np.int64)
+        self.tail = np.asarray(tail, dtype=np.int64)
+        self.head = np.asarray(head, dtype=np.int64)
+        self.edge_weight = np.asarray(edge_weight)
+        self.via = np.asarray(via, dtype=np.int64)
+        self.arc = np.asarray(arc, dtype=np.int64)
+        self._prepare()
+
+    # Upward adjacency for the forward search, downward (reversed) for the backward one
+    def _prepare(self):
+        n = len(self.stations)
+        rank, tail, head = self.rank.tolist(), self.tail.tolist(), self.head.tolist()
+        weights = self.edge_weight.tolist()
+        self.up = [[] for _ in range(n)]
+        self.down = [[] for _ in range(n)]
+        self.edge_index = {}
+        for i, (u, x) in enumerate(zip(tail, head)):
+            self.edge_index[u, x] = i
+            if rank[u] < rank[x]:
+                self.up[u].append((x, weights[i], i))
+            else:
+                self.down[x].append((u, weights[i], i))
+        self._via = self.via.tolist()
+        self._arc = self.arc.tolist()
+
+    @classmethod
+    def build(cls, graph, weight='duration'):
+        _check_weight(weight)
+        contractor = _Contractor(graph, weight)
+        rank = contractor.run()
+        items = sorted(contractor.edges.items())
+        tail = [u for (u, _), _ in items]
+        head = [x for (_, x), _ in items]
+        edge_weight = [w for _, (w, _, _) in items]
+        via = [v for _, (_, v, _) in items]
+        arc = [e for _, (_, _, e) in items]
+        baseline = None if graph.baseline.unchanged() else graph.track()
+        return cls(weight, graph.stations, graph.num_edges, rank, tail, head, edge_weight, via, arc, baseline)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            csv_hash=np.array(self.csv_hash or ''),
+            weight=np.array(self.weight),
+            stations=np.array(self.stations, dtype=str),
+            num_arcs=np.array(self.num_arcs),
+            rank=self.rank,
+            tail=self.tail,
+            head=self.head,
+            edge_weight=self.edge_weight,
+            via=self.via,
+            arc=self.arc,
+        )
+
+    # The hierarchy saved in `path`, or None if it is missing or unreadable
+    @classmethod
+    def load(cls, path):
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(
+                    str(data['weight']),
+                    data['stations'].tolist(),
+                    data['num_arcs'],
+                    data['rank'],
+                    data['tail'],
+                    data['head'],
+                    data['edge_weight'],
+                    data['via'],
+                    data['arc'],
+                    csv_hash=str(data['csv_hash']),
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # The hierarchy stores arc ids and weights, so it only fits the graph it
+    # was built from: the same stations and arcs, from a CSV with this hash
+    def matches(self, graph, csv_hash):
+        return self.csv_hash == csv_hash and self.stations == graph.stations and self.num_arcs == graph.num_edges
+
+    # Expand a hierarchy edge into original arc ids, in travel order
+    def _unpack(self, edge):
+        arcs = []
+        stack = [edge]
+        while stack:
+            i = stack.pop()
+            middle = self._via[i]
+            if middle == -1:
+                arcs.append(self._arc[i])
+            else:
+                u, x = int(self.tail[i]), int(self.head[i])
+                # Push the second half first so the first half is expanded first
+                stack.append(self.edge_index[middle, x])
+                stack.append(self.edge_index[u, middle])
+        return arcs
+
+    # Original arcs of the best route from station id s to g, None if unreachable
+    def query(self, s, g, stats=None):
+        if s == g:
+            return []
+        push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+        dist = ({s: 0}, {g: 0})
+        parent = ({s: None}, {g: None})
+        queues = ([(0, s)], [(0, g)])
+        adjacency = (self.up, self.down)
+        best, meet = float('inf'), None
+
+        while queues[0] or queues[1]:
+            # Each direction stops on its own once its minimum reaches best
+            for side in (0, 1):
+                queue = queues[side]
+                if not queue:
+                    continue
+                d, u = pop(queue)
+                if d > dist[side][u] or d >= best:
+                    if stats is not None:
+                        stats.stale += 1
+                    if d >= best:
+                        queue.clear()
+                    continue  # Stale entry, or nothing left to improve
+                other = dist[1 - side].get(u)
+                if other is not None and d + other < best:
+                    best, meet = d + other, u
+                if stats is not None:
+                    stats.settle(len(adjacency[side][u]))
+                for x, w, i in adjacency[side][u]:
+                    nd = d + w
+                    if x not in dist[side] or nd < dist[side][x]:
+                        dist[side][x] = nd
+                        parent[side][x] = (u, i)
+                        push(queue, (nd, x))
+
+        if meet is None:
+            return None
+        if stats is not None:
+            return stats.timed('reconstruct', self._arcs, meet, parent)
+        return self._arcs(meet, parent)
+
+    # Original arcs of the route through `meet`, from the parents of both searches
+    def _arcs(self, meet, parent):
+        edges = []
+        v = meet
+        while parent[0][v] is not None:
+            v, i = parent[0][v]
+            edges.append(i)
+        edges.reverse()
+        v = meet
+        while parent[1][v] is not None:
+            v, i = parent[1][v]
+            edges.append(i)
+
+        arcs = []
+        for i in edges:
+            arcs.extend(self._unpack(i))
+        return arcs
+
+# ------------------------------------------------------------------------------------
+#                                    ROUTING API
+# ------------------------------------------------------------------------------------
+
+def _hierarchy_path(directory, weight):
+    return os.path.join(directory, f'ch_{weight}.npz')
+
+# Build one hierarchy per weight for `graph`, loaded from `csv_path`. They are
+# saved unless live updates have changed the graph: a saved hierarchy must
+# describe the CSV, not closures and delays that may be undone later.
+def build_hierarchies(graph, directory, weights=WEIGHTS, csv_path=CSV_PATH):
+    csv_hash = file_hash(csv_path) if graph.baseline.unchanged() else None
+    if csv_hash is not None:
+        os.makedirs(directory, exist_ok=True)
+    hierarchies = {}
+    for weight in weights:
+        hierarchies[weight] = ContractionHierarchy.build(graph, weight)
+        if csv_hash is not None:
+            hierarchies[weight].csv_hash = csv_hash
+            hierarchies[weight].save(_hierarchy_path(directory, weight))
+    return hierarchies
+
+# Load saved hierarchies, rebuilding any that are missing or were built from a
+# different CSV
+def load_hierarchies(graph, directory, weights=WEIGHTS, csv_path=CSV_PATH):
+    csv_hash = file_hash(csv_path)
+    hierarchies = {}
+    for weight in weights:
+        hierarchy = ContractionHierarchy.load(_hierarchy_path(directory, weight))
+        if hierarchy is None or not hierarchy.matches(graph, csv_hash):
+            hierarchy = build_hierarchies(graph, directory, (weight,), csv_path)[weight]
+        hierarchies[weight] = hierarchy
+    return hierarchies
+
+# Search the route using the contraction hierarchy built for its weight
+def ch_search(graph, hierarchy, start, goal, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    arcs = hierarchy.query(s, g, stats)
+    if not graph.still_optimal((hierarchy.weight,), arcs or (), hierarchy.baseline):
+        return bidirectional_dijkstra(graph, start, goal, hierarchy.weight, stats)
+    if arcs is None:
+        return NOT_FOUND
+    neighbors = graph.as_lists()[1]
+    return _result(graph, stats, lambda: ([s] + [neighbors[e] for e in arcs], arcs))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query contraction hierarchies")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="contract the graph and save one hierarchy per weight")
+    build.add_argument('csv', nargs='?', default=CSV_PATH)
+    build.add_argument('directory', nargs='?', default='ch')
+    route = commands.add_parser('route', help="answer one query from saved hierarchies")
+    route.add_argument('start')
+    route.add_argument('goal')
+    route.add_argument('--weight', default='duration', choices=WEIGHTS)
+    route.add_argument('--csv', default=CSV_PATH)
+    route.add_argument('--directory', default='ch')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        graph = load_graph(args.csv)
+        hierarchies = build_hierarchies(graph, args.directory, csv_path=args.csv)
+        for weight, hierarchy in hierarchies.items():
+            shortcuts = int((hierarchy.via != -1).sum())
+            print(f"{weight}: {len(hierarchy.tail)} edges ({shortcuts} shortcuts) -> {_hierarchy_path(args.directory, weight)}")
+    else:
+        graph = load_graph(args.csv)
+        hierarchy = load_hierarchies(graph, args.directory, (args.weight,), args.csv)[args.weight]
+        path, lines, distance, cost, duration, transits = ch_search(graph, hierarchy, args.start, args.goal)
+        if path:
+            print("Route:", " -> ".join(path))
+            print("Lines:", " -> ".join(lines))
+            print("Total Distance:", f"{distance:.2f}", "km")
+            print("Total Cost:", f"{cost:.2f}", "Yen")
+            print("Total Duration:", f"{duration:.2f}", "minutes")
+            print("Total Transits:", transits)
+        else:
+            print("Route not found.")
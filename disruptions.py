@@ -0,0 +1,93 @@
+# Closures and delays on the live graph, without a rebuild.
+#
+#     graph = load_graph()
+#     close_segment(graph, 'Tokyo', 'Ueno')
+#     delay_segment(graph, 'Sendai', 'Morioka', 15, line='Hayabusa')
+#     reopen_segment(graph, 'Tokyo', 'Ueno')
+#
+# A segment is one CSV row: both of its arcs unless both_directions is False,
+# and every line running between the two stations unless `line` is given.
+# Each function changes the graph's arrays in place and returns the arc ids it
+# changed. The searches skip closed arcs, and whatever was computed from the
+# graph catches up from its update log (see Graph._changed): the line graph
+# is patched, heuristics are refreshed, and RouteCache, RouteTable and the
+# contraction hierarchies only set aside the answers an update touches.
+#
+#     python disruptions.py Tokyo Shin-Aomori --close Omiya Morioka --delay Tokyo Ueno 20
+
+import argparse
+import time
+
+from graph import CSV_PATH, load_graph
+
+# Arc ids of the segment between station names a and b
+def segment_arcs(graph, a, b, line=None, both_directions=True):
+    u, v = graph.index(a), graph.index(b)
+    for name, station in ((a, u), (b, v)):
+        if station is None:
+            raise KeyError(f"Unknown station {name!r}")
+    line_id = None
+    if line is not None:
+        line_id = graph.line_index.get(line)
+        if line_id is None:
+            raise KeyError(f"Unknown line {line!r}")
+    arcs = graph.find_arcs(u, v, line_id)
+    if both_directions:
+        arcs += graph.find_arcs(v, u, line_id)
+    if not arcs:
+        raise ValueError(f"No segment between {a!r} and {b!r}" + (f" on {line!r}" if line is not None else ""))
+    return arcs
+
+def close_segment(graph, a, b, line=None, both_directions=True):
+    return graph.set_closed(segment_arcs(graph, a, b, line, both_directions), True)
+
+def reopen_segment(graph, a, b, line=None, both_directions=True):
+    return graph.set_closed(segment_arcs(graph, a, b, line, both_directions), False)
+
+# Add `minutes` to the segment's duration (negative to take a delay back).
+# Raises ValueError if that would leave a negative duration.
+def delay_segment(graph, a, b, minutes, line=None, both_directions=True):
+    arcs = segment_arcs(graph, a, b, line, both_directions)
+    return graph.set_weight(arcs, 'duration', graph.duration[arcs] + minutes)
+
+# Set a weight ('distance', 'cost' or 'duration') of the segment
+def set_segment_weight(graph, a, b, weight, value, line=None, both_directions=True):
+    return graph.set_weight(segment_arcs(graph, a, b, line, both_directions), weight, value)
+
+if __name__ == '__main__':
+    from router import optimal_search
+    from search import least_transits_search
+
+    parser = argparse.ArgumentParser(description="Route around closures and delays applied to the live graph")
+    parser.add_argument('start')
+    parser.add_argument('goal')
+    parser.add_argument('--close', nargs=2, action='append', default=[], metavar=('A', 'B'), help="close the segment between A and B")
+    parser.add_argument('--delay', nargs=3, action='append', default=[], metavar=('A', 'B', 'MINUTES'), help="delay the segment between A and B")
+    parser.add_argument('--line', default=None, help="only affect this line")
+    parser.add_argument('--csv', default=CSV_PATH)
+    args = parser.parse_args()
+
+    graph = load_graph(args.csv)
+
+    def show(title):
+        path, lines, distance, cost, duration, transits = optimal_search(graph, args.start, args.goal, 'fastest')
+        print(title)
+        if path is None:
+            print("  no route")
+            return
+        print(f"  {' -> '.join(path)}")
+        print(f"  lines {', '.join(lines)}; {duration} min, {cost} yen, {distance:.1f} km, {transits} transfers")
+        print(f"  fewest transfers: {least_transits_search(graph, args.start, args.goal)[5]}")
+
+    show("Before")
+    began = time.perf_counter()
+    for a, b in args.close:
+        close_segment(graph, a, b, args.line)
+    for a, b, minutes in args.delay:
+        delay_segment(graph, a, b, int(minutes), args.line)
+    updated = (time.perf_counter() - began) * 1000
+    show("After")
+    began = time.perf_counter()
+    load_graph(args.csv, snapshot_directory=None)
+    rebuilt = (time.perf_counter() - began) * 1000
+    print(f"Updates applied in {updated:.3f} ms (a rebuild from the CSV takes {rebuilt:.1f} ms)")
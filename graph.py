@@ -0,0 +1,474 @@
+# Shared graph backend for the Shinkansen route planner.
+#
+# Station and line names are interned to integer ids and the adjacency is kept
+# as CSR (compressed sparse row) arrays: the arcs leaving station `u` are the
+# slice offsets[u]:offsets[u + 1] of the neighbor / line / weight columns.
+#
+# Parsing the CSV needs pandas, whose import dominates a cold start. The built
+# arrays are therefore saved as an .npz snapshot tagged with the CSV's hash,
+# and later runs load the snapshot without importing pandas at all.
+#
+# The graph can also be changed in place while it is in use (see
+# disruptions.py): arcs can be closed, which every search skips, and their
+# weights changed. Each change is logged with a version number, so structures
+# computed earlier can tell which of their answers it touches and repair those
+# instead of starting over. Precomputed answers (route tables, contraction
+# hierarchies) are checked against a Baseline instead: the net difference of
+# every arc from the state they were built on, so undoing an update makes them
+# usable again.
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import time
+import weakref
+
+import numpy as np
+
+CSV_PATH = 'shinkansen.csv'
+SNAPSHOT_DIRECTORY = 'snapshots'
+CHANGE_LOG_LIMIT = 1024  # Live updates kept in Graph.changes
+
+# ------------------------------------------------------------------------------------
+#                                   GRAPH STRUCTURE
+# ------------------------------------------------------------------------------------
+
+class Graph:
+    def __init__(self, stations, lines, offsets, neighbors, line_ids, distance, cost, duration, arc_ids=None, closed=None):
+        self.stations = list(stations)  # station id -> name
+        self.lines = list(lines)        # line id -> name
+        self.station_index = {name: i for i, name in enumerate(self.stations)}
+        self.line_index = {name: i for i, name in enumerate(self.lines)}
+
+        self.offsets = offsets      # int64[n + 1]
+        self.neighbors = neighbors  # int32[m]
+        self.line_ids = line_ids    # int32[m]
+        self.distance = distance    # float64[m]
+        self.cost = cost            # int64[m]
+        self.duration = duration    # int64[m]
+        self.arc_ids = arc_ids      # int64[m] arc ids in the forward graph, set on reversed graphs
+        self.closed = np.zeros(len(neighbors), dtype=bool) if closed is None else closed  # bool[m]
+        self.version = 0            # number of live updates applied so far
+        self.changes = []           # (version, arcs, weights, worse) of the latest updates, see _changed
+        self.baseline = Baseline()  # difference from the graph as it was built
+        self._baselines = weakref.WeakSet([self.baseline])
+        self._lists = None
+        self._closures = None
+        self._reverse = None
+        self._reverse_positions = None
+        self._derived = {}
+
+    @property
+    def num_stations(self):
+        return len(self.stations)
+
+    @property
+    def num_edges(self):
+        return len(self.neighbors)
+
+    def index(self, station):
+        return self.station_index.get(station)
+
+    # Plain Python lists of the CSR columns. Indexing a list is much cheaper than
+    # indexing a NumPy array element by element, so the search loops use these.
+    def as_lists(self):
+        if self._lists is None:
+            self._lists = (
+                self.offsets.tolist(),
+                self.neighbors.tolist(),
+                self.line_ids.tolist(),
+                self.distance.tolist(),
+                self.cost.tolist(),
+                self.duration.tolist(),
+            )
+        return self._lists
+
+    # The closed flags as a list, True for arcs every search must skip
+    def closures(self):
+        if self._closures is None:
+            self._closures = self.closed.tolist()
+        return self._closures
+
+    # Structures computed from this graph (expanded graphs, heuristics, ...),
+    # built once by `build(graph)` and kept for later calls
+    def derived(self, name, build):
+        if name not in self._derived:
+            self._derived[name] = build(self)
+        return self._derived[name]
+
+    # Station id at the start of every arc
+    def tails(self):
+        return np.repeat(np.arange(self.num_stations, dtype=np.int32), np.diff(self.offsets))
+
+    # The same graph with every arc turned around, used by searches that run
+    # backwards from the goal. arc_ids maps each reversed arc to its forward arc.
+    def reverse(self):
+        if self._reverse is None:
+            tails = self.tails()
+            order = np.argsort(self.neighbors, kind='stable')
+            counts = np.bincount(self.neighbors, minlength=self.num_stations)
+            offsets = np.zeros(self.num_stations + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._reverse = Graph(
+                self.stations,
+                self.lines,
+                offsets,
+                tails[order],
+                self.line_ids[order],
+                self.distance[order],
+                self.cost[order],
+                self.duration[order],
+                arc_ids=order.astype(np.int64),
+                closed=self.closed[order],
+            )
+        return self._reverse
+
+    # Arcs leaving `station` as (destination, line, distance, cost, duration),
+    # the same tuples the old defaultdict graph stored
+    def edges(self, station):
+        u = self.station_index[station]
+        result = []
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            result.append((
+                self.stations[self.neighbors[e]],
+                self.lines[self.line_ids[e]],
+                self.distance[e].item(),
+                self.cost[e].item(),
+                self.duration[e].item(),
+            ))
+        return result
+
+    # Arc ids from station id u to v, only those on line id `line` if given
+    def find_arcs(self, u, v, line=None):
+        arcs = np.arange(self.offsets[u], self.offsets[u + 1])
+        arcs = arcs[self.neighbors[arcs] == v]
+        if line is not None:
+            arcs = arcs[self.line_ids[arcs] == line]
+        return arcs.tolist()
+
+    # Close (or reopen) arcs in place. Returns the arcs whose state changed.
+    def set_closed(self, arcs, closed=True):
+        arcs = [e for e in arcs if self.closed[e] != closed]
+        if arcs:
+            # Closing only makes routes longer; reopening may make any shorter
+            self._apply(arcs, 'closed', [closed] * len(arcs), None, worse=closed)
+        return arcs
+
+    # Set one weight ('distance', 'cost' or 'duration') of `arcs` in place,
+    # to one value or one per arc. Returns the arcs whose weight changed.
+    def set_weight(self, arcs, weight, values):
+        if weight not in _COLUMNS:
+            raise ValueError(f"Unknown weight {weight!r}, expected one of: " + ", ".join(_COLUMNS))
+        arcs = list(arcs)
+        values = np.broadcast_to(np.asarray(values, dtype=getattr(self, weight).dtype), (len(arcs),)).tolist()
+        # Every search assumes weights that never make a route shorter
+        if any(value < 0 for value in values):
+            raise ValueError(f"Negative {weight} for an arc: {min(values)}")
+        column = getattr(self, weight)
+        increased = [(e, value) for e, value in zip(arcs, values) if value > column[e]]
+        decreased = [(e, value) for e, value in zip(arcs, values) if value < column[e]]
+        for changed, worse in ((increased, True), (decreased, False)):
+            if changed:
+                self._apply([e for e, _ in changed], weight, [value for _, value in changed], (weight,), worse)
+        return [e for e, _ in increased + decreased]
+
+    # Changes applied after `version`, oldest first. None if some of them are
+    # no longer in the log; the caller then has to start over.
+    def changes_since(self, version):
+        first = len(self.changes) - (self.version - version)
+        if first < 0:
+            return None
+        return self.changes[first:]
+
+    # A new Baseline that follows every later update of this graph, for a
+    # structure built from the graph as it is now
+    def track(self):
+        baseline = Baseline()
+        self._baselines.add(baseline)
+        return baseline
+
+    # True if a route that was optimal under the criterion `components` in the
+    # state `baseline` describes (the graph as built by default), and uses
+    # `arcs`, is still optimal and its totals current
+    def still_optimal(self, components, arcs, baseline=None):
+        return (baseline or self.baseline).still_optimal(components, arcs)
+
+    # (closed, distance, cost, duration) of arc e
+    def _arc_state(self, e):
+        return (bool(self.closed[e]), self.distance[e].item(), self.cost[e].item(), self.duration[e].item())
+
+    # Write an update, then bring the baselines up to date and log it
+    def _apply(self, arcs, name, values, weights, worse):
+        before = [self._arc_state(e) for e in arcs]
+        self._write(arcs, name, values)
+        for baseline in self._baselines:
+            for e, state in zip(arcs, before):
+                baseline.update(e, state, self._arc_state(e))
+        self._changed(arcs, weights, worse)
+
+    # Write new values into the arrays and lists of this graph and its reverse
+    def _write(self, arcs, name, values):
+        targets = [(self, arcs)]
+        if self._reverse is not None:
+            if self._reverse_positions is None:
+                self._reverse_positions = np.empty(self.num_edges, dtype=np.int64)
+                self._reverse_positions[self._reverse.arc_ids] = np.arange(self.num_edges)
+            targets.append((self._reverse, self._reverse_positions[arcs].tolist()))
+        for graph, positions in targets:
+            getattr(graph, name)[positions] = values
+            if name == 'closed':
+                lists = graph._closures
+            else:
+                lists = graph._lists[_COLUMNS[name]] if graph._lists is not None else None
+            if lists is not None:
+                for e, value in zip(positions, values):
+                    lists[e] = value
+
+    # Log a change and let derived structures repair themselves. A structure
+    # with a repair(graph, arcs) method that returns True is kept, any other
+    # is dropped and rebuilt on its next use.
+    def _changed(self, arcs, weights, worse):
+        self.version += 1
+        self.changes.append((self.version, frozenset(arcs), weights, worse))
+        if len(self.changes) > CHANGE_LOG_LIMIT:
+            del self.changes[:len(self.changes) - CHANGE_LOG_LIMIT]
+        for name, value in list(self._derived.items()):
+            repair = getattr(value, 'repair', None)
+            if repair is None or not repair(self, arcs):
+                del self._derived[name]
+
+# Position of each weight column in Graph.as_lists()
+_COLUMNS = {'distance': 3, 'cost': 4, 'duration': 5}
+
+# Net difference of a graph from one earlier state, per arc. Only arcs that
+# differ from that state are kept, so an update that is undone leaves nothing
+# behind, however many updates there were in between.
+class Baseline:
+    def __init__(self):
+        self.original = {}  # arc -> (closed, distance, cost, duration) in the earlier state
+        self.reopened = set()  # arcs open now that were closed
+        self.cheaper = {weight: set() for weight in _COLUMNS}  # open arcs that got lighter
+
+    # True if the graph is in the earlier state again
+    def unchanged(self):
+        return not self.original
+
+    # Record that arc e went from state `before` to `after`
+    def update(self, e, before, after):
+        original = self.original.setdefault(e, before)
+        self.reopened.discard(e)
+        for arcs in self.cheaper.values():
+            arcs.discard(e)
+        if after == original:
+            del self.original[e]
+            return
+        if not after[0]:
+            if original[0]:
+                self.reopened.add(e)
+            else:
+                for weight, position in _STATE.items():
+                    if after[position] < original[position]:
+                        self.cheaper[weight].add(e)
+
+    # Same rule as change_affects, applied to the net difference: a route
+    # using `arcs` is affected if one of them differs, and any route under
+    # `components` if an arc elsewhere reopened or got lighter on one of them
+    def still_optimal(self, components, arcs):
+        if self.reopened or any(self.cheaper[weight] for weight in components if weight in self.cheaper):
+            return False
+        return not any(e in self.original for e in arcs)
+
+# Position of each weight in Graph._arc_state()
+_STATE = {'distance': 1, 'cost': 2, 'duration': 3}
+
+# Whether a logged change can affect a route optimal under `components` that
+# uses `arcs`: its totals change if it uses a changed arc, and a cheaper or
+# reopened arc elsewhere may beat it. Closures and higher weights elsewhere
+# only make other routes worse, so they leave it optimal.
+def change_affects(change, components, arcs):
+    _, changed, weights, worse = change
+    if not changed.isdisjoint(arcs):
+        return True
+    return not worse and (weights is None or any(weight in components for weight in weights))
+
+# ------------------------------------------------------------------------------------
+#                                   CONSTRUCT GRAPH
+# ------------------------------------------------------------------------------------
+
+# Build the CSR graph from the dataset without iterating over rows
+def build_graph(df, undirected=True):
+    import pandas as pd
+
+    source = df['Source_Stations'].to_numpy(dtype=object)
+    destination = df['Destination_Stations'].to_numpy(dtype=object)
+    rows = len(df)
+
+    # Intern names to integer ids. Ids follow sorted name order, so comparing ids
+    # breaks ties exactly like comparing the names did.
+    station_codes, stations = pd.factorize(np.concatenate([source, destination]), sort=True)
+    line_codes, lines = pd.factorize(df['Line'].to_numpy(dtype=object), sort=True)
+    source_ids = station_codes[:rows]
+    destination_ids = station_codes[rows:]
+
+    distance = df['Distance_(Km)'].to_numpy(dtype=np.float64)
+    cost = df['Cost_(Yen)'].to_numpy(dtype=np.int64)
+    duration = df['Durations_(Min)'].to_numpy(dtype=np.int64)
+
+    if undirected:
+        # Arc 2i is row i forwards and arc 2i + 1 is row i backwards
+        tails = np.column_stack([source_ids, destination_ids]).ravel()
+        heads = np.column_stack([destination_ids, source_ids]).ravel()
+        line_codes = np.repeat(line_codes, 2)
+        distance = np.repeat(distance, 2)
+        cost = np.repeat(cost, 2)
+        duration = np.repeat(duration, 2)
+    else:
+        tails = source_ids
+        heads = destination_ids
+
+    # A stable sort keeps every station's arcs in file order
+    order = np.argsort(tails, kind='stable')
+    counts = np.bincount(tails, minlength=len(stations))
+    offsets = np.zeros(len(stations) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    return Graph(
+        stations,
+        lines,
+        offsets,
+        heads[order].astype(np.int32),
+        line_codes[order].astype(np.int32),
+        distance[order],
+        cost[order],
+        duration[order],
+    )
+
+# ------------------------------------------------------------------------------------
+#                                      SNAPSHOT
+# ------------------------------------------------------------------------------------
+
+def snapshot_path(path=CSV_PATH, undirected=True, directory=SNAPSHOT_DIRECTORY):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(directory, f"{stem}.{'undirected' if undirected else 'directed'}.npz")
+
+def save_snapshot(graph, snapshot, csv_hash):
+    os.makedirs(os.path.dirname(snapshot) or '.', exist_ok=True)
+    # Written under a temporary name and renamed, so processes starting at the
+    # same time never read a half-written file
+    temporary = f"{snapshot}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        np.savez(
+            f,
+            csv_hash=np.array(csv_hash),
+            stations=np.array(graph.stations, dtype=str),
+            lines=np.array(graph.lines, dtype=str),
+            offsets=graph.offsets,
+            neighbors=graph.neighbors,
+            line_ids=graph.line_ids,
+            distance=graph.distance,
+            cost=graph.cost,
+            duration=graph.duration,
+        )
+    os.replace(temporary, snapshot)
+
+# The graph stored in `snapshot`, or None if it is missing, unreadable or was
+# built from a CSV with a different hash
+def load_snapshot(snapshot, csv_hash):
+    try:
+        with np.load(snapshot, allow_pickle=False) as data:
+            if str(data['csv_hash']) != csv_hash:
+                return None
+            return Graph(
+                data['stations'].tolist(),
+                data['lines'].tolist(),
+                data['offsets'],
+                data['neighbors'],
+                data['line_ids'],
+                data['distance'],
+                data['cost'],
+                data['duration'],
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+
+# Load the dataset, from its snapshot when one matches the CSV. Otherwise the
+# CSV is parsed with pandas and the snapshot (re)written for the next run.
+# Pass snapshot_directory=None to always parse the CSV.
+def load_graph(path=CSV_PATH, undirected=True, snapshot_directory=SNAPSHOT_DIRECTORY):
+    if snapshot_directory is None:
+        return _parse_csv(path, undirected)
+    return load_versioned_graph(path, undirected, snapshot_directory)[0]
+
+# load_graph, also returning the hash of the CSV the graph was built from, so
+# files derived from it can be tagged with the same version
+def load_versioned_graph(path=CSV_PATH, undirected=True, snapshot_directory=SNAPSHOT_DIRECTORY):
+    csv_hash = file_hash(path)
+    snapshot = snapshot_path(path, undirected, snapshot_directory)
+    graph = load_snapshot(snapshot, csv_hash)
+    if graph is None:
+        graph = _parse_csv(path, undirected)
+        try:
+            save_snapshot(graph, snapshot, csv_hash)
+        except OSError:
+            pass  # Read-only checkout: keep working, just without the speed-up
+    return graph, csv_hash
+
+def _parse_csv(path, undirected):
+    import pandas as pd
+
+    return build_graph(pd.read_csv(path), undirected=undirected)
+
+# Content hash of the dataset, used to tell whether derived files are stale
+def file_hash(path=CSV_PATH):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# ------------------------------------------------------------------------------------
+#                                 STARTUP BENCHMARK
+# ------------------------------------------------------------------------------------
+
+# Median wall-clock time of fresh interpreters running `code`, in milliseconds
+def _time_process(code, repeats):
+    times = []
+    for _ in range(repeats):
+        began = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        times.append(time.perf_counter() - began)
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+# Cold start of a fresh process: loading from the CSV against loading from the
+# snapshot, next to the bare interpreter and the NumPy import it cannot avoid
+def benchmark_startup(path=CSV_PATH, repeats=11):
+    load_graph(path)  # Make sure the snapshot exists
+    setup = f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+    cases = [
+        ('python', "pass"),
+        ('import numpy', "import numpy"),
+        ('csv (pandas)', setup + f"from graph import load_graph; load_graph({path!r}, snapshot_directory=None)"),
+        ('snapshot', setup + f"from graph import load_graph; load_graph({path!r})"),
+    ]
+    return {name: _time_process(code, repeats) for name, code in cases}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the graph snapshot or time cold starts")
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot = commands.add_parser('snapshot', help="parse the CSV and write its snapshot")
+    snapshot.add_argument('csv', nargs='?', default=CSV_PATH)
+    benchmark = commands.add_parser('benchmark', help="time a fresh process loading the graph")
+    benchmark.add_argument('csv', nargs='?', default=CSV_PATH)
+    benchmark.add_argument('--repeats', type=int, default=11)
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        for undirected in (True, False):
+            save_snapshot(_parse_csv(args.csv, undirected), snapshot_path(args.csv, undirected), file_hash(args.csv))
+        print(f"Snapshots of {args.csv} written to {SNAPSHOT_DIRECTORY}/")
+    else:
+        for name, milliseconds in benchmark_startup(args.csv, args.repeats).items():
+            print(f"{name:14s} {milliseconds:8.1f} ms")
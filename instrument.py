@@ -0,0 +1,168 @@
+# Opt-in instrumentation of a single search.
+#
+#     result, stats = profile_search(dijkstra_search, graph, 'Tokyo', 'Sendai')
+#     print(stats.to_json())
+#
+# records for one query:
+#   settled       stations (or states, labels, RAPTOR stops) whose arcs were scanned
+#   relaxed       arcs (or hierarchy edges, route stops) read while scanning them
+#   pushes, pops  priority queue / deque operations, not counting the start entry
+#   stale         pops that settled nothing: outdated entries, dominated labels
+#   max_frontier  largest queue size seen
+#   phases_ms     graph load, search and path reconstruction time
+#
+# Every engine takes an optional `stats` argument and counts into it; with the
+# default None they run exactly as before, apart from one `is None` test per
+# settled state. Nothing global is patched, so profiled and unprofiled queries
+# can run side by side in any number of threads. The counting itself is part
+# of the measured search time.
+#
+#     python instrument.py Tokyo Sendai --engines dijkstra_search astar_landmarks
+
+import argparse
+import heapq
+import json
+import time
+from collections import deque
+
+from graph import CSV_PATH, load_graph
+from line_graph import line_graph
+
+class SearchStats:
+    def __init__(self, engine, start, goal):
+        self.engine = engine
+        self.start = start
+        self.goal = goal
+        self.found = False
+        self.settled = 0
+        self.relaxed = 0
+        self.pushes = 0
+        self.pops = 0
+        self.stale = 0
+        self.max_frontier = 0
+        self.phases_ms = {'load': 0.0, 'search': 0.0, 'reconstruct': 0.0}
+
+    # ----- called by the engines -----
+
+    # A state is expanded, reading `arcs` arcs
+    def settle(self, arcs):
+        self.settled += 1
+        self.relaxed += arcs
+
+    def heappush(self, heap, item):
+        heapq.heappush(heap, item)
+        self._pushed(len(heap))
+
+    def heappop(self, heap):
+        self.pops += 1
+        return heapq.heappop(heap)
+
+    # A deque that counts its operations into these stats
+    def deque(self, items=()):
+        return _CountingDeque(self, items)
+
+    # Call function(*args), adding its run time to `phase`
+    def timed(self, phase, function, *args):
+        began = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.phases_ms[phase] += (time.perf_counter() - began) * 1000
+
+    def _pushed(self, size):
+        self.pushes += 1
+        if size > self.max_frontier:
+            self.max_frontier = size
+
+    # ----- export -----
+
+    def to_dict(self):
+        return {
+            'engine': self.engine,
+            'start': self.start,
+            'goal': self.goal,
+            'found': self.found,
+            'settled': self.settled,
+            'relaxed': self.relaxed,
+            'pushes': self.pushes,
+            'pops': self.pops,
+            'stale': self.stale,
+            'max_frontier': self.max_frontier,
+            'phases_ms': dict(self.phases_ms),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+class _CountingDeque(deque):
+    def __init__(self, stats, items=()):
+        deque.__init__(self, items)
+        self.stats = stats
+
+    def append(self, item):
+        deque.append(self, item)
+        self.stats._pushed(len(self))
+
+    def appendleft(self, item):
+        deque.appendleft(self, item)
+        self.stats._pushed(len(self))
+
+    def popleft(self):
+        self.stats.pops += 1
+        return deque.popleft(self)
+
+    def pop(self):
+        self.stats.pops += 1
+        return deque.pop(self)
+
+# Callback that appends every query's stats to a JSON-lines file
+def json_logger(path):
+    def log(stats):
+        with open(path, 'a') as f:
+            f.write(stats.to_json() + '\n')
+    return log
+
+# ------------------------------------------------------------------------------------
+#                                      PROFILING
+# ------------------------------------------------------------------------------------
+
+# Run search_function(graph, start, goal, *args, stats=stats) and return
+# (result, stats). Pass graph=None to load it from `csv_path`, which is then
+# timed as the load phase. `callback`, if given, receives the stats.
+def profile_search(search_function, graph, start, goal, *args, csv_path=CSV_PATH, callback=None):
+    stats = SearchStats(getattr(search_function, '__name__', str(search_function)), start, goal)
+    if graph is None:
+        began = time.perf_counter()
+        graph = load_graph(csv_path)
+        stats.phases_ms['load'] = (time.perf_counter() - began) * 1000
+    # Built outside the measurements, like any cached structure would be
+    graph.reverse()
+    line_graph(graph)
+
+    began = time.perf_counter()
+    result = search_function(graph, start, goal, *args, stats=stats)
+    total = (time.perf_counter() - began) * 1000
+    stats.phases_ms['search'] = total - stats.phases_ms['reconstruct']
+    # Single routes are tuples of Nones when not found; lists and dicts are empty
+    stats.found = bool(result) and (not isinstance(result, tuple) or result[0] is not None)
+    if callback is not None:
+        callback(stats)
+    return result, stats
+
+if __name__ == '__main__':
+    from benchmark import ENGINES
+
+    parser = argparse.ArgumentParser(description="Profile one query on several engines")
+    parser.add_argument('start')
+    parser.add_argument('goal')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--csv', default=CSV_PATH)
+    args = parser.parse_args()
+
+    graph = load_graph(args.csv)
+    for name in args.engines:
+        prepare, search, _ = ENGINES[name]
+        context = prepare(graph, args.csv)
+        _, stats = profile_search(lambda graph, start, goal, stats: search(graph, context, start, goal, stats), graph, args.start, args.goal)
+        stats.engine = name
+        print(stats.to_json())
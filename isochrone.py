@@ -0,0 +1,135 @@
+# Budget queries: every station reachable within N minutes, N yen or N km.
+#
+#     reachable(graph, 'Tokyo', 180)                # within 3 hours
+#     reachable(graph, 'Tokyo', 10000, 'cost')      # within 10,000 yen
+#
+# reachable() is one Dijkstra from the start that stops as soon as the budget
+# is used up, instead of one search per destination. Every station it settles
+# comes with the totals of its best route and the station before it, so the
+# routes themselves can be drawn from the predecessors.
+#
+# reachable_many() answers the same question for many starts at once, for one
+# weight. Its frontier holds (start, station) pairs that just improved; each
+# round expands all of their arcs at once with NumPy over the CSR arrays, keeps
+# the best candidate per pair within the budget, and repeats until nothing
+# improves. Stations reachable from any of the starts are the finite entries
+# of values.min(axis=0).
+#
+#     python isochrone.py Tokyo --budget 180
+#     python isochrone.py Tokyo Shin-Osaka Sendai --budget 120 --weight duration
+
+import argparse
+
+import numpy as np
+
+from astar import _check_weight
+from graph import CSV_PATH, load_graph
+from router import _dijkstra, resolve_criterion
+
+# Stations reachable from `start` with the criterion's first component at most
+# `budget`, as {name: (distance, cost, duration, transfers, predecessor)} in
+# order of that component. The predecessor is None for the start. `stats`
+# (instrument.SearchStats), if given, counts the search and times the totals
+# as reconstruction.
+def reachable(graph, start, budget, criterion='duration', stats=None):
+    criterion = resolve_criterion(criterion)
+    s = graph.index(start)
+    if s is None:
+        raise KeyError(f"Unknown station {start!r}")
+    tree = _dijkstra(graph, s, criterion, limit=budget, stats=stats)
+    if stats is not None:
+        return stats.timed('reconstruct', _totals, graph, tree)
+    return _totals(graph, tree)
+
+# The reachable() result for the stations settled in `tree`
+def _totals(graph, tree):
+    _, _, line_ids, distance, cost, duration = graph.as_lists()
+
+    # Totals per search state, summed down from the start. A station's best
+    # state may hang below states of other stations' lines, so walk up to the
+    # nearest state already summed.
+    totals = {}  # state -> (distance, cost, duration, transfers, arrival line)
+    for state in tree.best.values():
+        chain = []
+        while state not in totals and tree.parent[state] is not None:
+            chain.append(state)
+            state = tree.parent[state][0]
+        if state not in totals:
+            totals[state] = (0, 0, 0, 0, None)
+        for state in reversed(chain):
+            previous, e = tree.parent[state]
+            d, c, t, transfers, line = totals[previous]
+            totals[state] = (d + distance[e], c + cost[e], t + duration[e], transfers + (line is not None and line != line_ids[e]), line_ids[e])
+
+    names = graph.stations
+    result = {}
+    for v, state in tree.best.items():
+        d, c, t, transfers, _ = totals[state]
+        link = tree.parent[state]
+        result[names[v]] = (d, c, t, transfers, None if link is None else names[link[0] // tree.width])
+    return result
+
+# Budget search from every station name in `starts` at once, on one weight.
+# Returns (values, predecessors), both [len(starts), stations]: the best
+# weight (inf beyond the budget) and the station id before it (-1 for the
+# start and unreached stations). `stats`, if given, counts every expanded
+# (start, station) pair as settled and its arcs as relaxed.
+def reachable_many(graph, starts, budget, weight='duration', stats=None):
+    _check_weight(weight)
+    sources = []
+    for name in starts:
+        s = graph.index(name)
+        if s is None:
+            raise KeyError(f"Unknown station {name!r}")
+        sources.append(s)
+    n = graph.num_stations
+    offsets, neighbors, closed = graph.offsets, graph.neighbors, graph.closed
+    weights = getattr(graph, weight).astype(np.float64)
+
+    # Flat [start, station] arrays, indexed start * n + station
+    values = np.full(len(sources) * n, np.inf)
+    predecessors = np.full(len(sources) * n, -1, dtype=np.int64)
+    frontier = np.arange(len(sources)) * n + np.array(sources, dtype=np.int64)
+    values[frontier] = 0
+    while len(frontier):
+        # Every arc leaving every frontier entry, laid out with repeat and cumsum
+        row, station = np.divmod(frontier, n)
+        first, counts = offsets[station], offsets[station + 1] - offsets[station]
+        owner = np.repeat(np.arange(len(frontier)), counts)
+        arcs = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[owner]
+        if stats is not None:
+            stats.settled += len(frontier)
+            stats.relaxed += len(arcs)
+        candidate = values[frontier[owner]] + weights[arcs]
+        target = row[owner] * n + neighbors[arcs]
+        keep = ~closed[arcs] & (candidate <= budget) & (candidate < values[target])
+        owner, candidate, target = owner[keep], candidate[keep], target[keep]
+
+        # Keep the best candidate per target; the improved entries are the next frontier
+        order = np.lexsort((candidate, target))
+        owner, candidate, target = owner[order], candidate[order], target[order]
+        best = np.r_[True, target[1:] != target[:-1]] if len(target) else np.zeros(0, dtype=bool)
+        frontier = target[best]
+        values[frontier] = candidate[best]
+        predecessors[frontier] = station[owner[best]]
+    return values.reshape(len(sources), n), predecessors.reshape(len(sources), n)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stations reachable within a budget")
+    parser.add_argument('starts', nargs='+')
+    parser.add_argument('--budget', type=float, required=True)
+    parser.add_argument('--weight', default='duration', choices=('duration', 'cost', 'distance'))
+    parser.add_argument('--csv', default=CSV_PATH)
+    args = parser.parse_args()
+
+    graph = load_graph(args.csv)
+    if len(args.starts) == 1:
+        stations = reachable(graph, args.starts[0], args.budget, args.weight)
+        print(f"{len(stations)} stations within {args.budget:g} ({args.weight}) of {args.starts[0]}:")
+        for name, (distance, cost, duration, transfers, predecessor) in stations.items():
+            print(f"  {name:22s} {duration:5d} min {cost:7d} yen {distance:8.1f} km {transfers} transfers  via {predecessor or '-'}")
+    else:
+        values, _ = reachable_many(graph, args.starts, args.budget, args.weight)
+        for start, row in zip(args.starts, values):
+            print(f"{start}: {int(np.isfinite(row).sum())} stations within {args.budget:g} ({args.weight})")
+        print(f"From any of them: {int(np.isfinite(values.min(axis=0)).sum())} stations")
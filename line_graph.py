@@ -0,0 +1,153 @@
+# Line-expanded graph for exact minimum-transfer routing.
+#
+# Every (station, line) pair that appears in the data becomes its own node,
+# next to one plain node per station. Riding an arc keeps the line, so it is a
+# 0-transfer edge from (u, line) to (v, line). Changing trains means alighting
+# to the station node (a 1-transfer edge) and boarding another line from it
+# (a 0-transfer edge), which keeps the graph linear in the number of pairs.
+# Searching it with Dijkstra on (transfers, duration) gives the provably
+# smallest number of transfers, and the fastest route among those, settling
+# every node at most once.
+#
+# Live updates to the graph are patched in: a changed duration is copied onto
+# the arc's ride edge, and a closed arc's ride edge is pointed back at its own
+# node, a loop that can never improve a route.
+
+import heapq
+
+import numpy as np
+
+class LineGraph:
+    def __init__(self, graph):
+        num_lines = len(graph.lines)
+        tails, heads, line_ids = graph.tails().astype(np.int64), graph.neighbors.astype(np.int64), graph.line_ids.astype(np.int64)
+
+        # Nodes 0..n-1 are the stations. After them comes one node per distinct
+        # (station, line); sorting the keys keeps each station's pairs contiguous.
+        n = graph.num_stations
+        keys, inverse = np.unique(np.concatenate([tails * num_lines + line_ids, heads * num_lines + line_ids]), return_inverse=True)
+        pair_station = keys // num_lines
+        self.node_station = np.concatenate([np.arange(n), pair_station]).astype(np.int32)
+        self.node_line = np.concatenate([np.full(n, -1), keys % num_lines]).astype(np.int32)
+        num_nodes = n + len(keys)
+        pair_nodes = np.arange(n, num_nodes, dtype=np.int64)
+
+        # Ride edges, one per arc of the original graph
+        ride_source = n + inverse[:len(tails)]
+        ride_target = n + inverse[len(tails):]
+        ride_arc = np.arange(len(tails), dtype=np.int64)
+
+        # Alight (1 transfer) and board (0 transfers) edges at every station
+        alight_source, alight_target = pair_nodes, pair_station
+        board_source, board_target = pair_station, pair_nodes
+        stops = len(keys)
+
+        source = np.concatenate([ride_source, alight_source, board_source])
+        target = np.concatenate([ride_target, alight_target, board_target])
+        arc = np.concatenate([ride_arc, np.full(2 * stops, -1, dtype=np.int64)])
+        transfer = np.concatenate([np.zeros(len(tails), dtype=np.int64), np.ones(stops, dtype=np.int64), np.zeros(stops, dtype=np.int64)])
+        duration = np.concatenate([graph.duration, np.zeros(2 * stops, dtype=graph.duration.dtype)])
+
+        order = np.argsort(source, kind='stable')
+        self.offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=num_nodes), out=self.offsets[1:])
+        self.target = target[order]
+        self.arc = arc[order]            # original arc, -1 for boarding and alighting
+        self.transfer = transfer[order]  # 1 on alighting edges
+        self.duration = duration[order]
+        self.num_nodes = num_nodes
+        self.num_edges = len(self.target)
+        self._lists = (
+            self.offsets.tolist(),
+            self.target.tolist(),
+            self.arc.tolist(),
+            self.transfer.tolist(),
+            self.duration.tolist(),
+            self.node_station.tolist(),
+        )
+        self._heads = graph.neighbors.tolist()
+
+        # Ride edge of every arc, with its two ends, for repair()
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        self._ride = (position[:len(tails)].tolist(), ride_source.tolist(), ride_target.tolist())
+        self.repair(graph, np.flatnonzero(graph.closed).tolist())
+
+    # Follow live updates of `arcs` in the graph (see Graph._changed)
+    def repair(self, graph, arcs):
+        _, target, _, _, duration, _ = self._lists
+        closed, arc_duration = graph.closures(), graph.as_lists()[5]
+        edge, source, original = self._ride
+        for e in arcs:
+            i = edge[e]
+            self.target[i] = target[i] = source[e] if closed[e] else original[e]
+            self.duration[i] = duration[i] = arc_duration[e]
+        return True
+
+    # Minimum transfers from station id s to g, ties broken on duration.
+    # Returns the station path and original arcs, or (None, None).
+    #
+    # The heap is ordered on (transfers, duration), so a node is settled once,
+    # with its final label, and the first goal node popped is the answer. A
+    # 0-1 BFS would be linear, but it is only exact for transfers: breaking
+    # ties on duration in it means re-expanding nodes, so the log factor of
+    # the heap is the price of settling each node once.
+    # `stats` (instrument.SearchStats), if given, counts the search.
+    def search(self, s, g, stats=None):
+        offsets, target, arc, transfer, duration, node_station = self._lists
+        inf = float('inf')
+        transfers = [inf] * self.num_nodes
+        elapsed = [inf] * self.num_nodes
+        parent = [-1] * self.num_nodes  # edge used to reach each node
+        parent_node = [-1] * self.num_nodes
+        # Start on the station node of s; boarding any line from it is free
+        transfers[s] = 0
+        elapsed[s] = 0
+        heap = [(0, 0, s)]
+        push = heapq.heappush if stats is None else stats.heappush
+        pop = heapq.heappop if stats is None else stats.heappop
+
+        best_node = -1
+        while heap:
+            node_transfers, node_elapsed, node = pop(heap)
+            if node_transfers != transfers[node] or node_elapsed != elapsed[node]:
+                if stats is not None:
+                    stats.stale += 1
+                continue  # Stale entry
+            if node_station[node] == g:
+                best_node = node
+                break
+            if stats is not None:
+                stats.settle(offsets[node + 1] - offsets[node])
+            for e in range(offsets[node], offsets[node + 1]):
+                neighbor = target[e]
+                new_transfers = node_transfers + transfer[e]
+                new_elapsed = node_elapsed + duration[e]
+                if (new_transfers, new_elapsed) < (transfers[neighbor], elapsed[neighbor]):
+                    transfers[neighbor] = new_transfers
+                    elapsed[neighbor] = new_elapsed
+                    parent[neighbor] = e
+                    parent_node[neighbor] = node
+                    push(heap, (new_transfers, new_elapsed, neighbor))
+
+        if best_node == -1:
+            return None, None
+        if stats is not None:
+            return stats.timed('reconstruct', self._trace, s, best_node, parent, parent_node)
+        return self._trace(s, best_node, parent, parent_node)
+
+    # Station path and original arcs to `node`, from the parent edges
+    def _trace(self, s, node, parent, parent_node):
+        arc = self._lists[2]
+        arcs = []
+        while parent[node] != -1:
+            e = parent[node]
+            if arc[e] != -1:
+                arcs.append(arc[e])
+            node = parent_node[node]
+        arcs.reverse()
+        heads = self._heads
+        return [s] + [heads[e] for e in arcs], arcs
+
+def line_graph(graph):
+    return graph.derived('line_graph', LineGraph)
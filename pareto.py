@@ -0,0 +1,109 @@
+# Pareto-optimal multi-criteria routing.
+#
+# A label-setting search (multi-criteria Dijkstra, as in McRAPTOR's bags) that
+# keeps, per (station, arrival line), every route that is not beaten on all of
+# duration, cost and transfers at once. One search returns the whole trade-off
+# frontier between the start and the goal.
+#
+# The label sets stay small because a label is discarded as soon as it is
+# dominated by:
+#   - a settled label at the same station on the same line,
+#   - a settled label at the same station on another line that is at least one
+#     transfer better (switching lines costs it at most one transfer),
+#   - a route already found to the goal (costs only grow from here on).
+# `max_transfers` bounds the search further, like the round limit in RAPTOR.
+
+import heapq
+
+from search import _endpoints, _result
+
+class _Label:
+    __slots__ = ('parent', 'station', 'line', 'arc', 'duration', 'cost', 'transfers')
+
+    def __init__(self, parent, station, line, arc, duration, cost, transfers):
+        self.parent = parent
+        self.station = station
+        self.line = line
+        self.arc = arc
+        self.duration = duration
+        self.cost = cost
+        self.transfers = transfers
+
+    # True if this label is at least as good as (duration, cost, transfers)
+    def covers(self, duration, cost, transfers):
+        return self.duration <= duration and self.cost <= cost and self.transfers <= transfers
+
+    def trace(self):
+        path, arcs = [], []
+        label = self
+        while label is not None:
+            path.append(label.station)
+            if label.arc is not None:
+                arcs.append(label.arc)
+            label = label.parent
+        path.reverse()
+        arcs.reverse()
+        return path, arcs
+
+def _dominated(station_bag, line_bag, goal_bag, duration, cost, transfers):
+    for label in goal_bag:
+        if label.covers(duration, cost, transfers):
+            return True
+    for label in line_bag:
+        if label.covers(duration, cost, transfers):
+            return True
+    for label in station_bag:
+        if label.covers(duration, cost, transfers - 1):
+            return True
+    return False
+
+# Every Pareto-optimal route from `start` to `goal` over (duration, cost,
+# transfers), as result tuples sorted by duration, then cost, then transfers
+def pareto_search(graph, start, goal, max_transfers=None, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return []
+    offsets, neighbors, line_ids, _, cost, duration = graph.as_lists()
+    closed = graph.closures()
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+
+    station_bags = {}  # station -> settled labels on any line
+    line_bags = {}     # (station, line) -> settled labels
+    goal_bag = []
+    counter = 0        # Push order, keeps heap ties deterministic
+    queue = [(0, 0, 0, counter, _Label(None, s, None, None, 0, 0, 0))]
+    while queue:
+        label_duration, label_cost, label_transfers, _, label = pop(queue)
+        current, line = label.station, label.line
+
+        # Labels come out in lexicographic order, so a settled label is never
+        # dominated later; checking on pop is enough to keep the bags minimal
+        station_bag = station_bags.setdefault(current, [])
+        line_bag = line_bags.setdefault((current, line), [])
+        if _dominated(station_bag, line_bag, goal_bag, label_duration, label_cost, label_transfers):
+            if stats is not None:
+                stats.stale += 1
+            continue
+        if current == g:
+            goal_bag.append(label)
+            continue
+        station_bag.append(label)
+        line_bag.append(label)
+        if stats is not None:
+            stats.settle(offsets[current + 1] - offsets[current])
+
+        for e in range(offsets[current], offsets[current + 1]):
+            if closed[e]:
+                continue
+            neighbor, next_line = neighbors[e], line_ids[e]
+            new_transfers = label_transfers + (line is not None and line != next_line)
+            if max_transfers is not None and new_transfers > max_transfers:
+                continue
+            new_duration = label_duration + duration[e]
+            new_cost = label_cost + cost[e]
+            if _dominated(station_bags.get(neighbor, ()), line_bags.get((neighbor, next_line), ()), goal_bag, new_duration, new_cost, new_transfers):
+                continue
+            counter += 1
+            push(queue, (new_duration, new_cost, new_transfers, counter, _Label(label, neighbor, next_line, e, new_duration, new_cost, new_transfers)))
+
+    return [_result(graph, stats, label.trace) for label in goal_bag]
@@ -0,0 +1,446 @@
+# Timetable routing with RAPTOR (Round-bAsed Public Transit Optimized Router).
+#
+# The static graph only knows how long a segment takes, so it cannot say when a
+# traveller leaving at 08:10 arrives, nor how long they wait for a connection.
+# This module reads an optional timetable of actual trips instead:
+#
+#     Trip,Line,Station,Arrival,Departure
+#     17,Hakutaka,Tokyo,08:24,08:24
+#     17,Hakutaka,Ueno,08:29,08:30
+#     ...
+#
+# one row per stop, in stop order within each trip, times as HH:MM (hours may
+# go past 24 for trips running after midnight). Trips of the same Line that
+# call at the same stations form a route.
+#
+# RAPTOR works in rounds: round k scans every route serving a station improved
+# in round k - 1, so after round k the arrival times are optimal among
+# journeys with at most k trains. No priority queue and no time-expanded graph
+# is needed, and routes, stops and stop times all live in flat lists that the
+# rounds read in order.
+#
+# A sample timetable can be generated from shinkansen.csv:
+#     python raptor.py generate
+#     python raptor.py route Tokyo Kanazawa 08:10
+#     python raptor.py route Tokyo Kanazawa 08:00 --until 10:00
+
+import argparse
+import os
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+from graph import CSV_PATH
+
+TIMETABLE_PATH = 'timetable.csv'
+CHANGE_TIME = 5   # Minutes needed to change trains at a station
+MAX_ROUNDS = 8    # Trains per journey, so at most MAX_ROUNDS - 1 transits
+
+def parse_time(text):
+    hours, minutes = text.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+# ------------------------------------------------------------------------------------
+#                                     TIMETABLE
+# ------------------------------------------------------------------------------------
+
+class Timetable:
+    def __init__(self, stations, route_lines, route_stop_offsets, route_stops, route_trip_offsets, trip_names, time_offsets, arrivals, departures):
+        self.stations = list(stations)  # station id -> name
+        self.station_index = {name: i for i, name in enumerate(self.stations)}
+        self.route_lines = route_lines  # route id -> line name
+
+        # Stops of route r: route_stops[route_stop_offsets[r]:route_stop_offsets[r + 1]]
+        self.route_stop_offsets = route_stop_offsets
+        self.route_stops = route_stops
+        # Trips of route r, ordered by departure: trip_names[route_trip_offsets[r]:route_trip_offsets[r + 1]]
+        self.route_trip_offsets = route_trip_offsets
+        self.trip_names = trip_names
+        # Stop times of route r are stored stop by stop from time_offsets[r]:
+        # the time of trip t at stop i is at time_offsets[r] + i * trips + t,
+        # so the departures of all trips at one stop are sorted and contiguous
+        self.time_offsets = time_offsets
+        self.arrivals = arrivals
+        self.departures = departures
+
+        # Routes serving each station, with the station's position on the route
+        station_routes = [[] for _ in self.stations]
+        for r in range(len(route_lines)):
+            for i, p in enumerate(route_stops[route_stop_offsets[r]:route_stop_offsets[r + 1]]):
+                station_routes[p].append((r, i))
+        self.station_route_offsets = np.cumsum([0] + [len(pairs) for pairs in station_routes]).tolist()
+        self.station_routes = [r for pairs in station_routes for r, _ in pairs]
+        self.station_route_positions = [i for pairs in station_routes for _, i in pairs]
+
+    @property
+    def num_routes(self):
+        return len(self.route_lines)
+
+    @property
+    def num_trips(self):
+        return len(self.trip_names)
+
+    def index(self, station):
+        return self.station_index.get(station)
+
+    # Load a timetable CSV, or return None if there is none
+    @classmethod
+    def open(cls, path=TIMETABLE_PATH):
+        if not os.path.exists(path):
+            return None
+        import pandas as pd
+
+        return build_timetable(pd.read_csv(path, dtype={'Trip': str}))
+
+# Group trips into routes and lay their stop times out in flat lists
+def build_timetable(df):
+    stations = sorted(set(df['Station']))
+    station_index = {name: i for i, name in enumerate(stations)}
+
+    # Trips with the same line and stop sequence share a route
+    patterns = defaultdict(list)
+    for trip, rows in df.groupby('Trip', sort=False):
+        stops = tuple(station_index[name] for name in rows['Station'])
+        arrivals = [parse_time(t) for t in rows['Arrival']]
+        departures = [parse_time(t) for t in rows['Departure']]
+        patterns[rows['Line'].iloc[0], stops].append((departures[0], trip, arrivals, departures))
+
+    route_lines, route_stops, route_trips = [], [], []
+    for (line, stops), trips in patterns.items():
+        trips.sort(key=lambda trip: (trip[0], trip[1]))
+        # RAPTOR assumes no trip of a route overtakes another, so a trip that
+        # would overtake goes into a route of its own
+        groups = []
+        for trip in trips:
+            for group in groups:
+                last = group[-1]
+                if all(a <= b for a, b in zip(last[2], trip[2])) and all(a <= b for a, b in zip(last[3], trip[3])):
+                    group.append(trip)
+                    break
+            else:
+                groups.append([trip])
+        for group in groups:
+            route_lines.append(line)
+            route_stops.append(stops)
+            route_trips.append(group)
+
+    route_stop_offsets, flat_stops = [0], []
+    route_trip_offsets, trip_names = [0], []
+    time_offsets, arrivals, departures = [], [], []
+    for stops, trips in zip(route_stops, route_trips):
+        flat_stops.extend(stops)
+        route_stop_offsets.append(len(flat_stops))
+        trip_names.extend(trip[1] for trip in trips)
+        route_trip_offsets.append(len(trip_names))
+        time_offsets.append(len(arrivals))
+        for i in range(len(stops)):
+            arrivals.extend(trip[2][i] for trip in trips)
+            departures.extend(trip[3][i] for trip in trips)
+
+    return Timetable(stations, route_lines, route_stop_offsets, flat_stops, route_trip_offsets, trip_names, time_offsets, arrivals, departures)
+
+# ------------------------------------------------------------------------------------
+#                                 SAMPLE TIMETABLE
+# ------------------------------------------------------------------------------------
+
+# Split the segments of one line into as few stop sequences as possible,
+# taking the longest chain of unused segments each time
+def _line_patterns(segments):
+    remaining = list(segments)
+    while remaining:
+        outgoing = defaultdict(list)
+        for source, destination, duration in remaining:
+            outgoing[source].append((destination, duration))
+
+        longest = {}
+        def chain(station, visiting):
+            if station not in longest:
+                best = [station]
+                for destination, duration in outgoing.get(station, ()):
+                    if destination not in visiting:
+                        rest = chain(destination, visiting | {station})
+                        if len(rest) + 1 > len(best):
+                            best = [station] + rest
+                longest[station] = best
+            return longest[station]
+
+        stops = max((chain(source, frozenset()) for source in outgoing), key=len)
+        durations = []
+        for source, destination in zip(stops, stops[1:]):
+            duration = min(d for s, t, d in remaining if s == source and t == destination)
+            durations.append(duration)
+            remaining.remove(next(segment for segment in remaining if segment[:2] == (source, destination) and segment[2] == duration))
+        yield stops, durations
+
+# Write a regular-interval timetable built from the segments in shinkansen.csv.
+# Every stop sequence of every line runs in both directions each `headway`
+# minutes between `first` and `last`, dwelling `dwell` minutes at each stop.
+def generate_timetable(csv_path=CSV_PATH, path=TIMETABLE_PATH, first='06:00', last='22:00', headway=30, dwell=1):
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    rows = []
+    trip = 0
+    for line_id, (line, segments) in enumerate(df.groupby('Line', sort=True)):
+        # Stagger the lines so they do not all leave on the same minute
+        offset = line_id * 7 % headway
+        segments = list(zip(segments['Source_Stations'], segments['Destination_Stations'], segments['Durations_(Min)']))
+        for stops, durations in _line_patterns(segments):
+            for direction_stops, direction_durations in ((stops, durations), (stops[::-1], durations[::-1])):
+                for start in range(parse_time(first) + offset, parse_time(last) + 1, headway):
+                    trip += 1
+                    arrival = departure = start
+                    for i, station in enumerate(direction_stops):
+                        if i > 0:
+                            arrival = departure + int(direction_durations[i - 1])
+                            departure = arrival + dwell if i < len(direction_stops) - 1 else arrival
+                        rows.append((trip, line, station, format_time(arrival), format_time(departure)))
+    pd.DataFrame(rows, columns=['Trip', 'Line', 'Station', 'Arrival', 'Departure']).to_csv(path, index=False)
+    return trip
+
+# ------------------------------------------------------------------------------------
+#                                       RAPTOR
+# ------------------------------------------------------------------------------------
+
+# Search state kept between the departures of a range query
+class _Labels:
+    def __init__(self, timetable):
+        n = len(timetable.stations)
+        self.arrival = [[float('inf')] * n]  # per round: earliest arrival at each station
+        self.parent = [[None] * n]           # per round: (route, trip, board, alight) positions
+        self.best = [float('inf')] * n       # earliest arrival over all rounds
+
+    def add_round(self):
+        n = len(self.best)
+        self.arrival.append([float('inf')] * n)
+        self.parent.append([None] * n)
+
+# Run the rounds from `source` leaving at `departure`, reusing `labels` from a
+# later departure when there is one. Arrivals that cannot beat the best arrival
+# at `goal` are pruned; without a goal every station is labelled. `stats`
+# (instrument.SearchStats), if given, counts every marked stop as settled and
+# every stop scanned along a route as relaxed.
+def _rounds(timetable, labels, source, departure, goal=None, max_rounds=MAX_ROUNDS, change_time=CHANGE_TIME, stats=None):
+    route_stop_offsets, route_stops = timetable.route_stop_offsets, timetable.route_stops
+    route_trip_offsets, time_offsets = timetable.route_trip_offsets, timetable.time_offsets
+    arrivals, departures = timetable.arrivals, timetable.departures
+    station_route_offsets = timetable.station_route_offsets
+    station_routes, station_route_positions = timetable.station_routes, timetable.station_route_positions
+    best = labels.best
+    inf = float('inf')
+
+    labels.arrival[0][source] = departure
+    labels.parent[0][source] = None
+    best[source] = min(best[source], departure)
+    marked = {source}
+    k = 0
+    while marked and k < max_rounds:
+        k += 1
+        if len(labels.arrival) <= k:
+            labels.add_round()
+        previous, current, parent = labels.arrival[k - 1], labels.arrival[k], labels.parent[k]
+
+        # Each route is scanned once, from the first stop improved last round
+        queue = {}
+        if stats is not None:
+            stats.settled += len(marked)
+        for p in marked:
+            if previous[p] < current[p]:
+                current[p] = previous[p]
+                parent[p] = None  # Reached with fewer trains, carried over
+            for j in range(station_route_offsets[p], station_route_offsets[p + 1]):
+                r, i = station_routes[j], station_route_positions[j]
+                if i < queue.get(r, inf):
+                    queue[r] = i
+
+        marked = set()
+        target = best[goal] if goal is not None else inf
+        for r, first in queue.items():
+            stop_base = route_stop_offsets[r]
+            num_stops = route_stop_offsets[r + 1] - stop_base
+            num_trips = route_trip_offsets[r + 1] - route_trip_offsets[r]
+            time_base = time_offsets[r]
+            trip, board = num_trips, -1  # num_trips: not on a trip yet
+            if stats is not None:
+                stats.relaxed += num_stops - first
+            for i in range(first, num_stops):
+                p = route_stops[stop_base + i]
+                column = time_base + i * num_trips
+
+                # Stay on the trip and improve the stop if it beats every label so far
+                if trip < num_trips:
+                    arrival = arrivals[column + trip]
+                    if arrival < best[p] and arrival < target:
+                        current[p] = best[p] = arrival
+                        parent[p] = (r, trip, board, i)
+                        marked.add(p)
+                        if p == goal:
+                            target = arrival
+
+                # Catch an earlier trip of this route if the last round reached
+                # the stop in time, allowing for the change of trains
+                ready = previous[p]
+                if ready == inf:
+                    continue
+                if p != source:
+                    ready += change_time
+                if trip == num_trips or ready <= departures[column + trip]:
+                    earliest = bisect_left(departures, ready, column, column + trip) - column
+                    if earliest < trip:
+                        trip, board = earliest, i
+    return k
+
+# Rebuild the journey to `goal` from the labels, as
+# (path, lines, departure, arrival, transit_count, legs) where each leg is
+# (trip, line, board station, departure, alight station, arrival)
+def _journey(timetable, labels, source, goal):
+    arrival = labels.best[goal]
+    if arrival == float('inf'):
+        return None
+    if goal == source:
+        name = timetable.stations[source]
+        return [name], [], arrival, arrival, 0, []
+    k = next(k for k, row in enumerate(labels.arrival) if row[goal] == arrival)
+
+    legs = []
+    p = goal
+    while k > 0:
+        link = labels.parent[k][p]
+        k -= 1
+        if link is None:
+            continue
+        r, trip, board, alight = link
+        legs.append((r, trip, board, alight))
+        p = timetable.route_stops[timetable.route_stop_offsets[r] + board]
+    legs.reverse()
+
+    stations = timetable.stations
+    path, lines, named_legs = [stations[source]], [], []
+    for r, trip, board, alight in legs:
+        stop_base, time_base = timetable.route_stop_offsets[r], timetable.time_offsets[r]
+        num_trips = timetable.route_trip_offsets[r + 1] - timetable.route_trip_offsets[r]
+        stops = timetable.route_stops[stop_base + board:stop_base + alight + 1]
+        path.extend(stations[p] for p in stops[1:])
+        line = timetable.route_lines[r]
+        if not lines or lines[-1] != line:
+            lines.append(line)
+        named_legs.append((
+            timetable.trip_names[timetable.route_trip_offsets[r] + trip],
+            line,
+            stations[stops[0]],
+            timetable.departures[time_base + board * num_trips + trip],
+            stations[stops[-1]],
+            timetable.arrivals[time_base + alight * num_trips + trip],
+        ))
+    return path, lines, named_legs[0][3], arrival, len(named_legs) - 1, named_legs
+
+def _endpoints(timetable, start, goal):
+    return timetable.index(start), timetable.index(goal)
+
+# Earliest arrival at `goal` leaving `start` no earlier than `departure`
+# (minutes after midnight, or 'HH:MM'). Returns None if no trip gets there.
+def earliest_arrival(timetable, start, goal, departure, max_transfers=None, change_time=CHANGE_TIME, stats=None):
+    s, g = _endpoints(timetable, start, goal)
+    if s is None or g is None:
+        return None
+    if isinstance(departure, str):
+        departure = parse_time(departure)
+    max_rounds = MAX_ROUNDS if max_transfers is None else max_transfers + 1
+    labels = _Labels(timetable)
+    _rounds(timetable, labels, s, departure, g, max_rounds, change_time, stats)
+    if stats is not None:
+        return stats.timed('reconstruct', _journey, timetable, labels, s, g)
+    return _journey(timetable, labels, s, g)
+
+# Every journey leaving `start` between `earliest` and `latest` that is not
+# beaten by one leaving later and arriving no later (rRAPTOR). Departures are
+# processed from the latest back, each run starting from the labels of the
+# previous one, so a range costs little more than a single query.
+def range_query(timetable, start, goal, earliest, latest, max_transfers=None, change_time=CHANGE_TIME):
+    s, g = _endpoints(timetable, start, goal)
+    if s is None or g is None:
+        return []
+    if isinstance(earliest, str):
+        earliest = parse_time(earliest)
+    if isinstance(latest, str):
+        latest = parse_time(latest)
+    max_rounds = MAX_ROUNDS if max_transfers is None else max_transfers + 1
+
+    # Candidate departures are the times trips actually leave the start station
+    times = set()
+    for j in range(timetable.station_route_offsets[s], timetable.station_route_offsets[s + 1]):
+        r, i = timetable.station_routes[j], timetable.station_route_positions[j]
+        num_trips = timetable.route_trip_offsets[r + 1] - timetable.route_trip_offsets[r]
+        column = timetable.time_offsets[r] + i * num_trips
+        times.update(t for t in timetable.departures[column:column + num_trips] if earliest <= t <= latest)
+
+    journeys = []
+    labels = _Labels(timetable)
+    for departure in sorted(times, reverse=True):
+        before = labels.best[g]
+        _rounds(timetable, labels, s, departure, g, max_rounds, change_time)
+        if labels.best[g] < before:
+            journeys.append(_journey(timetable, labels, s, g))
+    journeys.reverse()
+    return journeys
+
+# Earliest arrival at every station from `start`, for isochrones and tables
+def arrival_times(timetable, start, departure, max_transfers=None, change_time=CHANGE_TIME):
+    s = timetable.index(start)
+    if s is None:
+        return {}
+    if isinstance(departure, str):
+        departure = parse_time(departure)
+    max_rounds = MAX_ROUNDS if max_transfers is None else max_transfers + 1
+    labels = _Labels(timetable)
+    _rounds(timetable, labels, s, departure, None, max_rounds, change_time)
+    return {timetable.stations[p]: t for p, t in enumerate(labels.best) if t != float('inf')}
+
+def print_journey(journey):
+    path, lines, departure, arrival, transits, legs = journey
+    for trip, line, board, leave, alight, reach in legs:
+        print(f"  {format_time(leave)} {board} -> {format_time(reach)} {alight}  ({line.strip()}, trip {trip})")
+    print("Departure:", format_time(departure), " Arrival:", format_time(arrival))
+    print("Total Duration:", arrival - departure, "minutes")
+    print("Total Transits:", transits)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Timetable routing with RAPTOR")
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help="write a regular-interval sample timetable from the dataset")
+    generate.add_argument('--csv', default=CSV_PATH)
+    generate.add_argument('--output', default=TIMETABLE_PATH)
+    generate.add_argument('--first', default='06:00')
+    generate.add_argument('--last', default='22:00')
+    generate.add_argument('--headway', type=int, default=30)
+    route = commands.add_parser('route', help="earliest arrival, or every best journey with --until")
+    route.add_argument('start')
+    route.add_argument('goal')
+    route.add_argument('departure', help="HH:MM")
+    route.add_argument('--until', help="HH:MM, latest departure of a range query")
+    route.add_argument('--timetable', default=TIMETABLE_PATH)
+    route.add_argument('--max-transfers', type=int, default=None)
+    route.add_argument('--change-time', type=int, default=CHANGE_TIME)
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        trips = generate_timetable(args.csv, args.output, args.first, args.last, args.headway)
+        print(f"{trips} trips written to {args.output}")
+    else:
+        timetable = Timetable.open(args.timetable)
+        if timetable is None:
+            parser.exit(1, f"No timetable at {args.timetable}, create one with: python raptor.py generate\n")
+        if args.until:
+            journeys = range_query(timetable, args.start, args.goal, args.departure, args.until, args.max_transfers, args.change_time)
+        else:
+            journey = earliest_arrival(timetable, args.start, args.goal, args.departure, args.max_transfers, args.change_time)
+            journeys = [journey] if journey else []
+        for number, journey in enumerate(journeys, 1):
+            print(f"\nJourney {number}:")
+            print_journey(journey)
+        if not journeys:
+            print("No journey found.")
@@ -0,0 +1,198 @@
+# Precomputed all-pairs route tables.
+#
+# For every criterion the table stores, per (start, goal) pair, the optimal key
+# and enough next-hop information to rebuild the route without searching:
+#   <criterion>_value.npy  float64[n, n, k]  optimal key (one column per component)
+#   <criterion>_start.npy  int32[n, n]       search state the route leaves start in
+#   <criterion>_next.npy   int32[n, n * w]   per goal: state -> next state towards it
+#   <criterion>_arc.npy    int32[n, n * w]   per goal: state -> arc taken to the next state
+# w is 1 for pure weights and one state per (station, line) when transfers are
+# counted, so lexicographic preferences such as 'fastest' are exact too.
+#
+# Each goal's row comes from one one-to-all Dijkstra on the reversed graph, and
+# the goals are spread over a process pool. The arrays are written and read as
+# memory-mapped .npy files; meta.json records the dataset hash so a table built
+# from an older shinkansen.csv is never used. After live updates to the graph,
+# a stored route is only used while the graph's net difference from the CSV
+# (Graph.baseline) leaves it optimal; other queries are searched on the live
+# graph.
+#
+#     python route_table.py build --csv shinkansen.csv --directory tables
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from graph import CSV_PATH, file_hash, load_graph
+from router import CRITERIA, PREFERENCES, _dijkstra, optimal_search, resolve_criterion
+from search import NOT_FOUND, _endpoints, _named, _summarise
+
+TABLE_DIRECTORY = 'tables'
+TABLE_CRITERIA = CRITERIA + tuple(PREFERENCES)
+
+# ------------------------------------------------------------------------------------
+#                                    PRECOMPUTE
+# ------------------------------------------------------------------------------------
+
+_worker_graph = None
+
+def _init_worker(csv_path):
+    global _worker_graph
+    _worker_graph = load_graph(csv_path)
+
+# One-to-all searches towards each goal in `goals` on the reversed graph. In
+# that tree a state's parent is its next state on the way to the goal.
+def _goal_rows(criterion, goals):
+    graph = _worker_graph
+    reverse = graph.reverse()
+    arc_ids = reverse.arc_ids.tolist()
+    n = graph.num_stations
+    components = resolve_criterion(criterion)
+    width = len(graph.lines) + 1 if 'transfers' in components else 1
+
+    values = np.full((len(goals), n, len(components)), np.inf)
+    starts = np.full((len(goals), n), -1, dtype=np.int32)
+    next_states = np.full((len(goals), n * width), -1, dtype=np.int32)
+    next_arcs = np.full((len(goals), n * width), -1, dtype=np.int32)
+    for row, goal in enumerate(goals):
+        tree = _dijkstra(reverse, goal, components)
+        for v, state in tree.best.items():
+            values[row, v] = tree.key[state]
+            starts[row, v] = state
+        for state, link in tree.parent.items():
+            if link is not None:
+                next_states[row, state] = link[0]
+                next_arcs[row, state] = arc_ids[link[1]]
+    return goals, values, starts, next_states, next_arcs
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def precompute(csv_path=CSV_PATH, directory=TABLE_DIRECTORY, criteria=TABLE_CRITERIA, workers=None, chunk_size=16):
+    graph = load_graph(csv_path)
+    n = graph.num_stations
+    os.makedirs(directory, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(csv_path,)) as executor:
+        for criterion in criteria:
+            components = resolve_criterion(criterion)
+            width = len(graph.lines) + 1 if 'transfers' in components else 1
+            arrays = {
+                'value': np.lib.format.open_memmap(os.path.join(directory, f'{criterion}_value.npy'), mode='w+', dtype=np.float64, shape=(n, n, len(components))),
+                'start': np.lib.format.open_memmap(os.path.join(directory, f'{criterion}_start.npy'), mode='w+', dtype=np.int32, shape=(n, n)),
+                'next': np.lib.format.open_memmap(os.path.join(directory, f'{criterion}_next.npy'), mode='w+', dtype=np.int32, shape=(n, n * width)),
+                'arc': np.lib.format.open_memmap(os.path.join(directory, f'{criterion}_arc.npy'), mode='w+', dtype=np.int32, shape=(n, n * width)),
+            }
+            chunks = list(_chunks(list(range(n)), chunk_size))
+            for goals, values, starts, next_states, next_arcs in executor.map(_goal_rows, [criterion] * len(chunks), chunks):
+                arrays['value'][:, goals] = values.transpose(1, 0, 2)
+                arrays['start'][:, goals] = starts.T
+                arrays['next'][goals] = next_states
+                arrays['arc'][goals] = next_arcs
+            for array in arrays.values():
+                array.flush()
+
+    # Written last, so an interrupted build never looks complete
+    meta = {
+        'csv_hash': file_hash(csv_path),
+        'stations': graph.stations,
+        'num_arcs': graph.num_edges,
+        'criteria': {criterion: list(resolve_criterion(criterion)) for criterion in criteria},
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+# ------------------------------------------------------------------------------------
+#                                      LOOKUP
+# ------------------------------------------------------------------------------------
+
+class RouteTable:
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.criteria = meta['criteria']
+        self._arrays = {}
+
+    # Open the table in `directory`, or return None if it is missing or was
+    # built from a different version of the dataset. `csv_hash` pins the
+    # version to match instead of hashing csv_path as it is now.
+    @classmethod
+    def open(cls, directory=TABLE_DIRECTORY, csv_path=CSV_PATH, csv_hash=None):
+        try:
+            with open(os.path.join(directory, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('csv_hash') != (csv_hash or file_hash(csv_path)):
+            return None
+        return cls(directory, meta)
+
+    def supports(self, criterion):
+        return isinstance(criterion, str) and criterion in self.criteria
+
+    # Arrays are mapped on first use, so opening the table costs nothing
+    def _load(self, criterion):
+        if criterion not in self._arrays:
+            arrays = {}
+            for part in ('value', 'start', 'next', 'arc'):
+                arrays[part] = np.load(os.path.join(self.directory, f'{criterion}_{part}.npy'), mmap_mode='r')
+            self._arrays[criterion] = arrays
+        return self._arrays[criterion]
+
+    # Optimal key for a (start id, goal id) pair, None if unreachable
+    def value(self, s, g, criterion):
+        key = self._load(criterion)['value'][s, g]
+        return None if not np.isfinite(key[0]) else tuple(key.tolist())
+
+    # Station ids and arcs of the optimal route, rebuilt from the next-hops
+    def trace(self, s, g, criterion):
+        arrays = self._load(criterion)
+        state = int(arrays['start'][s, g])
+        if state == -1:
+            return None, None
+        next_states, next_arcs = arrays['next'][g], arrays['arc'][g]
+        width = next_states.shape[0] // len(self.meta['stations'])
+        path, arcs = [s], []
+        while True:
+            e = int(next_arcs[state])
+            if e == -1:
+                break
+            state = int(next_states[state])
+            arcs.append(e)
+            path.append(state // width)
+        return path, arcs
+
+    # Same result tuple as the search functions
+    def route(self, graph, start, goal, criterion):
+        s, g = _endpoints(graph, start, goal)
+        if s is None or g is None:
+            return NOT_FOUND
+        path, arcs = self.trace(s, g, criterion)
+        if not graph.still_optimal(resolve_criterion(criterion), arcs or ()):
+            return optimal_search(graph, start, goal, criterion)
+        if path is None:
+            return NOT_FOUND
+        return _named(graph, _summarise(graph, path, arcs))
+
+# Answer from the table when it covers the criterion, otherwise search live
+def lookup_or_search(table, graph, start, goal, criterion):
+    if table is not None and table.supports(criterion):
+        return table.route(graph, start, goal, criterion)
+    return optimal_search(graph, start, goal, criterion)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute all-pairs route tables")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="compute and save the tables")
+    build.add_argument('--csv', default=CSV_PATH)
+    build.add_argument('--directory', default=TABLE_DIRECTORY)
+    build.add_argument('--workers', type=int, default=None)
+    build.add_argument('--criteria', nargs='+', default=list(TABLE_CRITERIA))
+    args = parser.parse_args()
+
+    precompute(args.csv, args.directory, args.criteria, args.workers)
+    print(f"Route tables for {', '.join(args.criteria)} written to {args.directory}/")
@@ -0,0 +1,215 @@
+# Criterion-aware optimal routing.
+#
+# One weighted shortest-path search that optimises the criterion the traveller
+# picked: 'duration', 'cost', 'distance', 'transfers', or a tuple of those for a
+# lexicographic combination such as ('transfers', 'duration').
+#
+# Transfers depend on the line a station was reached with, so criteria that
+# include them search over (station, arrival line) states. Pure weight criteria
+# search over stations. Equal keys are broken by the lower state id, so the same
+# query always returns the same route.
+
+import bisect
+import heapq
+
+from search import NOT_FOUND, _endpoints, _named, _result, _summarise
+
+CRITERIA = ('duration', 'cost', 'distance', 'transfers')
+
+# Lexicographic orders behind the menu options in Best.py
+PREFERENCES = {
+    'fastest': ('duration', 'transfers', 'cost'),
+    'cheapest': ('cost', 'duration', 'transfers'),
+    'least_transit': ('transfers', 'duration', 'cost'),
+}
+
+# Normalise a criterion into a tuple of component names
+def resolve_criterion(criterion):
+    if isinstance(criterion, str):
+        criterion = PREFERENCES.get(criterion, (criterion,))
+    criterion = tuple(criterion)
+    if not criterion:
+        raise ValueError("Criterion must name at least one of: " + ", ".join(CRITERIA))
+    for name in criterion:
+        if name not in CRITERIA:
+            raise ValueError(f"Unknown criterion {name!r}, expected one of: " + ", ".join(CRITERIA))
+    return criterion
+
+# ------------------------------------------------------------------------------------
+#                               SHORTEST PATH TREE
+# ------------------------------------------------------------------------------------
+
+# Result of a search from one source. `best[v]` is the settled state with the
+# smallest key at station v; following `parent` from it gives the route.
+class PathTree:
+    def __init__(self, graph, source, criterion, width, key, parent, best):
+        self.graph = graph
+        self.source = source
+        self.criterion = criterion
+        self.width = width    # states per station (1 when transfers are not tracked)
+        self.key = key        # state -> key
+        self.parent = parent  # state -> (previous state, arc), None for the source
+        self.best = best      # station -> best state
+
+    def reached(self, goal):
+        return goal in self.best
+
+    # Key of the best route to station id `goal`, None if unreachable
+    def cost_to(self, goal):
+        state = self.best.get(goal)
+        return None if state is None else self.key[state]
+
+    # Station ids and arcs of the best route to station id `goal`
+    def trace(self, goal):
+        state = self.best.get(goal)
+        if state is None:
+            return None, None
+        path, arcs = [goal], []
+        while self.parent[state] is not None:
+            state, e = self.parent[state]
+            arcs.append(e)
+            path.append(state // self.width)
+        path.reverse()
+        arcs.reverse()
+        return path, arcs
+
+    # Station ids whose best route uses one of `arcs`: the subtrees hanging
+    # below those arcs
+    def affected(self, arcs):
+        arcs = set(arcs)
+        children = {}
+        below = []
+        for state, link in self.parent.items():
+            if link is not None:
+                if link[1] in arcs:
+                    below.append(state)
+                else:
+                    children.setdefault(link[0], []).append(state)
+        subtree = set(below)
+        while below:
+            for child in children.get(below.pop(), ()):
+                if child not in subtree:
+                    subtree.add(child)
+                    below.append(child)
+        return {v for v, state in self.best.items() if state in subtree}
+
+    # True if a search now could reach some state at least as well as the tree
+    # did through one of `arcs`, such as arcs that got lighter or reopened
+    # since it was searched. Arc u -> v does if the key at u plus the arc's
+    # weights is at most the key of the state the arc enters at v. The
+    # transfer an arc may add is left out, so with transfers this errs on the
+    # side of True. A route that improves first enters a state through such
+    # an arc, so False means the tree is still optimal.
+    def improvable(self, arcs):
+        offsets, neighbors, line_ids, _, _, _ = self.graph.as_lists()
+        closed = self.graph.closures()
+        components = _components(self.graph, self.criterion)
+        for e in arcs:
+            if closed[e]:
+                continue
+            state = self.best.get(bisect.bisect_right(offsets, e) - 1)
+            if state is None:
+                continue  # Unreached tail: an arc leading to it would have to improve first
+            candidate = tuple(k + (column[e] if column is not None else 0) for k, column in zip(self.key[state], components))
+            entered = self.key.get(neighbors[e] * self.width + line_ids[e] if self.width > 1 else neighbors[e])
+            if entered is None or candidate <= entered:
+                return True
+        return False
+
+    # Result tuple for station name `goal`, as returned by the search functions
+    def route(self, goal):
+        g = self.graph.index(goal)
+        if g is None or g not in self.best:
+            return NOT_FOUND
+        return _named(self.graph, _summarise(self.graph, *self.trace(g)))
+
+    # Result tuples for every reachable station, keyed by name
+    def routes(self):
+        names = self.graph.stations
+        return {names[v]: self.route(names[v]) for v in sorted(self.best)}
+
+# Per-arc columns for each weight component; None marks the transfer component
+def _components(graph, criterion):
+    _, _, _, distance, cost, duration = graph.as_lists()
+    columns = {'duration': duration, 'cost': cost, 'distance': distance, 'transfers': None}
+    return [columns[name] for name in criterion]
+
+# Dijkstra over the criterion's states from station id `s`. Stops as soon as
+# station id `goal` is settled, or explores everything when goal is None. With
+# `limit`, states whose first key component exceeds it are never settled.
+def _dijkstra(graph, s, criterion, goal=None, limit=None, stats=None):
+    offsets, neighbors, line_ids, _, _, _ = graph.as_lists()
+    closed = graph.closures()
+    components = _components(graph, criterion)
+    stateful = 'transfers' in criterion
+    width = len(graph.lines) + 1 if stateful else 1
+    zero = tuple(0 for _ in components)
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+
+    initial = s * width + width - 1
+    key = {initial: zero}
+    parent = {initial: None}
+    best = {}
+    settled = set()
+    queue = [(zero, initial)]
+    while queue:
+        current_key, state = pop(queue)
+        if current_key != key[state]:
+            if stats is not None:
+                stats.stale += 1
+            continue  # Stale entry, the state was improved after this push
+        if limit is not None and current_key[0] > limit:
+            break  # Keys only grow from here on
+        settled.add(state)
+        current = state // width
+        if current not in best:
+            # The first settled state of a station has its smallest key. Later
+            # arrivals on other lines are still expanded, because staying on
+            # their line may avoid a transfer further on.
+            best[current] = state
+            if current == goal:
+                break
+        if stats is not None:
+            stats.settle(offsets[current + 1] - offsets[current])
+        arrival_line = state % width if stateful else None
+        for e in range(offsets[current], offsets[current + 1]):
+            if closed[e]:
+                continue  # Closed by a live update
+            neighbor = neighbors[e]
+            line = line_ids[e]
+            neighbor_state = neighbor * width + line if stateful else neighbor
+            if neighbor_state in settled:
+                continue
+            new_key = tuple(
+                k + (column[e] if column is not None else (arrival_line != width - 1 and arrival_line != line))
+                for k, column in zip(current_key, components)
+            )
+            old_key = key.get(neighbor_state)
+            if old_key is None or new_key < old_key:
+                key[neighbor_state] = new_key
+                parent[neighbor_state] = (state, e)
+                push(queue, (new_key, neighbor_state))
+    return PathTree(graph, s, criterion, width, key, parent, best)
+
+# ------------------------------------------------------------------------------------
+#                                   ROUTING API
+# ------------------------------------------------------------------------------------
+
+# Provably best route from `start` to `goal` under `criterion`, in one search
+def optimal_search(graph, start, goal, criterion='duration', stats=None):
+    criterion = resolve_criterion(criterion)
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    tree = _dijkstra(graph, s, criterion, goal=g, stats=stats)
+    if not tree.reached(g):
+        return NOT_FOUND
+    return _result(graph, stats, tree.trace, g)
+
+# One-to-all search from `start`; the tree answers every goal without searching again
+def shortest_path_tree(graph, start, criterion='duration', stats=None):
+    criterion = resolve_criterion(criterion)
+    s = graph.index(start)
+    if s is None:
+        raise KeyError(f"Unknown station {start!r}")
+    return _dijkstra(graph, s, criterion, stats=stats)
@@ -0,0 +1,211 @@
+# Route search algorithms over the CSR graph from graph.py.
+#
+# Every function takes station names and returns
+# (path, lines, total_distance, total_cost, total_duration, transit_count),
+# or a tuple of Nones when no route exists.
+#
+# The searches only record a predecessor for each state they reach. The path,
+# line sequence, transit count and totals are rebuilt once, when the goal is
+# popped, so a frontier entry costs O(1) memory no matter how long its path is.
+#
+# Every search also takes an optional `stats` (instrument.SearchStats) that it
+# counts its queue operations and settled states into.
+
+import heapq
+from collections import deque
+
+from line_graph import line_graph
+
+NOT_FOUND = (None, None, None, None, None, None)
+
+# Resolve station names to ids, None if either station is unknown
+def _endpoints(graph, start, goal):
+    return graph.index(start), graph.index(goal)
+
+# ------------------------------------------------------------------------------------
+#                                 PATH RECONSTRUCTION
+# ------------------------------------------------------------------------------------
+
+# Summarise a route given as station ids and the arcs between them. Totals are
+# summed from the start forwards, in the same order the old searches added them.
+def _summarise(graph, path, arcs):
+    _, _, line_ids, distance, cost, duration = graph.as_lists()
+    lines = []
+    total_distance = total_cost = total_duration = 0
+    for e in arcs:
+        line = line_ids[e]
+        # Only add line if it's different from the previous line
+        if not lines or lines[-1] != line:
+            lines.append(line)
+        total_distance += distance[e]
+        total_cost += cost[e]
+        total_duration += duration[e]
+    transit_count = len(lines) - 1 if lines else 0
+    return path, lines, total_distance, total_cost, total_duration, transit_count
+
+# Convert a summarised route from ids back to station and line names
+def _named(graph, route):
+    path, lines, total_distance, total_cost, total_duration, transit_count = route
+    names, line_names = graph.stations, graph.lines
+    return [names[v] for v in path], [line_names[l] for l in lines], total_distance, total_cost, total_duration, transit_count
+
+# Result tuple of the route trace(*args) returns as (path, arcs), timed as the
+# reconstruction phase when profiling
+def _result(graph, stats, trace, *args):
+    if stats is not None:
+        return stats.timed('reconstruct', _result, graph, None, trace, *args)
+    return _named(graph, _summarise(graph, *trace(*args)))
+
+# Walk predecessor arrays back from `goal` (parent[start] is -1)
+def _trace(parent, parent_arc, goal):
+    path, arcs = [goal], []
+    v = goal
+    while parent[v] != -1:
+        arcs.append(parent_arc[v])
+        v = parent[v]
+        path.append(v)
+    path.reverse()
+    arcs.reverse()
+    return path, arcs
+
+# A heap entry's predecessor record. Several entries may exist per station, so
+# the heap searches link entries rather than stations.
+class _Label:
+    __slots__ = ('parent', 'station', 'arc', 'graph')
+
+    def __init__(self, parent, station, arc, graph):
+        self.parent = parent
+        self.station = station
+        self.arc = arc
+        self.graph = graph
+
+    def trace(self):
+        path, arcs = [], []
+        label = self
+        while label is not None:
+            path.append(label.station)
+            if label.arc is not None:
+                arcs.append(label.arc)
+            label = label.parent
+        path.reverse()
+        arcs.reverse()
+        return path, arcs
+
+    # Heap entries that tie on priority and station used to be ordered by their
+    # path, lines and totals. Rebuild those only when such a tie happens.
+    def __lt__(self, other):
+        parent = self.parent
+        if parent is other.parent and parent is not None:
+            # Parallel arcs out of the same entry: the paths are equal, so the
+            # line lists decide. Staying on the current line keeps the list
+            # shorter, which sorts first.
+            line_ids = self.graph.as_lists()[2]
+            line, other_line = line_ids[self.arc], line_ids[other.arc]
+            if line != other_line:
+                previous = line_ids[parent.arc] if parent.arc is not None else None
+                return (line != previous, line) < (other_line != previous, other_line)
+        return _summarise(self.graph, *self.trace()) < _summarise(other.graph, *other.trace())
+
+# ------------------------------------------------------------------------------------
+#                               SEARCH ALGORITHM FUNCTIONS
+# ------------------------------------------------------------------------------------
+
+# Search the route with the fewest line changes on the line-expanded graph,
+# breaking ties on duration. Returns the real route totals.
+def least_transits_search(graph, start, goal, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    path, arcs = line_graph(graph).search(s, g, stats)
+    if path is None:
+        return NOT_FOUND
+    return _result(graph, stats, lambda: (path, arcs))
+
+# Search the route using Best-First Search with transit counting
+def best_first_search(graph, start, goal, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    offsets, neighbors, _, distance, _, _ = graph.as_lists()
+    closed = graph.closures()
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+
+    queue = [(0, s, _Label(None, s, None, graph))]  # (heuristic distance, station, label)
+    visited = set()
+    while queue:
+        _, current, label = pop(queue)
+        if current == g:
+            return _result(graph, stats, label.trace)
+        if current not in visited:
+            visited.add(current)
+            if stats is not None:
+                stats.settle(offsets[current + 1] - offsets[current])
+            for e in range(offsets[current], offsets[current + 1]):
+                if closed[e]:
+                    continue
+                neighbor = neighbors[e]
+                if neighbor not in visited:
+                    push(queue, (distance[e], neighbor, _Label(label, neighbor, e, graph)))
+        elif stats is not None:
+            stats.stale += 1
+    return NOT_FOUND
+
+# Search the route using Breadth-First Search with transit counting
+def bfs(graph, start, goal, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    offsets, neighbors, _, _, _, _ = graph.as_lists()
+    closed = graph.closures()
+
+    parent = [-1] * graph.num_stations
+    parent_arc = [-1] * graph.num_stations
+    queue = deque([s]) if stats is None else stats.deque([s])
+    visited = [False] * graph.num_stations
+    visited[s] = True
+    while queue:
+        current = queue.popleft()
+        if current == g:
+            return _result(graph, stats, _trace, parent, parent_arc, g)
+        if stats is not None:
+            stats.settle(offsets[current + 1] - offsets[current])
+        for e in range(offsets[current], offsets[current + 1]):
+            if closed[e]:
+                continue
+            neighbor = neighbors[e]
+            if not visited[neighbor]:
+                visited[neighbor] = True
+                parent[neighbor] = current
+                parent_arc[neighbor] = e
+                queue.append(neighbor)
+    return NOT_FOUND
+
+# Search the route using A* Search with transit counting
+def dijkstra_search(graph, start, goal, stats=None):
+    s, g = _endpoints(graph, start, goal)
+    if s is None or g is None:
+        return NOT_FOUND
+    offsets, neighbors, _, distance, _, _ = graph.as_lists()
+    closed = graph.closures()
+    push, pop = (heapq.heappush, heapq.heappop) if stats is None else (stats.heappush, stats.heappop)
+
+    queue = [(0, s, _Label(None, s, None, graph), 0)]  # (heuristic distance, station, label, total_distance)
+    visited = set()
+    while queue:
+        _, current, label, total_distance = pop(queue)
+        if current == g:
+            return _result(graph, stats, label.trace)
+        if current not in visited:
+            visited.add(current)
+            if stats is not None:
+                stats.settle(offsets[current + 1] - offsets[current])
+            for e in range(offsets[current], offsets[current + 1]):
+                if closed[e]:
+                    continue
+                neighbor = neighbors[e]
+                if neighbor not in visited:
+                    heuristic = 0 # Distance as heuristic
+                    push(queue, (total_distance + heuristic, neighbor, _Label(label, neighbor, e, graph), total_distance + distance[e]))
+        elif stats is not None:
+            stats.stale += 1
+    return NOT_FOUND
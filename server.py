@@ -0,0 +1,303 @@
+# Long-running route server.
+#
+# Loads the graph once and answers queries over HTTP on localhost, so a query
+# no longer pays for the pandas import and graph build:
+#     python server.py --port 8080
+#     curl 'http://127.0.0.1:8080/route?start=Tokyo&goal=Kanazawa&criterion=fastest'
+#
+# Endpoints:
+#     GET /route?start=..&goal=..[&criterion=fastest]  one route, fields as in batch.py
+#     GET /metrics                                      request counts and latency percentiles
+#     GET /health                                       liveness and dataset version
+#
+# The event loop only parses requests. Searches run on a process pool whose
+# workers each hold the graph, a result cache (cache.py) and the route tables
+# when they are up to date. The server loads the graph once per pool and hands
+# it to the workers as a private snapshot, tagged with the CSV's hash, so the
+# workers and the server's station list are always the same version.
+# When shinkansen.csv changes, a new pool is started on the new data and takes
+# over new requests, while the old pool finishes the requests it already has.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from batch import _record
+from cache import RouteCache
+from graph import CSV_PATH, file_hash, load_snapshot, load_versioned_graph, save_snapshot, snapshot_path
+from route_table import TABLE_DIRECTORY, RouteTable
+from router import resolve_criterion
+
+HOST = '127.0.0.1'
+PORT = 8080
+WATCH_INTERVAL = 2.0    # Seconds between checks of the dataset file
+LATENCY_WINDOW = 10000  # Recent requests kept for the latency percentiles
+
+# ------------------------------------------------------------------------------------
+#                                      WORKERS
+# ------------------------------------------------------------------------------------
+
+_worker_cache = None
+_worker_table = None
+
+# Load the pool's snapshot, which must hold version `csv_hash` of the dataset;
+# a worker that cannot get that version fails instead of serving another one
+def _init_worker(csv_path, table_directory, snapshot, csv_hash):
+    global _worker_cache, _worker_table
+    graph = load_snapshot(snapshot, csv_hash)
+    if graph is None:
+        raise RuntimeError(f"{snapshot} does not hold version {csv_hash[:12]} of {csv_path}")
+    # The server swaps pools when the CSV changes, so a worker never reloads
+    # the graph on its own; that would pair the new graph with the old tables
+    _worker_cache = RouteCache(csv_path, check_interval=float('inf'), graph=graph, version=csv_hash)
+    _worker_table = RouteTable.open(table_directory, csv_path, csv_hash)
+
+# From the tables when they cover the criterion, otherwise through the worker's
+# result and shortest-path-tree caches
+def _route(start, goal, criterion):
+    if _worker_table is not None and _worker_table.supports(criterion):
+        return _worker_table.route(_worker_cache.graph, start, goal, criterion)
+    return _worker_cache.route(start, goal, criterion)
+
+# Wait for a pool's requests to finish, then remove its snapshot
+def _stop_pool(pool, directory):
+    pool.shutdown(wait=True)
+    shutil.rmtree(directory, ignore_errors=True)
+
+# ------------------------------------------------------------------------------------
+#                                      METRICS
+# ------------------------------------------------------------------------------------
+
+class Metrics:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.by_status = {}
+        self.latencies = deque(maxlen=window)  # seconds, most recent requests
+
+    def record(self, status, latency):
+        self.requests += 1
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        if status >= 500:
+            self.errors += 1
+        self.latencies.append(latency)
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+        return {
+            'uptime_s': time.time() - self.started,
+            'requests': self.requests,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'by_status': {str(status): count for status, count in sorted(self.by_status.items())},
+            'latency_ms': {
+                'mean': sum(latencies) / len(latencies) * 1000 if latencies else None,
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': latencies[-1] * 1000 if latencies else None,
+            },
+        }
+
+# ------------------------------------------------------------------------------------
+#                                       SERVER
+# ------------------------------------------------------------------------------------
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+class RouteServer:
+    def __init__(self, csv_path=CSV_PATH, table_directory=TABLE_DIRECTORY, workers=None, watch_interval=WATCH_INTERVAL):
+        self.csv_path = csv_path
+        self.table_directory = table_directory
+        self.workers = workers
+        self.watch_interval = watch_interval
+        self.metrics = Metrics()
+        self.reloads = 0
+        self.pool = None
+        self.version = None
+        self.stations = set()
+        self._mtime = None
+        self._snapshot_directory = None
+
+    # Load the dataset and start a pool on it. Returns the pool, its dataset
+    # hash, station names and snapshot directory, or raises if the file cannot
+    # be loaded. The workers read the graph from a snapshot of the pool's own,
+    # so a later change to the CSV or to the shared snapshots/ never reaches
+    # a pool that is still starting workers.
+    def _start_pool(self):
+        graph, version = load_versioned_graph(self.csv_path)
+        directory = tempfile.mkdtemp(prefix='route-server-')
+        try:
+            snapshot = snapshot_path(self.csv_path, directory=directory)
+            save_snapshot(graph, snapshot, version)
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.csv_path, self.table_directory, snapshot, version))
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return pool, version, set(graph.stations), directory
+
+    async def start(self):
+        self._mtime = os.stat(self.csv_path).st_mtime
+        self.pool, self.version, self.stations, self._snapshot_directory = await asyncio.to_thread(self._start_pool)
+
+    # Swap in a pool on the changed dataset. Requests already submitted to the
+    # old pool still finish there; the old pool shuts down once they have.
+    async def reload(self):
+        try:
+            pool, version, stations, directory = await asyncio.to_thread(self._start_pool)
+        except Exception as error:
+            print(f"Reload of {self.csv_path} failed, still serving version {self.version[:12]}: {error}")
+            return False
+        old_pool, old_directory = self.pool, self._snapshot_directory
+        self.pool, self.version, self.stations, self._snapshot_directory = pool, version, stations, directory
+        self.reloads += 1
+        print(f"Reloaded {self.csv_path}, now serving version {version[:12]}")
+        await asyncio.to_thread(_stop_pool, old_pool, old_directory)
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                mtime = os.stat(self.csv_path).st_mtime
+            except OSError:
+                continue  # Mid-replacement, try again next time
+            if mtime != self._mtime:
+                self._mtime = mtime
+                if await asyncio.to_thread(file_hash, self.csv_path) != self.version:
+                    await self.reload()
+
+    async def close(self):
+        if self.pool is not None:
+            await asyncio.to_thread(_stop_pool, self.pool, self._snapshot_directory)
+
+    async def _dispatch(self, method, target):
+        if method != 'GET':
+            raise _HTTPError(405, "Only GET is supported")
+        url = urlsplit(target)
+        if url.path == '/route':
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            start, goal = query.get('start'), query.get('goal')
+            if not start or not goal:
+                raise _HTTPError(400, "start and goal are required")
+            criterion = query.get('criterion', 'fastest')
+            try:
+                resolve_criterion(criterion)
+            except ValueError as error:
+                raise _HTTPError(400, str(error))
+            for station in (start, goal):
+                if station not in self.stations:
+                    raise _HTTPError(404, f"Unknown station {station!r}")
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, _route, start, goal, criterion)
+            record = _record(None, start, goal, result)
+            del record['index']
+            record['criterion'] = criterion
+            return record
+        if url.path == '/metrics':
+            metrics = self.metrics.snapshot()
+            metrics['reloads'] = self.reloads
+            metrics['version'] = self.version
+            return metrics
+        if url.path == '/health':
+            return {'status': 'ok', 'version': self.version, 'stations': len(self.stations)}
+        raise _HTTPError(404, f"No such endpoint {url.path}")
+
+    async def _respond(self, writer, status, body, keep_alive):
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+        )
+        await writer.drain()
+
+    # One connection, possibly several requests with keep-alive
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length:
+                    await reader.readexactly(length)
+
+                began = time.perf_counter()
+                self.metrics.in_flight += 1
+                parts = request_line.decode('latin-1').split()
+                keep_alive = len(parts) == 3 and parts[2] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                try:
+                    if len(parts) != 3:
+                        raise _HTTPError(400, "Malformed request line")
+                    status, body = 200, await self._dispatch(parts[0], parts[1])
+                except _HTTPError as error:
+                    status, body = error.status, {'error': str(error)}
+                except Exception as error:
+                    status, body = 500, {'error': f"{type(error).__name__}: {error}"}
+                finally:
+                    self.metrics.in_flight -= 1
+                self.metrics.record(status, time.perf_counter() - began)
+
+                await self._respond(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host=HOST, port=PORT, csv_path=CSV_PATH, table_directory=TABLE_DIRECTORY, workers=None, watch_interval=WATCH_INTERVAL):
+    route_server = RouteServer(csv_path, table_directory, workers, watch_interval)
+    await route_server.start()
+    server = await asyncio.start_server(route_server.handle, host, port)
+    watcher = asyncio.create_task(route_server.watch())
+    print(f"Serving {csv_path} (version {route_server.version[:12]}) on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+        await route_server.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve route queries over HTTP")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--tables', default=TABLE_DIRECTORY)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--watch-interval', type=float, default=WATCH_INTERVAL)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.csv, args.tables, args.workers, args.watch_interval))
+    except KeyboardInterrupt:
+        pass
@@ -1,117 +1,20 @@
-import pandas as pd
-import heapq
-from collections import deque, defaultdict
-
-# Load dataset
-df = pd.read_csv('shinkansen.csv')
+from graph import load_graph
+from search import least_transits_search, best_first_search, bfs, dijkstra_search
+from astar import astar_search, CoordinateHeuristic, Landmarks
+from route_table import RouteTable
 
 # ------------------------------------------------------------------------------------
 #                                   CONSTRUCT GRAPH
 # ------------------------------------------------------------------------------------
 
-# Create a graph from the dataset
-graph = defaultdict(list)
-for _, row in df.iterrows():
-    source = row['Source_Stations']
-    destination = row['Destination_Stations']
-    line = row['Line']
-    distance = row['Distance_(Km)']
-    cost = row['Cost_(Yen)']
-    duration = row['Durations_(Min)']
-    graph[source].append((destination, line, distance, cost, duration))
-    graph[destination].append((source, line, distance, cost, duration))  # <-- If undirected
-
-# ------------------------------------------------------------------------------------
-#                               SEARCH ALGORITHM FUNCTIONS
-# ------------------------------------------------------------------------------------
-def least_transits_search(graph, start, goal):
-    queue = deque([(start, [start], [], 0)])  # (station, path, lines, transit_count)
-    visited = set([(start, None)])  # Track visited stations with previous line to avoid redundant paths
-    
-    while queue:
-        current, path, lines, transit_count = queue.popleft()
-        
-        if current == goal:
-            return path, lines, transit_count  # Return path, distinct lines, and transit count
-        
-        for neighbor, line, _, _, _ in graph[current]:
-            # Ensure we only visit each station with a specific line once
-            if (neighbor, line) not in visited:
-                visited.add((neighbor, line))
-                new_lines = lines.copy()
-                new_transit_count = transit_count
-                
-                # Only add the line if it's different from the previous line
-                if not lines or lines[-1] != line:
-                    new_lines.append(line)
-                    new_transit_count += 1 if lines else 0  # Increment transit only if there's a previous line
-                
-                queue.append((neighbor, path + [neighbor], new_lines, new_transit_count))
-    
-    return None, None, None  # Return None if no route is found
-
-# Search the route using Best-First Search with transit counting
-def best_first_search(graph, start, goal):
-    queue = [(0, start, [start], [], 0, 0, 0, 0)]  # (heuristic distance, station, path, lines, total_distance, total_cost, total_duration, transit_count)
-    visited = set()
-    while queue:
-        _, current, path, lines, total_distance, total_cost, total_duration, transit_count = heapq.heappop(queue)
-        if current == goal:
-            return path, lines, total_distance, total_cost, total_duration, transit_count
-        if current not in visited:
-            visited.add(current)
-            for neighbor, line, dist, cost, dur in graph[current]:
-                if neighbor not in visited:
-                    new_transit_count = transit_count
-                    new_lines = lines.copy()
-                    # Only add line if it's different from the previous line
-                    if not lines or lines[-1] != line:
-                        new_lines.append(line)
-                        new_transit_count += 1 if lines else 0  # Count transit if there's a previous line
-                    heapq.heappush(queue, (dist, neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
-    return None, None, None, None, None, None
+# Load dataset into the shared CSR graph
+graph = load_graph('shinkansen.csv')
 
-# Search the route using Breadth-First Search with transit counting
-def bfs(graph, start, goal):
-    queue = deque([(start, [start], [], 0, 0, 0, 0)])  # (station, path, lines, total_distance, total_cost, total_duration, transit_count)
-    visited = set([start])
-    while queue:
-        current, path, lines, total_distance, total_cost, total_duration, transit_count = queue.popleft()
-        if current == goal:
-            return path, lines, total_distance, total_cost, total_duration, transit_count
-        for neighbor, line, dist, cost, dur in graph[current]:
-            if neighbor not in visited:
-                visited.add(neighbor)
-                new_transit_count = transit_count
-                new_lines = lines.copy()
-                # Only add line if it's different from the previous line
-                if not lines or lines[-1] != line:
-                    new_lines.append(line)
-                    new_transit_count += 1 if lines else 0  # Count transit if there's a previous line
-                queue.append((neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
-    return None, None, None, None, None, None
+# Precomputed all-pairs tables (python route_table.py build), None if missing or stale
+table = RouteTable.open('tables', 'shinkansen.csv')
 
-# Search the route using A* Search with transit counting
-def dijkstra_search(graph, start, goal):
-    queue = [(0, start, [start], [], 0, 0, 0, 0)]  # (heuristic distance, station, path, lines, total_distance, total_cost, total_duration, transit_count)
-    visited = set()
-    while queue:
-        _, current, path, lines, total_distance, total_cost, total_duration, transit_count = heapq.heappop(queue)
-        if current == goal:
-            return path, lines, total_distance, total_cost, total_duration, transit_count
-        if current not in visited:
-            visited.add(current)
-            for neighbor, line, dist, cost, dur in graph[current]:
-                if neighbor not in visited:
-                    heuristic = 0 # Distance as heuristic
-                    new_transit_count = transit_count
-                    new_lines = lines.copy()
-                    # Only add line if it's different from the previous line
-                    if not lines or lines[-1] != line:
-                        new_lines.append(line)
-                        new_transit_count += 1 if lines else 0  # Count transit if there's a previous line
-                    heapq.heappush(queue, (total_distance + heuristic, neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
-    return None, None, None, None, None, None
+# Lower bounds for A*: station coordinates plus landmark (ALT) distances
+heuristics = (CoordinateHeuristic(graph, 'duration'), Landmarks.build(graph, weights=('duration',)))
 
 # ------------------------------------------------------------------------------------
 #                                  INPUT FROM USERS 
@@ -126,11 +29,16 @@ print("\nCalculating Route, Distance, Cost, and Duration... \n")
 #                                       RESULT
 # ------------------------------------------------------------------------------------
 
-# Call every search method (Best, BFS, A*)
+# Call every search method (Best, BFS, Dijkstra, A*, Least transits)
 path_best, lines_best, distance_best, cost_best, duration_best, transits_best = best_first_search(graph, start_station, goal_station)
 path_bfs, lines_bfs, distance_bfs, cost_bfs, duration_bfs, transits_bfs = bfs(graph, start_station, goal_station)
 path_dijkstra, lines_dijkstra, distance_dijkstra, cost_dijkstra, duration_dijkstra, transits_dijkstra = dijkstra_search(graph, start_station, goal_station)
-path_least_transits, lines_least_transits, transits_least_transits = least_transits_search(graph, start_station, goal_station)
+# The shortest duration comes straight from the tables when they are up to date
+if table is not None:
+    path_astar, lines_astar, distance_astar, cost_astar, duration_astar, transits_astar = table.route(graph, start_station, goal_station, 'duration')
+else:
+    path_astar, lines_astar, distance_astar, cost_astar, duration_astar, transits_astar = astar_search(graph, start_station, goal_station, 'duration', heuristics)
+path_least_transits, lines_least_transits, distance_least_transits, cost_least_transits, duration_least_transits, transits_least_transits = least_transits_search(graph, start_station, goal_station)
 # Display results for Best-First Search
 print("\nResult of Best-First Search:")
 if path_best:
@@ -168,10 +76,25 @@ if path_dijkstra:
 else:
     print("Route not found.")
 
+# Display results for A* Search on travel time, guided by the heuristics above
+print("\nResult of A* Search (shortest duration):")
+if path_astar:
+    print("Route:", " -> ".join(path_astar))
+    print("Lines:", " -> ".join(lines_astar))
+    print("Total Distance:", f"{distance_astar:.2f}", "km")
+    print("Total Cost:", f"{cost_astar:.2f}", "Yen")
+    print("Total Duration:", f"{duration_astar:.2f}", "minutes")
+    print("Total Transits:", transits_astar)
+else:
+    print("Route not found.")
+
 print("\nResult with the Least amount of transits Search:")
 if path_least_transits:
     print("Route:", " -> ".join(path_least_transits))
     print("Lines:", " -> ".join(lines_least_transits))
+    print("Total Distance:", f"{distance_least_transits:.2f}", "km")
+    print("Total Cost:", f"{cost_least_transits:.2f}", "Yen")
+    print("Total Duration:", f"{duration_least_transits:.2f}", "minutes")
     print("Total Transits:", transits_least_transits)
 else:
     print("Route not found.")
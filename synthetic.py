@@ -0,0 +1,97 @@
+# Synthetic rail networks in the shinkansen.csv format, for benchmarking.
+#
+# The network is a set of corridors (like Tohoku or Tokaido). Each new corridor
+# branches off a station of an existing one, and some reconnect at their far
+# end, so the network is a tree of corridors with a few loops. Every corridor
+# runs three services like the real lines do:
+#   Local    every station                   (Kodama, Nasuno)
+#   Rapid    every third station and the end (Hikari, Yamabiko)
+#   Express  every eighth station and the end (Nozomi, Hayabusa)
+# Faster services skip stops, so they cover more distance per segment, run at
+# a higher speed and charge a surcharge, giving searches real trade-offs.
+#
+#     python synthetic.py 100000 synthetic_100k.csv
+
+import argparse
+import csv
+
+import numpy as np
+
+STATIONS_PER_CORRIDOR = 40
+LOOP_PROBABILITY = 0.3
+# Service name, stop spacing, speed (km/h), fare surcharge
+SERVICES = (
+    ('Local', 1, 180, 1.0),
+    ('Rapid', 3, 240, 1.15),
+    ('Express', 8, 285, 1.3),
+)
+COLUMNS = ['Source_Stations', 'Shinkansen_Line', 'Destination_Stations', 'Distance_(Km)', 'Cost_(Yen)', 'Durations_(Min)', 'Line']
+
+# Segments one corridor contributes across all of its services
+def _segments_per_corridor(stations):
+    return sum(len(range(0, stations - 1, spacing)) for _, spacing, _, _ in SERVICES)
+
+# Rows of a network with about `segments` segments, in the dataset's columns
+def generate_rows(segments, stations_per_corridor=STATIONS_PER_CORRIDOR, seed=0):
+    rng = np.random.default_rng(seed)
+    corridors = max(1, round(segments / _segments_per_corridor(stations_per_corridor)))
+    rows = []
+    stations = []  # every station name created so far
+    hubs = []      # express stops, where new corridors branch off
+    for c in range(corridors):
+        names = [f"C{c}-{i}" for i in range(stations_per_corridor)]
+        if hubs:
+            names[0] = hubs[rng.integers(len(hubs))]
+        if stations and rng.random() < LOOP_PROBABILITY:
+            names[-1] = stations[rng.integers(len(stations))]
+            if names[-1] in names[:-1]:
+                names[-1] = f"C{c}-{stations_per_corridor - 1}"
+        stations.extend(name for name in names if name.startswith(f"C{c}-"))
+        hubs.extend(names[i] for i in range(0, stations_per_corridor, 8))
+
+        # Distance along the corridor at every station
+        gaps = rng.uniform(5, 40, stations_per_corridor - 1)
+        position = np.concatenate([[0.0], np.cumsum(gaps)])
+        corridor_line = f"Corridor_{c}_Shinkansen"
+        for service, spacing, speed, surcharge in SERVICES:
+            stops = list(range(0, stations_per_corridor, spacing))
+            if stops[-1] != stations_per_corridor - 1:
+                stops.append(stations_per_corridor - 1)
+            for a, b in zip(stops, stops[1:]):
+                distance = round(float(position[b] - position[a]), 1)
+                rows.append((
+                    names[a],
+                    corridor_line,
+                    names[b],
+                    distance,
+                    int(round((150 + 16 * distance) * surcharge, -1)),
+                    max(1, int(round(distance / speed * 60 + 2))),
+                    f"{service}_{c}",
+                ))
+    return rows
+
+def generate_network(segments, path=None, stations_per_corridor=STATIONS_PER_CORRIDOR, seed=0):
+    rows = generate_rows(segments, stations_per_corridor, seed)
+    if path is not None:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    return rows
+
+# The network as a DataFrame, ready for graph.build_graph
+def generate_frame(segments, stations_per_corridor=STATIONS_PER_CORRIDOR, seed=0):
+    import pandas as pd
+
+    return pd.DataFrame(generate_rows(segments, stations_per_corridor, seed), columns=COLUMNS)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic rail network in the shinkansen.csv format")
+    parser.add_argument('segments', type=int, help="approximate number of segments (CSV rows)")
+    parser.add_argument('output')
+    parser.add_argument('--stations-per-corridor', type=int, default=STATIONS_PER_CORRIDOR)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate_network(args.segments, args.output, args.stations_per_corridor, args.seed)
+    print(f"{len(rows)} segments written to {args.output}")
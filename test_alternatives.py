@@ -0,0 +1,72 @@
+# Tests for the k shortest loopless paths (alternatives.py).
+
+import random
+
+import pytest
+
+from alternatives import k_shortest_paths
+from astar import WEIGHTS
+from instrument import profile_search
+from router import optimal_search
+
+# The k lowest weights of all simple station paths, each hop on its lightest arc
+def brute_force_weights(graph, s, g, weight, k):
+    offsets, neighbors = graph.offsets.tolist(), graph.neighbors.tolist()
+    column = getattr(graph, weight).tolist()
+    hops = {}
+    for u in range(graph.num_stations):
+        for e in range(offsets[u], offsets[u + 1]):
+            v = neighbors[e]
+            hops.setdefault(u, {})[v] = min(hops.get(u, {}).get(v, column[e]), column[e])
+    found = []
+
+    def extend(v, on_path, total):
+        if v == g:
+            found.append(total)
+            return
+        for x, w in hops.get(v, {}).items():
+            if x not in on_path:
+                on_path.add(x)
+                extend(x, on_path, total + w)
+                on_path.discard(x)
+
+    extend(s, {s}, 0)
+    return sorted(found)[:k]
+
+def check_routes(graph, start, goal, routes, weight, k):
+    index = {'distance': 2, 'cost': 3, 'duration': 4}[weight]
+    want = brute_force_weights(graph, graph.index(start), graph.index(goal), weight, k)
+    assert [pytest.approx(route[index]) for route in routes] == want, (start, goal, weight)
+    assert len({tuple(route[0]) for route in routes}) == len(routes)
+    assert all(route[0][0] == start and route[0][-1] == goal for route in routes)
+
+def test_k_shortest_paths_match_brute_force(graph):
+    rng = random.Random(1)
+    for _ in range(8):
+        start, goal = rng.sample(graph.stations, 2)
+        check_routes(graph, start, goal, k_shortest_paths(graph, start, goal, 4, 'duration'), 'duration', 4)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_random_networks_match_brute_force(random_network, seed):
+    graph = random_network(seed)
+    for weight in WEIGHTS:
+        for start in graph.stations:
+            for goal in graph.stations:
+                if start != goal:
+                    check_routes(graph, start, goal, k_shortest_paths(graph, start, goal, 5, weight), weight, 5)
+
+def test_first_route_is_optimal(graph):
+    for start, goal in (('Tokyo', 'Kanazawa'), ('Akita', 'Shin-Osaka'), ('Niigata', 'Nagoya')):
+        routes = k_shortest_paths(graph, start, goal, 3)
+        assert routes[0][4] == optimal_search(graph, start, goal, 'duration')[4]
+        assert [route[4] for route in routes] == sorted(route[4] for route in routes)
+
+def test_no_routes(graph):
+    assert k_shortest_paths(graph, 'Tokyo', 'Nowhere') == []
+    assert k_shortest_paths(graph, 'Tokyo', 'Kanazawa', 0) == []
+
+def test_stats_count_every_search(graph):
+    routes, stats = profile_search(k_shortest_paths, graph, 'Tokyo', 'Kanazawa', 3)
+    assert routes == k_shortest_paths(graph, 'Tokyo', 'Kanazawa', 3)
+    assert stats.found and stats.settled > graph.num_stations  # Backward search plus spurs
+    assert stats.phases_ms['reconstruct'] > 0
@@ -0,0 +1,52 @@
+# Tests for A* and its heuristics (astar.py).
+
+import os
+
+import numpy as np
+import pytest
+
+from astar import WEIGHTS, CoordinateHeuristic, Landmarks, _astar, _bounds, _distances, astar_search, load_coordinates
+from router import optimal_search
+
+@pytest.fixture(scope='module')
+def coordinates(csv_path):
+    return load_coordinates(os.path.join(os.path.dirname(csv_path), 'stations.csv'))
+
+@pytest.fixture(scope='module')
+def landmarks(graph):
+    return Landmarks.build(graph, count=4)
+
+def test_every_station_has_coordinates(graph, coordinates):
+    assert {name.strip() for name in graph.stations} <= set(coordinates)
+
+@pytest.mark.parametrize('weight', WEIGHTS)
+def test_bounds_never_exceed_the_real_weight(graph, coordinates, landmarks, weight):
+    heuristic = CoordinateHeuristic(graph, weight, coordinates)
+    assert heuristic.factor > 0
+    reverse = graph.reverse()
+    for g in range(graph.num_stations):
+        exact = _distances(reverse, g, weight)  # From every station to g
+        reachable = np.isfinite(exact)
+        assert np.all(heuristic.bound(g)[reachable] <= exact[reachable] + 1e-9)
+        assert np.all(landmarks.bound(weight, g)[reachable] <= exact[reachable] + 1e-9)
+
+@pytest.mark.parametrize('weight', WEIGHTS)
+def test_astar_agrees_with_optimal_search(graph, coordinates, landmarks, key, weight):
+    coordinate = CoordinateHeuristic(graph, weight, coordinates)
+    for heuristics in ((), (coordinate,), (landmarks,), (coordinate, landmarks)):
+        for start in graph.stations[::2]:
+            for goal in graph.stations:
+                want = key(optimal_search(graph, start, goal, weight), weight)
+                assert key(astar_search(graph, start, goal, weight, heuristics), weight) == want, (start, goal)
+
+def test_landmarks_settle_fewer_stations(graph, landmarks):
+    plain = guided = 0
+    for s in range(graph.num_stations):
+        for g in range(graph.num_stations):
+            plain += _astar(graph, s, g, 'duration', [0.0] * graph.num_stations)[2]
+            guided += _astar(graph, s, g, 'duration', _bounds(graph, g, 'duration', (landmarks,)))[2]
+    assert guided < plain / 2
+
+def test_unknown_weight_is_rejected(graph):
+    with pytest.raises(ValueError):
+        astar_search(graph, 'Tokyo', 'Sendai', 'transfers')
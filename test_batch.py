@@ -0,0 +1,63 @@
+# Tests for batch origin-destination routing (batch.py).
+
+import csv
+import json
+import random
+
+import pytest
+
+from batch import run_batch
+from router import shortest_path_tree
+
+@pytest.fixture(scope='module')
+def pairs(graph):
+    rng = random.Random(0)
+    names = graph.stations + ['Nowhere']
+    return [(rng.choice(names), rng.choice(names)) for _ in range(300)]
+
+def expected_records(graph, pairs, criterion):
+    trees = {}
+    records = {}
+    for index, (start, goal) in enumerate(pairs):
+        if start not in trees:
+            trees[start] = shortest_path_tree(graph, start, criterion) if graph.index(start) is not None else None
+        route = trees[start].route(goal) if trees[start] else (None,) * 6
+        records[index] = (start, goal) + tuple(route)
+    return records
+
+def test_jsonl_output_has_every_pair_once(graph, csv_path, pairs, tmp_path):
+    source, output = tmp_path / 'pairs.csv', tmp_path / 'routes.jsonl'
+    with open(source, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['start', 'goal'])
+        writer.writerows(pairs)
+    assert run_batch(str(source), str(output), 'cheapest', csv_path, workers=2, chunk_size=40) == len(pairs)
+
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record['index'] for record in records) == list(range(len(pairs)))
+    expected = expected_records(graph, pairs, 'cheapest')
+    for record in records:
+        fields = (record['start'], record['goal'], record['route'], record['lines'], record['distance'], record['cost'], record['duration'], record['transits'])
+        assert fields == expected[record['index']]
+
+def test_csv_output_from_jsonl_input(graph, csv_path, pairs, tmp_path):
+    source, output = tmp_path / 'pairs.jsonl', tmp_path / 'routes.csv'
+    with open(source, 'w') as f:
+        for start, goal in pairs:
+            f.write(json.dumps({'start': start, 'goal': goal}) + '\n')
+    assert run_batch(str(source), str(output), 'fastest', csv_path, workers=1) == len(pairs)
+
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    expected = expected_records(graph, pairs, 'fastest')
+    assert len(rows) == len(pairs)
+    for row in rows:
+        start, goal, path, lines, distance, cost, duration, transits = expected[int(row['index'])]
+        assert (row['start'], row['goal']) == (start, goal)
+        assert row['route'] == (" -> ".join(path) if path else '')
+        assert row['duration'] == ('' if duration is None else str(duration))
+
+def test_unknown_criterion_fails_before_routing(csv_path, tmp_path):
+    with pytest.raises(ValueError):
+        run_batch(str(tmp_path / 'missing.csv'), str(tmp_path / 'routes.jsonl'), 'scenic', csv_path)
@@ -0,0 +1,57 @@
+# Tests for the synthetic networks (synthetic.py) and the benchmark suite
+# (benchmark.py), on networks small enough to run in a few seconds.
+
+import json
+
+import numpy as np
+
+import benchmark
+from benchmark import compare, run
+from graph import build_graph
+from search import bfs
+from synthetic import COLUMNS, generate_frame, generate_network
+
+def test_synthetic_network_is_connected_and_sized(csv_path, tmp_path):
+    with open(csv_path) as f:
+        assert f.readline().strip().split(',') == COLUMNS
+    for segments in (500, 5000):
+        graph = build_graph(generate_frame(segments))
+        assert 0.8 * segments <= graph.num_edges // 2 <= 1.2 * segments
+        assert all(bfs(graph, graph.stations[0], goal)[0] is not None for goal in graph.stations)
+        assert np.all(graph.duration > 0) and np.all(graph.cost > 0)
+
+    path = str(tmp_path / 'network.csv')
+    assert generate_network(500, path, seed=3) == generate_network(500, seed=3)
+    assert generate_network(500, seed=3) != generate_network(500, seed=4)
+
+def test_engines_agree_in_the_report(capsys):
+    engines = ('optimal_search', 'bidirectional_dijkstra', 'astar_landmarks', 'contraction_hierarchy')
+    report = run(sizes=(1000,), engines=engines, queries=20, warmup=2, repeats=1, log=lambda message: None)
+    results = report['results']
+    assert [r['engine'] for r in results] == list(engines)
+    assert len({(r['found'], r['duration_sum']) for r in results}) == 1
+    for r in results:
+        assert r['network'] == 'synthetic-1000' and r['queries'] == 20
+        assert r['latency_ms']['p50'] <= r['latency_ms']['max'] and r['throughput_qps'] > 0
+        assert r['prepare_peak_mb'] >= 0 and r['build_peak_mb'] > 0
+    json.dumps(report)
+
+    compare(report, report)
+    rows = capsys.readouterr().out.splitlines()[1:]
+    assert len(rows) == len(engines) and all(row.endswith('same') for row in rows)
+
+# Preprocessing runs once: its result is both measured and queried
+def test_prepare_runs_once(monkeypatch):
+    contexts = []
+
+    def prepare(graph, csv_path):
+        contexts.append(object())
+        return contexts[-1]
+
+    def search(graph, context, start, goal, stats=None):
+        assert context is contexts[0]
+        return bfs(graph, start, goal)
+
+    monkeypatch.setitem(benchmark.ENGINES, 'counted', (prepare, search, None))
+    report = run(sizes=(1000,), engines=('counted',), queries=5, warmup=1, repeats=1, log=lambda message: None)
+    assert len(contexts) == 1 and report['results'][0]['prepare_s'] > 0
@@ -0,0 +1,42 @@
+# Tests for the bidirectional searches (bidirectional.py).
+
+import pytest
+
+from astar import WEIGHTS
+from bidirectional import bidirectional_bfs, bidirectional_dijkstra
+from graph import load_graph
+from router import optimal_search
+from search import bfs
+
+@pytest.mark.parametrize('weight', WEIGHTS)
+def test_dijkstra_agrees_with_optimal_search(graph, key, weight):
+    for start in graph.stations:
+        for goal in graph.stations:
+            want = key(optimal_search(graph, start, goal, weight), weight)
+            assert key(bidirectional_dijkstra(graph, start, goal, weight), weight) == want, (start, goal)
+
+# One-way arcs make the backward search run on a graph unlike the forward one
+def test_dijkstra_on_a_directed_graph(csv_path, key):
+    directed = load_graph(csv_path, undirected=False, snapshot_directory=None)
+    for start in directed.stations[::3]:
+        for goal in directed.stations:
+            want = key(optimal_search(directed, start, goal, 'duration'), 'duration')
+            assert key(bidirectional_dijkstra(directed, start, goal), 'duration') == want, (start, goal)
+
+def test_bfs_finds_as_few_stations_as_bfs(graph):
+    for start in graph.stations:
+        for goal in graph.stations:
+            path = bidirectional_bfs(graph, start, goal)[0]
+            want = bfs(graph, start, goal)[0]
+            assert (path is None) == (want is None)
+            if path is not None:
+                assert len(path) == len(want)
+
+# The spliced halves form one connected route with the totals of its arcs
+def test_routes_are_spliced_correctly(graph):
+    for search in (bidirectional_dijkstra, bidirectional_bfs):
+        path, lines, distance, cost, duration, transits = search(graph, 'Akita', 'Shin-Osaka')
+        assert path[0] == 'Akita' and path[-1] == 'Shin-Osaka'
+        hops = list(zip(path, path[1:]))
+        assert all(any(edge[0] == b for edge in graph.edges(a)) for a, b in hops)
+        assert transits == len(lines) - 1
@@ -0,0 +1,57 @@
+# Tests for the result and shortest-path-tree caches (cache.py).
+
+import shutil
+
+import pandas as pd
+
+from cache import LRUCache, RouteCache
+from router import optimal_search
+from search import NOT_FOUND, dijkstra_search
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('c') == 3 and cache.get('a') == 1
+    assert cache.stats() == {'size': 2, 'capacity': 2, 'hits': 3, 'misses': 1, 'evictions': 1, 'hit_rate': 0.75}
+
+    empty = LRUCache(0)
+    empty.put('a', 1)
+    assert len(empty) == 0 and empty.get('a', 'missing') == 'missing'
+
+def test_routes_come_from_one_tree_per_start(graph, csv_path):
+    cache = RouteCache(csv_path)
+    for criterion in ('fastest', 'cheapest', 'least_transit'):
+        for goal in graph.stations:
+            assert cache.route('Tokyo', goal, criterion) == optimal_search(graph, 'Tokyo', goal, criterion)
+    assert cache.trees.misses == 3 and len(cache.trees) == 3
+
+    assert cache.route('Tokyo', 'Kanazawa') == optimal_search(graph, 'Tokyo', 'Kanazawa', 'fastest')
+    assert cache.results.hits == 1
+    assert cache.route('Tokyo', 'Nowhere') == NOT_FOUND
+    assert cache.route('Nowhere', 'Tokyo') == NOT_FOUND
+
+def test_call_memoises_any_search(graph, csv_path):
+    cache = RouteCache(csv_path)
+    result = cache.call(dijkstra_search, 'Tokyo', 'Kanazawa')
+    assert result == dijkstra_search(graph, 'Tokyo', 'Kanazawa')
+    assert cache.call(dijkstra_search, 'Tokyo', 'Kanazawa') is result
+    assert cache.results.stats()['hits'] == 1
+
+def test_changed_csv_empties_the_caches(csv_path, tmp_path):
+    data = str(tmp_path / 'edited.csv')
+    shutil.copy(csv_path, data)
+    cache = RouteCache(data, check_interval=0)
+    frozen = RouteCache(data, check_interval=float('inf'))
+    before = cache.route('Tokyo', 'Ueno')
+    assert frozen.route('Tokyo', 'Ueno') == before
+
+    df = pd.read_csv(data)
+    df.loc[(df['Source_Stations'] == 'Tokyo') & (df['Destination_Stations'] == 'Ueno'), 'Durations_(Min)'] = 50
+    df.to_csv(data, index=False)
+    after = cache.route('Tokyo', 'Ueno')
+    assert after[4] == 50 != before[4]
+    assert cache.invalidations == 1
+    assert frozen.route('Tokyo', 'Ueno') == before and frozen.invalidations == 0
@@ -0,0 +1,59 @@
+# Tests for contraction hierarchies (contraction.py).
+
+import os
+
+import pandas as pd
+import pytest
+
+from astar import WEIGHTS
+from contraction import ContractionHierarchy, _hierarchy_path, build_hierarchies, ch_search, load_hierarchies
+from graph import load_graph
+from router import optimal_search
+
+@pytest.mark.parametrize('weight', WEIGHTS)
+def test_queries_agree_with_optimal_search(graph, key, weight):
+    hierarchy = ContractionHierarchy.build(graph, weight)
+    for start in graph.stations:
+        for goal in graph.stations:
+            want = key(optimal_search(graph, start, goal, weight), weight)
+            assert key(ch_search(graph, hierarchy, start, goal), weight) == want, (start, goal)
+
+def test_saved_hierarchies_are_reused(graph, csv_path, tmp_path):
+    directory = str(tmp_path)
+    built = build_hierarchies(graph, directory, ('duration',), csv_path)['duration']
+    path = _hierarchy_path(directory, 'duration')
+    modified = os.stat(path).st_mtime_ns
+    loaded = load_hierarchies(graph, directory, ('duration',), csv_path)['duration']
+    assert os.stat(path).st_mtime_ns == modified
+    assert loaded.csv_hash == built.csv_hash
+    for goal in graph.stations:
+        assert ch_search(graph, loaded, 'Tokyo', goal) == ch_search(graph, built, 'Tokyo', goal)
+
+# The same stations and arcs with other weights: only the hash tells them apart
+def test_saved_hierarchy_is_rebuilt_for_an_edited_csv(graph, csv_path, key, tmp_path):
+    directory = str(tmp_path / 'ch')
+    build_hierarchies(graph, directory, ('duration',), csv_path)
+
+    df = pd.read_csv(csv_path)
+    omiya_nagano = df['Source_Stations'].isin(['Omiya', 'Nagano']) & df['Destination_Stations'].isin(['Omiya', 'Nagano'])
+    assert omiya_nagano.any()
+    df.loc[omiya_nagano, 'Durations_(Min)'] = 1000
+    edited_csv = str(tmp_path / 'edited.csv')
+    df.to_csv(edited_csv, index=False)
+    edited = load_graph(edited_csv, snapshot_directory=None)
+
+    hierarchy = load_hierarchies(edited, directory, ('duration',), edited_csv)['duration']
+    want = key(optimal_search(edited, 'Tokyo', 'Kanazawa', 'duration'), 'duration')
+    assert key(ch_search(edited, hierarchy, 'Tokyo', 'Kanazawa'), 'duration') == want
+    assert want != key(optimal_search(graph, 'Tokyo', 'Kanazawa', 'duration'), 'duration')
+
+def test_unreadable_or_unhashed_files_are_rebuilt(graph, csv_path, tmp_path):
+    directory = str(tmp_path)
+    unhashed = ContractionHierarchy.build(graph, 'cost')
+    unhashed.save(_hierarchy_path(directory, 'cost'))
+    with open(_hierarchy_path(directory, 'distance'), 'w') as f:
+        f.write('not a hierarchy')
+    hierarchies = load_hierarchies(graph, directory, ('cost', 'distance'), csv_path)
+    for weight in ('cost', 'distance'):
+        assert hierarchies[weight].csv_hash is not None
+        assert ContractionHierarchy.load(_hierarchy_path(directory, weight)).csv_hash == hierarchies[weight].csv_hash
@@ -0,0 +1,188 @@
+# Tests for live updates (disruptions.py, Graph.set_closed / set_weight): after
+# random closures, reopenings and weight changes every engine must answer like
+# a graph rebuilt from the edited rows, and landmarks and cached trees only
+# recompute what a lighter arc can improve.
+
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import astar
+from alternatives import k_shortest_paths
+from astar import CoordinateHeuristic, Landmarks, astar_search, load_coordinates
+from bidirectional import bidirectional_dijkstra
+from cache import RouteCache
+from contraction import ContractionHierarchy, build_hierarchies, ch_search
+from disruptions import close_segment, delay_segment, reopen_segment, segment_arcs, set_segment_weight
+from graph import build_graph, load_graph
+from isochrone import reachable, reachable_many
+from route_table import RouteTable
+from router import optimal_search, resolve_criterion
+from search import least_transits_search
+
+CRITERIA = ('fastest', 'cheapest', 'least_transit', 'duration', 'cost', 'distance', ('transfers',))
+
+# Rows of segment a - b, in either direction and only on `line` if given
+def segment_rows(df, a, b, line=None):
+    forward = (df['Source_Stations'] == a) & (df['Destination_Stations'] == b)
+    backward = (df['Source_Stations'] == b) & (df['Destination_Stations'] == a)
+    rows = forward | backward
+    return rows if line is None else rows & (df['Line'] == line)
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_random_updates_match_rebuilt_graph(csv_path, table_directory, key, seed):
+    rng = random.Random(seed)
+    cache = RouteCache(csv_path, check_interval=float('inf'))
+    graph = cache.graph  # Updated in place below, like a server would
+    table = RouteTable.open(table_directory, csv_path)
+    landmarks = Landmarks.build(graph, count=4)
+    coordinates = CoordinateHeuristic(graph, 'duration', load_coordinates(os.path.join(os.path.dirname(csv_path), 'stations.csv')))
+    hierarchies = {weight: ContractionHierarchy.build(graph, weight) for weight in ('duration', 'cost')}
+    original = pd.read_csv(csv_path)
+    df = original.copy()
+    closed = set()  # (a, b, line) of closed segments
+
+    for step in range(30):
+        row = original.iloc[rng.randrange(len(original))]
+        segment = (row['Source_Stations'], row['Destination_Stations'], row['Line'])
+        rows = segment_rows(df, *segment)
+        operation = rng.choice(['close', 'reopen', 'delay', 'faster', 'cost'])
+        if operation == 'close':
+            close_segment(graph, *segment[:2], line=segment[2])
+            closed.add(segment)
+        elif operation == 'reopen' and closed:
+            segment = rng.choice(sorted(closed))
+            reopen_segment(graph, *segment[:2], line=segment[2])
+            closed.discard(segment)
+        elif operation == 'delay':
+            minutes = rng.randint(1, 60)
+            delay_segment(graph, *segment[:2], minutes, line=segment[2])
+            df.loc[rows, 'Durations_(Min)'] += minutes
+        elif operation == 'faster':
+            minutes = max(1, int(df.loc[rows, 'Durations_(Min)'].iloc[0]) // 3)
+            set_segment_weight(graph, *segment[:2], 'duration', minutes, line=segment[2])
+            df.loc[rows, 'Durations_(Min)'] = minutes
+        elif operation == 'cost':
+            yen = rng.randint(100, 20000)
+            set_segment_weight(graph, *segment[:2], 'cost', yen, line=segment[2])
+            df.loc[rows, 'Cost_(Yen)'] = yen
+
+        open_rows = pd.Series(True, index=df.index)
+        for segment in closed:
+            open_rows &= ~segment_rows(df, *segment)
+        rebuilt = build_graph(df[open_rows])
+
+        for _ in range(10):
+            start, goal = rng.choice(graph.stations), rng.choice(graph.stations)
+            for criterion in CRITERIA:
+                want = key(optimal_search(rebuilt, start, goal, criterion), criterion)
+                assert key(optimal_search(graph, start, goal, criterion), criterion) == want, (step, criterion)
+                assert key(cache.route(start, goal, criterion), criterion) == want, (step, criterion)
+                if isinstance(criterion, str) and table.supports(criterion):
+                    assert key(table.route(graph, start, goal, criterion), criterion) == want, (step, criterion)
+            duration = key(optimal_search(rebuilt, start, goal, 'duration'), 'duration')
+            assert key(astar_search(graph, start, goal, 'duration', (landmarks, coordinates)), 'duration') == duration
+            assert key(bidirectional_dijkstra(graph, start, goal), 'duration') == duration
+            assert key(ch_search(graph, hierarchies['duration'], start, goal), 'duration') == duration
+            assert key(ch_search(graph, hierarchies['cost'], start, goal), 'cost') == key(optimal_search(rebuilt, start, goal, 'cost'), 'cost')
+            transfers = ('transfers', 'duration')
+            assert key(least_transits_search(graph, start, goal), transfers) == key(least_transits_search(rebuilt, start, goal), transfers)
+            alternatives = k_shortest_paths(graph, start, goal, 2)
+            assert (key(alternatives[0], 'duration') if alternatives else None) == duration
+            reached = {name: totals[2] for name, totals in reachable(graph, start, 120).items()}
+            assert reached == {name: totals[2] for name, totals in reachable(rebuilt, start, 120).items()}
+            values, _ = reachable_many(graph, [start, goal], 120)
+            assert {graph.stations[v]: values[0, v] for v in np.flatnonzero(np.isfinite(values[0]))} == reached
+
+    # Undoing every update puts the precomputed answers back in use
+    for segment in closed:
+        reopen_segment(graph, *segment[:2], line=segment[2])
+    changed = df.ne(original).any(axis=1)
+    for _, row in original[changed].iterrows():
+        a, b, line = row['Source_Stations'], row['Destination_Stations'], row['Line']
+        set_segment_weight(graph, a, b, 'duration', row['Durations_(Min)'], line=line)
+        set_segment_weight(graph, a, b, 'cost', row['Cost_(Yen)'], line=line)
+    assert graph.baseline.unchanged()
+    path, arcs = table.trace(graph.index('Tokyo'), graph.index('Kanazawa'), 'fastest')
+    assert graph.still_optimal(resolve_criterion('fastest'), arcs)
+
+def test_segments_are_looked_up_by_name(graph):
+    assert len(segment_arcs(graph, 'Tokyo', 'Ueno')) == 2 * len(segment_arcs(graph, 'Tokyo', 'Ueno', both_directions=False))
+    assert len(segment_arcs(graph, 'Tokyo', 'Ueno', line='Asama')) == 2
+    with pytest.raises(KeyError):
+        segment_arcs(graph, 'Tokyo', 'Nowhere')
+    with pytest.raises(KeyError):
+        segment_arcs(graph, 'Tokyo', 'Ueno', line='Nowhere')
+    with pytest.raises(ValueError):
+        segment_arcs(graph, 'Tokyo', 'Kanazawa')
+
+def test_negative_weights_are_rejected(csv_path):
+    graph = load_graph(csv_path, snapshot_directory=None)
+    with pytest.raises(ValueError):
+        delay_segment(graph, 'Tokyo', 'Ueno', -1000)
+    with pytest.raises(ValueError):
+        set_segment_weight(graph, 'Tokyo', 'Ueno', 'cost', -1)
+    assert graph.version == 0
+
+def test_hierarchy_of_an_updated_graph_is_not_saved(csv_path, key, tmp_path):
+    graph = load_graph(csv_path, snapshot_directory=None)
+    close_segment(graph, 'Omiya', 'Takasaki')
+    directory = str(tmp_path / 'ch')
+    hierarchy = build_hierarchies(graph, directory, ('duration',), csv_path)['duration']
+    assert not os.path.exists(directory)
+    reopen_segment(graph, 'Omiya', 'Takasaki')
+    assert key(ch_search(graph, hierarchy, 'Tokyo', 'Kanazawa'), 'duration') == key(optimal_search(graph, 'Tokyo', 'Kanazawa', 'duration'), 'duration')
+
+# Lighter arcs only send the landmarks whose distances they shorten back to
+# search, and the distances stay exact
+@pytest.mark.parametrize('seed', [0, 1])
+def test_landmarks_refresh_only_what_lighter_arcs_shorten(csv_path, monkeypatch, seed):
+    rng = random.Random(seed)
+    graph = load_graph(csv_path, snapshot_directory=None)
+    landmarks = Landmarks.build(graph, count=4, weights=('duration',))
+    searched = []
+    distances = astar._distances
+    monkeypatch.setattr(astar, '_distances', lambda graph, s, weight, stats=None: searched.append(s) or distances(graph, s, weight, stats))
+
+    def fresh():
+        return astar._landmark_distances(graph, graph.reverse(), landmarks.stations, 'duration')
+
+    refreshed = 0
+    for step in range(20):
+        e = rng.randrange(graph.num_edges)
+        if step % 5 == 4:
+            # Closed and reopened in between refreshes: nothing got shorter
+            graph.set_closed([e], True)
+            landmarks.refresh(graph)
+            graph.set_closed([e], False)
+        else:
+            graph.set_weight([e], 'duration', rng.randint(0, int(graph.duration[e])))
+        del searched[:]
+        landmarks.refresh(graph)
+        refreshed += len(searched)
+        forward, backward = fresh()
+        assert np.array_equal(landmarks.forward['duration'], forward) and np.array_equal(landmarks.backward['duration'], backward), step
+    # Searching again from every landmark after every update would be 8 per step
+    assert refreshed < 8 * 20 / 2
+
+def test_cache_keeps_trees_lighter_arcs_cannot_improve(csv_path):
+    cache = RouteCache(csv_path, check_interval=float('inf'))
+    graph = cache.graph
+    fastest, transfers = resolve_criterion('duration'), resolve_criterion('least_transit')
+    for criterion in (fastest, transfers):
+        cache.route('Tokyo', 'Kanazawa', criterion)
+
+    # Towards Tokyo, a faster Kanazawa -> Toyama cannot shorten a route from it
+    delay_segment(graph, 'Kanazawa', 'Toyama', -1, line='Kagayaki', both_directions=False)
+    assert cache.route('Tokyo', 'Fukui', fastest) == optimal_search(graph, 'Tokyo', 'Fukui', fastest)
+    assert set(cache.trees.entries) == {('Tokyo', fastest), ('Tokyo', transfers)} and cache.trees.misses == 2
+
+    # Away from it, Toyama -> Kanazawa shortens the route to Kanazawa and beyond
+    delay_segment(graph, 'Toyama', 'Kanazawa', -1, line='Kagayaki', both_directions=False)
+    assert cache.route('Tokyo', 'Fukui', fastest) == optimal_search(graph, 'Tokyo', 'Fukui', fastest)
+    assert set(cache.trees.entries) == {('Tokyo', fastest)} and cache.trees.misses == 3
+    for goal in graph.stations:
+        assert cache.route('Tokyo', goal, transfers) == optimal_search(graph, 'Tokyo', goal, transfers)
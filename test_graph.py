@@ -0,0 +1,106 @@
+# Tests for the CSR graph backend (graph.py).
+
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import graph as graph_module
+from graph import file_hash, load_graph, load_snapshot, snapshot_path
+
+def test_edges_match_the_row_by_row_graph(graph, row_graph):
+    assert sorted(row_graph) == graph.stations
+    for station, edges in row_graph.items():
+        assert graph.edges(station) == edges
+
+def test_ids_follow_sorted_names(graph):
+    assert graph.stations == sorted(graph.stations)
+    assert graph.lines == sorted(graph.lines)
+    assert all(graph.index(name) == i for i, name in enumerate(graph.stations))
+    assert graph.index('Nowhere') is None
+
+def test_csr_arrays_are_consistent(graph, csv_path):
+    rows = len(pd.read_csv(csv_path))
+    assert graph.num_edges == 2 * rows
+    assert graph.offsets[0] == 0 and graph.offsets[-1] == graph.num_edges
+    assert np.all(np.diff(graph.offsets) >= 0)
+    for column in (graph.neighbors, graph.line_ids, graph.distance, graph.cost, graph.duration):
+        assert len(column) == graph.num_edges
+    assert graph.neighbors.min() >= 0 and graph.neighbors.max() < graph.num_stations
+
+    offsets, _, _, _, _, duration = graph.as_lists()
+    assert offsets == graph.offsets.tolist() and duration == graph.duration.tolist()
+
+def test_directed_graph_has_one_arc_per_row(csv_path):
+    df = pd.read_csv(csv_path)
+    directed = load_graph(csv_path, undirected=False, snapshot_directory=None)
+    assert directed.num_edges == len(df)
+    first = df.iloc[0]
+    assert directed.edges(first['Source_Stations'])[0][:2] == (first['Destination_Stations'], first['Line'])
+
+def test_reverse_turns_every_arc_around(graph):
+    reverse = graph.reverse()
+    assert reverse is graph.reverse()
+    tails, reverse_tails = graph.tails(), reverse.tails()
+    forward = reverse.arc_ids
+    assert sorted(forward.tolist()) == list(range(graph.num_edges))
+    assert np.array_equal(reverse_tails, graph.neighbors[forward])
+    assert np.array_equal(reverse.neighbors, tails[forward])
+    assert np.array_equal(reverse.duration, graph.duration[forward])
+    assert np.array_equal(reverse.line_ids, graph.line_ids[forward])
+
+def same_graph(a, b):
+    assert a.stations == b.stations and a.lines == b.lines
+    for name in ('offsets', 'neighbors', 'line_ids', 'distance', 'cost', 'duration'):
+        column = getattr(a, name)
+        assert np.array_equal(column, getattr(b, name)) and column.dtype == getattr(b, name).dtype
+
+@pytest.mark.parametrize('undirected', (True, False))
+def test_snapshot_round_trip(csv_path, tmp_path, monkeypatch, undirected):
+    directory = str(tmp_path)
+    parsed = load_graph(csv_path, undirected, directory)
+    same_graph(parsed, load_graph(csv_path, undirected, snapshot_directory=None))
+    snapshot = snapshot_path(csv_path, undirected, directory)
+    assert os.path.exists(snapshot)
+
+    # A matching snapshot is loaded without parsing the CSV
+    def no_parse(*args):
+        raise AssertionError("CSV parsed although the snapshot matches")
+    monkeypatch.setattr(graph_module, '_parse_csv', no_parse)
+    same_graph(load_graph(csv_path, undirected, directory), parsed)
+
+def test_snapshot_is_rebuilt_when_the_csv_changes(csv_path, tmp_path):
+    data = str(tmp_path / 'shinkansen.csv')
+    shutil.copy(csv_path, data)
+    directory = str(tmp_path / 'snapshots')
+    load_graph(data, snapshot_directory=directory)
+    snapshot = snapshot_path(data, directory=directory)
+    old_hash = file_hash(data)
+
+    df = pd.read_csv(data)
+    df.loc[0, 'Durations_(Min)'] = 1000
+    df.to_csv(data, index=False)
+    assert load_snapshot(snapshot, file_hash(data)) is None
+
+    edited = load_graph(data, snapshot_directory=directory)
+    assert (df.loc[0, 'Destination_Stations'], df.loc[0, 'Line'], 1000) in [(e[0], e[1], e[4]) for e in edited.edges(df.loc[0, 'Source_Stations'])]
+    assert load_snapshot(snapshot, old_hash) is None
+    same_graph(load_snapshot(snapshot, file_hash(data)), edited)
+
+def test_unreadable_snapshot_is_ignored(csv_path, tmp_path):
+    directory = str(tmp_path)
+    with open(snapshot_path(csv_path, directory=directory), 'wb') as f:
+        f.write(b'not a snapshot')
+    same_graph(load_graph(csv_path, snapshot_directory=directory), load_graph(csv_path, snapshot_directory=None))
+
+def test_snapshot_load_does_not_import_pandas(csv_path, tmp_path):
+    directory = str(tmp_path)
+    load_graph(csv_path, snapshot_directory=directory)
+    code = (f"import sys; sys.path.insert(0, {os.path.dirname(graph_module.__file__)!r}); from graph import load_graph; "
+            f"graph = load_graph({csv_path!r}, snapshot_directory={directory!r}); print(graph.num_stations, 'pandas' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.split()
+    assert output == [str(len(load_graph(csv_path, snapshot_directory=None).stations)), 'False']
@@ -0,0 +1,93 @@
+# Tests for the per-query search statistics (instrument.py).
+
+import json
+
+import pandas as pd
+import pytest
+
+from astar import Landmarks, astar_search
+from bidirectional import bidirectional_bfs, bidirectional_dijkstra
+from conftest import COLUMNS
+from contraction import ContractionHierarchy, ch_search
+from graph import build_graph
+from instrument import SearchStats, json_logger, profile_search
+from pareto import pareto_search
+from raptor import build_timetable, earliest_arrival, parse_time
+from router import optimal_search, shortest_path_tree
+from search import NOT_FOUND, best_first_search, bfs, dijkstra_search, least_transits_search
+
+# A - B - C - D on one line, 1 km per segment
+def chain():
+    rows = [(a, b, 'L', 1.0, 100, 1) for a, b in (('A', 'B'), ('B', 'C'), ('C', 'D'))]
+    return build_graph(pd.DataFrame(rows, columns=COLUMNS))
+
+@pytest.mark.parametrize('search', [bfs, dijkstra_search, best_first_search])
+def test_counts_on_a_chain(search):
+    # A, B and C are expanded (1 + 2 + 2 arcs); B, C and D are pushed after
+    # the start entry; D is popped and returned without being expanded
+    result, stats = profile_search(search, chain(), 'A', 'D')
+    assert result[0] == ['A', 'B', 'C', 'D'] and stats.found
+    assert (stats.settled, stats.relaxed, stats.pushes, stats.pops, stats.stale, stats.max_frontier) == (3, 5, 3, 4, 0, 1)
+
+def test_a_full_tree_settles_every_station_once(graph):
+    tree, stats = profile_search(lambda graph, start, goal, stats: shortest_path_tree(graph, start, 'duration', stats), graph, 'Tokyo', None)
+    assert stats.settled == graph.num_stations and stats.relaxed == graph.num_edges
+    # Every push is popped once, either to settle its station or as stale
+    assert stats.pops == stats.pushes + 1 == stats.settled + stats.stale
+
+@pytest.fixture(scope='module')
+def engines(graph):
+    landmarks = Landmarks.build(graph, weights=('duration',))
+    hierarchy = ContractionHierarchy.build(graph, 'duration')
+    return [
+        (bfs, ()),
+        (best_first_search, ()),
+        (dijkstra_search, ()),
+        (least_transits_search, ()),
+        (optimal_search, ('fastest',)),
+        (lambda graph, start, goal, stats=None: astar_search(graph, start, goal, 'duration', (landmarks,), stats), ()),
+        (bidirectional_dijkstra, ()),
+        (bidirectional_bfs, ()),
+        (lambda graph, start, goal, stats=None: ch_search(graph, hierarchy, start, goal, stats), ()),
+        (pareto_search, ()),
+    ]
+
+def test_counting_leaves_results_unchanged(graph, engines):
+    for search, args in engines:
+        for start, goal in (('Tokyo', 'Kanazawa'), ('Akita', 'Shin-Osaka'), ('Shin-Aomori', 'Yamagata')):
+            result, stats = profile_search(search, graph, start, goal, *args)
+            assert result == search(graph, start, goal, *args)
+            assert stats.found
+            assert stats.settled > 0 and stats.relaxed > 0 and stats.pops > 0
+            assert stats.pops <= stats.pushes + 2  # A start entry per direction
+            assert stats.stale <= stats.pops and stats.max_frontier <= stats.pushes + 2
+            assert stats.phases_ms['search'] >= 0 and stats.phases_ms['reconstruct'] >= 0
+
+def test_not_found_and_lists(graph):
+    result, stats = profile_search(dijkstra_search, graph, 'Tokyo', 'Nowhere')
+    assert result == NOT_FOUND and not stats.found
+    result, stats = profile_search(pareto_search, graph, 'Tokyo', 'Kanazawa')
+    assert isinstance(result, list) and stats.found
+
+def test_load_phase_and_json_log(csv_path, tmp_path):
+    path = str(tmp_path / 'stats.jsonl')
+    received = []
+    log = json_logger(path)
+    for goal in ('Sendai', 'Kanazawa'):
+        _, stats = profile_search(bfs, None, 'Tokyo', goal, csv_path=csv_path, callback=lambda stats: (received.append(stats), log(stats)))
+        assert stats.phases_ms['load'] > 0
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines == [stats.to_dict() for stats in received]
+    assert [line['goal'] for line in lines] == ['Sendai', 'Kanazawa'] and lines[0]['engine'] == 'bfs'
+    assert set(SearchStats('bfs', 'A', 'B').to_dict()) == set(lines[0])
+
+def test_raptor_counts_stops():
+    rows = [('1', 'L', station, time, time) for station, time in (('A', '08:00'), ('B', '08:10'), ('C', '08:20'))]
+    timetable = build_timetable(pd.DataFrame(rows, columns=['Trip', 'Line', 'Station', 'Arrival', 'Departure']))
+    stats = SearchStats('raptor', 'A', 'C')
+    journey = earliest_arrival(timetable, 'A', 'C', '07:55', stats=stats)
+    assert journey[3] == parse_time('08:20')
+    # Round 1 scans A, B and C from the marked start; round 2 scans B and C
+    # again from the two stops it marked, and finds nothing better
+    assert (stats.settled, stats.relaxed) == (3, 5)
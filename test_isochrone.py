@@ -0,0 +1,62 @@
+# Tests for the budget queries (isochrone.py).
+
+import numpy as np
+import pytest
+
+from astar import WEIGHTS
+from instrument import SearchStats
+from isochrone import reachable, reachable_many
+from router import shortest_path_tree
+
+BUDGETS = {'duration': 150, 'cost': 12000, 'distance': 400}
+TOTAL = {'distance': 0, 'cost': 1, 'duration': 2}  # position in reachable() values
+
+@pytest.mark.parametrize('weight', WEIGHTS)
+def test_reachable_matches_the_full_tree(graph, weight):
+    budget = BUDGETS[weight]
+    for start in graph.stations[::4]:
+        tree = shortest_path_tree(graph, start, weight)
+        result = reachable(graph, start, budget, weight)
+        want = {name for v, name in enumerate(graph.stations) if tree.reached(v) and tree.cost_to(v)[0] <= budget}
+        assert set(result) == want
+        values = [totals[TOTAL[weight]] for totals in result.values()]
+        assert values == sorted(values)
+        for name, (distance, cost, duration, transfers, predecessor) in result.items():
+            route = tree.route(name)
+            assert (distance, cost, duration) == pytest.approx(route[2:5])
+            assert predecessor == (route[0][-2] if len(route[0]) > 1 else None)
+
+@pytest.mark.parametrize('weight', WEIGHTS)
+def test_reachable_many_matches_reachable(graph, weight):
+    budget = BUDGETS[weight]
+    starts = graph.stations[::7]
+    values, predecessors = reachable_many(graph, starts, budget, weight)
+    column = getattr(graph, weight)
+    for row, start in enumerate(starts):
+        single = reachable(graph, start, budget, weight)
+        expected = np.full(graph.num_stations, np.inf)
+        for name, totals in single.items():
+            expected[graph.index(name)] = totals[TOTAL[weight]]
+        assert values[row] == pytest.approx(expected)
+        # Each reached station hangs off a predecessor over one of its arcs
+        for v in np.flatnonzero(np.isfinite(values[row])):
+            u = predecessors[row, v]
+            if v == graph.index(start):
+                assert u == -1
+                continue
+            arcs = [e for e in range(graph.offsets[u], graph.offsets[u + 1]) if graph.neighbors[e] == v]
+            assert min(values[row, u] + column[e] for e in arcs) == pytest.approx(values[row, v])
+
+def test_unknown_start(graph):
+    with pytest.raises(KeyError):
+        reachable(graph, 'Nowhere', 60)
+    with pytest.raises(KeyError):
+        reachable_many(graph, ['Tokyo', 'Nowhere'], 60)
+
+def test_stats(graph):
+    stats = SearchStats('reachable', 'Tokyo', None)
+    result = reachable(graph, 'Tokyo', 90, stats=stats)
+    assert stats.settled >= len(result) and stats.phases_ms['reconstruct'] > 0
+    stats = SearchStats('reachable_many', 'Tokyo', None)
+    values, _ = reachable_many(graph, ['Tokyo', 'Sendai'], 90, stats=stats)
+    assert stats.settled >= int(np.isfinite(values).sum()) and stats.relaxed > 0
@@ -0,0 +1,60 @@
+# Tests for the minimum-transfer search on the line-expanded graph
+# (line_graph.py, least_transits_search).
+
+import pytest
+
+from instrument import SearchStats
+from line_graph import LineGraph, line_graph
+from router import optimal_search
+from search import NOT_FOUND, least_transits_search
+
+def test_expanded_graph_has_a_node_per_station_and_line(graph):
+    expanded = LineGraph(graph)
+    pairs = {(u, line) for u in range(graph.num_stations) for line in graph.line_ids[graph.offsets[u]:graph.offsets[u + 1]].tolist()}
+    assert expanded.num_nodes == graph.num_stations + len(pairs)
+    # A ride edge per arc, plus one alighting and one boarding edge per pair
+    assert expanded.num_edges == graph.num_edges + 2 * len(pairs)
+    assert line_graph(graph) is line_graph(graph)
+
+# The fewest transfers of all routes, then the shortest duration among those
+@pytest.mark.parametrize('seed', range(10))
+def test_fewest_transfers_then_fastest(random_network, simple_routes, seed):
+    graph = random_network(seed)
+    for start in graph.stations:
+        for goal in graph.stations:
+            routes = simple_routes(graph, graph.index(start), graph.index(goal))
+            result = least_transits_search(graph, start, goal)
+            if not routes:
+                assert result == NOT_FOUND
+                continue
+            path, lines, distance, cost, duration, transfers = result
+            assert (transfers, duration) == min((r['transfers'], r['duration']) for r in routes), (start, goal)
+            assert path[0] == start and path[-1] == goal
+            assert len(lines) == transfers + 1 or (start == goal and lines == [])
+
+def test_matches_the_lexicographic_router(graph):
+    for start in graph.stations[::2]:
+        for goal in graph.stations:
+            result = least_transits_search(graph, start, goal)
+            expected = optimal_search(graph, start, goal, ('transfers', 'duration'))
+            assert result[5] == expected[5] and result[4] == expected[4], (start, goal)
+
+# Ordered on (transfers, duration), every reachable node is expanded exactly
+# once, where re-expanding nodes to fix up durations would count them again
+@pytest.mark.parametrize('seed', range(5))
+def test_every_node_is_settled_once(random_network, seed):
+    graph = random_network(seed, stations=12, segments=30)
+    expanded = line_graph(graph)
+    offsets, target = expanded._lists[:2]
+    for s in range(graph.num_stations):
+        reached, stack = {s}, [s]
+        while stack:
+            node = stack.pop()
+            for neighbor in target[offsets[node]:offsets[node + 1]]:
+                if neighbor not in reached:
+                    reached.add(neighbor)
+                    stack.append(neighbor)
+        stats = SearchStats('least_transits_search', s, None)
+        assert expanded.search(s, -1, stats) == (None, None)  # No goal, so the search runs to the end
+        assert stats.settled == len(reached)
+        assert stats.pops == stats.settled + stats.stale == stats.pushes + 1
@@ -0,0 +1,46 @@
+# Tests for the Pareto-optimal search (pareto.py).
+
+import pytest
+
+from pareto import pareto_search
+from router import optimal_search
+
+def totals(route):
+    return route[4], route[3], route[5]  # duration, cost, transfers
+
+# The (duration, cost, transfers) vectors no other vector beats on all three
+def frontier(vectors):
+    vectors = set(vectors)
+    return {v for v in vectors if not any(w != v and all(a <= b for a, b in zip(w, v)) for w in vectors)}
+
+@pytest.mark.parametrize('seed', range(10))
+def test_front_matches_brute_force(random_network, simple_routes, seed):
+    graph = random_network(seed)
+    for start in graph.stations:
+        for goal in graph.stations:
+            if start == goal:
+                continue
+            routes = simple_routes(graph, graph.index(start), graph.index(goal))
+            want = frontier((r['duration'], r['cost'], r['transfers']) for r in routes)
+            front = [totals(route) for route in pareto_search(graph, start, goal)]
+            assert len(front) == len(set(front))
+            assert set(front) == want, (start, goal)
+            assert front == sorted(front)
+
+def test_front_contains_the_optima(graph):
+    for start in graph.stations[::5]:
+        for goal in graph.stations[::3]:
+            front = pareto_search(graph, start, goal)
+            fastest = optimal_search(graph, start, goal, 'fastest')
+            if fastest[0] is None:
+                assert front == []
+                continue
+            assert min(route[4] for route in front) == fastest[4]
+            assert min(route[3] for route in front) == optimal_search(graph, start, goal, 'cost')[3]
+            assert min(route[5] for route in front) == optimal_search(graph, start, goal, 'transfers')[5]
+
+def test_max_transfers_bounds_the_front(graph):
+    unbounded = pareto_search(graph, 'Akita', 'Kanazawa')
+    bounded = pareto_search(graph, 'Akita', 'Kanazawa', max_transfers=2)
+    assert bounded and all(route[5] <= 2 for route in bounded)
+    assert [route for route in unbounded if route[5] <= 2] == bounded
@@ -0,0 +1,114 @@
+# Tests for timetable routing (raptor.py): RAPTOR and rRAPTOR against a plain
+# round-by-round scan of every trip, on small random timetables where trips of
+# one line may overtake each other.
+
+import random
+
+import pandas as pd
+import pytest
+
+from raptor import (CHANGE_TIME, Timetable, arrival_times, build_timetable, earliest_arrival, format_time,
+                    generate_timetable, parse_time, range_query)
+
+def random_trips(seed, stations=6, patterns=4, trips=24):
+    rng = random.Random(seed)
+    sequences = [(rng.choice('AB'), rng.sample(range(stations), rng.randint(2, 4))) for _ in range(patterns)]
+    result = []
+    for trip in range(trips):
+        line, stops = rng.choice(sequences)
+        time = rng.randint(6 * 60, 9 * 60)
+        calls = []
+        for i, station in enumerate(stops):
+            if i > 0:
+                time += rng.randint(3, 30)
+            arrival = time
+            time += rng.randint(0, 2) if i < len(stops) - 1 else 0
+            calls.append((f'S{station}', arrival, time))
+        result.append((str(trip), line, calls))
+    return result
+
+def timetable_of(trips):
+    rows = [(trip, line, station, format_time(arrival), format_time(departure)) for trip, line, calls in trips for station, arrival, departure in calls]
+    return build_timetable(pd.DataFrame(rows, columns=['Trip', 'Line', 'Station', 'Arrival', 'Departure']))
+
+# Earliest arrival at every station with at most `rounds` trains. In each round
+# any trip can be boarded where the last round left the traveller ready and
+# ridden to any later stop.
+def reference_arrivals(trips, source, departure, rounds, change_time=CHANGE_TIME):
+    best = {source: departure}
+    ready = {source: departure}
+    for _ in range(rounds):
+        reached = {}
+        for _, _, calls in trips:
+            on_board = False
+            for station, arrival, leave in calls:
+                if on_board and arrival < reached.get(station, float('inf')):
+                    reached[station] = arrival
+                if ready.get(station, float('inf')) <= leave:
+                    on_board = True
+        for station, arrival in reached.items():
+            best[station] = min(best.get(station, float('inf')), arrival)
+            ready[station] = min(ready.get(station, float('inf')), arrival + change_time)
+    return best
+
+@pytest.mark.parametrize('seed', range(20))
+def test_earliest_arrival_matches_a_scan_of_every_trip(seed):
+    trips = random_trips(seed)
+    timetable = timetable_of(trips)
+    rng = random.Random(seed)
+    for source in timetable.stations:
+        departure = rng.randint(6 * 60, 9 * 60)
+        for max_transfers in (0, 1, None):
+            rounds = 8 if max_transfers is None else max_transfers + 1
+            expected = reference_arrivals(trips, source, departure, rounds)
+            assert arrival_times(timetable, source, departure, max_transfers) == expected
+            for goal in timetable.stations:
+                journey = earliest_arrival(timetable, source, goal, departure, max_transfers)
+                if goal not in expected:
+                    assert journey is None
+                    continue
+                path, lines, leave, arrival, transits, legs = journey
+                assert arrival == expected[goal], (source, goal, departure)
+                assert path[0] == source and path[-1] == goal
+                if legs:
+                    assert leave >= departure and transits == len(legs) - 1
+                    assert max_transfers is None or transits <= max_transfers
+                    for previous, leg in zip(legs, legs[1:]):
+                        assert previous[4] == leg[2] and previous[5] + CHANGE_TIME <= leg[3]
+
+@pytest.mark.parametrize('seed', range(20))
+def test_range_query_keeps_every_journey_not_beaten_by_a_later_one(seed):
+    timetable = timetable_of(random_trips(seed))
+    earliest, latest = 6 * 60, 9 * 60
+    for source in timetable.stations:
+        for goal in timetable.stations:
+            if source == goal:
+                continue
+            journeys = range_query(timetable, source, goal, earliest, latest)
+            assert [j[2] for j in journeys] == sorted(set(j[2] for j in journeys))
+            assert [j[3] for j in journeys] == sorted(set(j[3] for j in journeys))
+            # Leaving at any minute, the best journey is one of the range
+            for minute in range(earliest, latest + 1, 7):
+                journey = earliest_arrival(timetable, source, goal, minute)
+                later = [j[3] for j in journeys if j[2] >= minute]
+                if later:
+                    assert journey[3] == min(later), (source, goal, minute)
+                elif journey is not None:
+                    assert journey[2] > latest
+
+def test_unknown_station_has_no_journey():
+    timetable = timetable_of(random_trips(0))
+    assert earliest_arrival(timetable, 'S0', 'Nowhere', '08:00') is None
+    assert range_query(timetable, 'Nowhere', 'S0', '08:00', '09:00') == []
+    assert arrival_times(timetable, 'Nowhere', '08:00') == {}
+
+def test_sample_timetable(csv_path, tmp_path):
+    path = str(tmp_path / 'timetable.csv')
+    assert Timetable.open(path) is None
+    trips = generate_timetable(csv_path, path)
+    timetable = Timetable.open(path)
+    assert timetable.num_trips == trips
+    journey = earliest_arrival(timetable, 'Tokyo', 'Kanazawa', '08:10')
+    path, lines, departure, arrival, transits, legs = journey
+    assert path[0] == 'Tokyo' and path[-1] == 'Kanazawa'
+    assert departure >= parse_time('08:10') and arrival > departure
@@ -0,0 +1,37 @@
+# Tests for the precomputed route tables (route_table.py).
+
+import pandas as pd
+import pytest
+
+from route_table import TABLE_CRITERIA, RouteTable, lookup_or_search
+from router import optimal_search, shortest_path_tree
+
+@pytest.fixture(scope='module')
+def table(table_directory, csv_path):
+    return RouteTable.open(table_directory, csv_path)
+
+@pytest.mark.parametrize('criterion', TABLE_CRITERIA)
+def test_tables_agree_with_optimal_search(graph, table, key, criterion):
+    assert table.supports(criterion)
+    for start in graph.stations:
+        tree = shortest_path_tree(graph, start, criterion)
+        for goal in graph.stations:
+            g = graph.index(goal)
+            want = key(tree.route(goal), criterion)
+            assert key(table.route(graph, start, goal, criterion), criterion) == want, (start, goal)
+            value = table.value(graph.index(start), g, criterion)
+            assert value == (None if want is None else pytest.approx(tree.cost_to(g)))
+
+def test_stale_or_missing_tables_are_not_opened(table_directory, csv_path, tmp_path):
+    df = pd.read_csv(csv_path)
+    df.loc[0, 'Cost_(Yen)'] += 10
+    edited_csv = str(tmp_path / 'edited.csv')
+    df.to_csv(edited_csv, index=False)
+    assert RouteTable.open(table_directory, edited_csv) is None
+    assert RouteTable.open(str(tmp_path / 'missing'), csv_path) is None
+
+def test_lookup_falls_back_to_search(graph, table):
+    want = optimal_search(graph, 'Tokyo', 'Akita', ('transfers', 'cost'))
+    assert not table.supports(('transfers', 'cost'))
+    assert lookup_or_search(table, graph, 'Tokyo', 'Akita', ('transfers', 'cost')) == want
+    assert lookup_or_search(None, graph, 'Tokyo', 'Akita', 'fastest') == optimal_search(graph, 'Tokyo', 'Akita', 'fastest')
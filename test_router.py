@@ -0,0 +1,63 @@
+# Tests for the criterion-aware router (router.py).
+
+import heapq
+
+import pytest
+
+from router import PREFERENCES, optimal_search, resolve_criterion, shortest_path_tree
+
+CRITERIA = ['duration', 'cost', 'distance', ('transfers',), ('transfers', 'cost'), *PREFERENCES]
+
+@pytest.mark.parametrize('seed', range(10))
+def test_optimal_search_matches_brute_force(random_network, simple_routes, key, seed):
+    graph = random_network(seed)
+    for start in graph.stations:
+        for goal in graph.stations:
+            routes = simple_routes(graph, graph.index(start), graph.index(goal))
+            for criterion in CRITERIA:
+                want = min((tuple(totals[name] for name in resolve_criterion(criterion)) for totals in routes), default=None)
+                assert key(optimal_search(graph, start, goal, criterion), criterion) == want, (start, goal, criterion)
+
+# Plain Dijkstra on the row-by-row graph
+def dict_dijkstra(row_graph, start, goal, position):
+    best = {start: 0}
+    queue = [(0, start)]
+    while queue:
+        d, u = heapq.heappop(queue)
+        if u == goal:
+            return d
+        if d > best[u]:
+            continue
+        for edge in row_graph[u]:
+            nd = d + edge[position]
+            if edge[0] not in best or nd < best[edge[0]]:
+                best[edge[0]] = nd
+                heapq.heappush(queue, (nd, edge[0]))
+    return None
+
+@pytest.mark.parametrize('weight, position', [('distance', 2), ('cost', 3), ('duration', 4)])
+def test_weights_match_plain_dijkstra(graph, row_graph, key, weight, position):
+    for start in graph.stations[::3]:
+        for goal in graph.stations:
+            want = dict_dijkstra(row_graph, start, goal, position)
+            want = None if want is None else (round(want, 6),)
+            assert key(optimal_search(graph, start, goal, weight), weight) == want
+
+def test_tree_answers_like_single_searches(graph):
+    for start in graph.stations[::10]:
+        for criterion in ('fastest', 'cheapest', 'least_transit'):
+            tree = shortest_path_tree(graph, start, criterion)
+            for goal in graph.stations:
+                assert tree.route(goal) == optimal_search(graph, start, goal, criterion)
+
+def test_unknown_stations(graph):
+    assert optimal_search(graph, 'Tokyo', 'Nowhere')[0] is None
+    with pytest.raises(KeyError):
+        shortest_path_tree(graph, 'Nowhere')
+
+def test_criteria_are_validated():
+    assert resolve_criterion('fastest') == PREFERENCES['fastest']
+    assert resolve_criterion('cost') == ('cost',)
+    for criterion in ('quickest', (), ('duration', 'speed')):
+        with pytest.raises(ValueError):
+            resolve_criterion(criterion)
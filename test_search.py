@@ -0,0 +1,98 @@
+# Tests for the route searches (search.py): on every station pair they must
+# return exactly the tuples of the searches they replaced, which ran on the
+# row-by-row dictionary graph. least_transits_search counts transfers exactly
+# since the line-expanded graph, so it is tested in test_line_graph.py.
+
+import heapq
+from collections import deque
+
+import pandas as pd
+import pytest
+
+from graph import build_graph
+from search import NOT_FOUND, best_first_search, bfs, dijkstra_search, least_transits_search
+
+# ------------------------------------------------------------------------------------
+#                                 ORIGINAL SEARCHES
+# ------------------------------------------------------------------------------------
+
+def reference_bfs(graph, start, goal):
+    queue = deque([(start, [start], [], 0, 0, 0, 0)])
+    visited = set([start])
+    while queue:
+        current, path, lines, total_distance, total_cost, total_duration, transit_count = queue.popleft()
+        if current == goal:
+            return path, lines, total_distance, total_cost, total_duration, transit_count
+        for neighbor, line, dist, cost, dur in graph[current]:
+            if neighbor not in visited:
+                visited.add(neighbor)
+                new_transit_count = transit_count
+                new_lines = lines.copy()
+                if not lines or lines[-1] != line:
+                    new_lines.append(line)
+                    new_transit_count += 1 if lines else 0
+                queue.append((neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
+    return NOT_FOUND
+
+# best_first_search orders by the last arc's distance, dijkstra_search by the
+# distance so far
+def reference_heap_search(graph, start, goal, cumulative):
+    queue = [(0, start, [start], [], 0, 0, 0, 0)]
+    visited = set()
+    while queue:
+        _, current, path, lines, total_distance, total_cost, total_duration, transit_count = heapq.heappop(queue)
+        if current == goal:
+            return path, lines, total_distance, total_cost, total_duration, transit_count
+        if current not in visited:
+            visited.add(current)
+            for neighbor, line, dist, cost, dur in graph[current]:
+                if neighbor not in visited:
+                    new_transit_count = transit_count
+                    new_lines = lines.copy()
+                    if not lines or lines[-1] != line:
+                        new_lines.append(line)
+                        new_transit_count += 1 if lines else 0
+                    priority = total_distance if cumulative else dist
+                    heapq.heappush(queue, (priority, neighbor, path + [neighbor], new_lines, total_distance + dist, total_cost + cost, total_duration + dur, new_transit_count))
+    return NOT_FOUND
+
+# ------------------------------------------------------------------------------------
+#                                       TESTS
+# ------------------------------------------------------------------------------------
+
+SEARCHES = [
+    (bfs, reference_bfs),
+    (best_first_search, lambda graph, start, goal: reference_heap_search(graph, start, goal, False)),
+    (dijkstra_search, lambda graph, start, goal: reference_heap_search(graph, start, goal, True)),
+]
+
+@pytest.mark.parametrize('search, reference', SEARCHES, ids=[search.__name__ for search, _ in SEARCHES])
+def test_same_routes_as_the_original_searches(graph, row_graph, search, reference):
+    for start in graph.stations:
+        for goal in graph.stations:
+            assert search(graph, start, goal) == reference(row_graph, start, goal), (start, goal)
+
+def test_unknown_station_is_not_found(graph):
+    for search in [least_transits_search] + [search for search, _ in SEARCHES]:
+        assert search(graph, 'Tokyo', 'Nowhere') == NOT_FOUND
+        assert search(graph, 'Nowhere', 'Tokyo') == NOT_FOUND
+
+# A size x size grid where every segment is served by two lines with equal
+# weights, so the heap searches meet many ties between their entries
+def tied_grid(size):
+    rows = []
+    for i in range(size):
+        for j in range(size):
+            for di, dj in ((0, 1), (1, 0)):
+                if i + di < size and j + dj < size:
+                    for line in ('Line_A', 'Line_B'):
+                        rows.append((f'S{i:02d}_{j:02d}', f'S{i + di:02d}_{j + dj:02d}', line, 10.0, 1000, 5))
+    return build_graph(pd.DataFrame(rows, columns=['Source_Stations', 'Destination_Stations', 'Line', 'Distance_(Km)', 'Cost_(Yen)', 'Durations_(Min)']))
+
+@pytest.mark.parametrize('search, reference', SEARCHES, ids=[search.__name__ for search, _ in SEARCHES])
+def test_ties_break_like_the_original_searches(search, reference):
+    grid = tied_grid(8)
+    adjacency = {name: grid.edges(name) for name in grid.stations}
+    for start in grid.stations[::7]:
+        for goal in grid.stations[::5]:
+            assert search(grid, start, goal) == reference(adjacency, start, goal), (start, goal)
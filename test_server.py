@@ -0,0 +1,136 @@
+# Tests for the route server (server.py): status codes of every endpoint,
+# workers pinned to the server's version of the dataset, and reloading when
+# it changes. Each test runs a server on a free port.
+
+import asyncio
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from graph import file_hash, load_versioned_graph, save_snapshot
+from router import optimal_search
+from server import RouteServer, _init_worker, _route
+
+# Send one request and return (status, body)
+async def request(port, target, method='GET'):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode().partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    writer.close()
+    return int(status_line.split()[1]), json.loads(body)
+
+# Run `check(route_server, port)` against a started server on `csv_path`
+def run_server(csv_path, table_directory, check, watch_interval=3600):
+    async def main():
+        route_server = RouteServer(csv_path, table_directory, workers=1, watch_interval=watch_interval)
+        await route_server.start()
+        server = await asyncio.start_server(route_server.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            await check(route_server, port)
+        finally:
+            server.close()
+            await route_server.close()
+    asyncio.run(main())
+
+def test_status_codes(graph, csv_path, tmp_path):
+    async def check(route_server, port):
+        status, body = await request(port, '/route?start=Tokyo&goal=Kanazawa&criterion=cheapest')
+        assert status == 200
+        path, lines, distance, cost, duration, transits = optimal_search(graph, 'Tokyo', 'Kanazawa', 'cheapest')
+        assert (body['route'], body['cost'], body['duration'], body['criterion']) == (path, cost, duration, 'cheapest')
+
+        assert (await request(port, '/route?start=Tokyo'))[0] == 400
+        assert (await request(port, '/route?start=Tokyo&goal=Kanazawa&criterion=scenic'))[0] == 400
+        assert (await request(port, '/route?start=Tokyo&goal=Nowhere'))[0] == 404
+        assert (await request(port, '/elsewhere'))[0] == 404
+        assert (await request(port, '/route?start=Tokyo&goal=Kanazawa', 'POST'))[0] == 405
+
+        status, body = await request(port, '/health')
+        assert status == 200 and body == {'status': 'ok', 'version': file_hash(csv_path), 'stations': graph.num_stations}
+        status, body = await request(port, '/metrics')
+        assert status == 200
+        assert body['requests'] == 7 and body['errors'] == 0
+        assert body['by_status'] == {'200': 2, '400': 2, '404': 2, '405': 1}
+    run_server(csv_path, str(tmp_path), check)
+
+# Run the watcher until it has swapped in a new pool
+async def wait_for_reload(route_server):
+    watcher = asyncio.create_task(route_server.watch())
+    try:
+        while route_server.reloads == 0:
+            await asyncio.sleep(0.05)
+    finally:
+        watcher.cancel()
+
+def test_reload_serves_the_new_dataset(csv_path, tmp_path):
+    data = str(tmp_path / 'shinkansen.csv')
+    shutil.copy(csv_path, data)
+
+    async def check(route_server, port):
+        old_version = route_server.version
+        assert (await request(port, '/route?start=Tokyo&goal=Testville'))[0] == 404
+
+        df = pd.read_csv(data)
+        extra = df.iloc[[0]].copy()
+        extra['Destination_Stations'] = 'Testville'
+        pd.concat([df, extra]).to_csv(data, index=False)
+        await asyncio.wait_for(wait_for_reload(route_server), 60)
+
+        status, body = await request(port, '/route?start=Tokyo&goal=Testville')
+        assert status == 200 and body['route'] == ['Tokyo', 'Testville']
+        status, body = await request(port, '/health')
+        assert body['version'] == file_hash(data) != old_version
+        assert (await request(port, '/metrics'))[1]['reloads'] == 1
+
+        # A dataset that cannot be loaded leaves the server on the last good one
+        with open(data, 'w') as f:
+            f.write("not,a,timetable\n")
+        assert not await route_server.reload()
+        assert route_server.version == body['version']
+        assert (await request(port, '/route?start=Tokyo&goal=Testville'))[0] == 200
+    run_server(data, str(tmp_path), check, watch_interval=0.05)
+
+# Workers start on the version the server loaded, even when the CSV has
+# changed since; the watcher is what moves the server on to the new data
+def test_workers_serve_the_servers_version(graph, csv_path, tmp_path):
+    data = str(tmp_path / 'shinkansen.csv')
+    shutil.copy(csv_path, data)
+
+    async def check(route_server, port):
+        version, directory = route_server.version, route_server._snapshot_directory
+        df = pd.read_csv(data)
+        df['Durations_(Min)'] *= 2
+        df.to_csv(data, index=False)
+
+        # The pool starts its worker on this first request
+        status, body = await request(port, '/route?start=Tokyo&goal=Kanazawa')
+        assert status == 200 and body['duration'] == optimal_search(graph, 'Tokyo', 'Kanazawa', 'fastest')[4]
+        assert (await request(port, '/health'))[1]['version'] == version != file_hash(data)
+
+        await route_server.close()
+        assert not os.path.exists(directory)
+    run_server(data, str(tmp_path), check)
+
+def test_worker_refuses_a_snapshot_of_another_version(csv_path, tmp_path):
+    graph, version = load_versioned_graph(csv_path)
+    snapshot = str(tmp_path / 'pool.npz')
+    save_snapshot(graph, snapshot, version)
+    with pytest.raises(RuntimeError):
+        _init_worker(csv_path, str(tmp_path), snapshot, '0' * 64)
+    with pytest.raises(RuntimeError):
+        _init_worker(csv_path, str(tmp_path), str(tmp_path / 'missing.npz'), version)
+    _init_worker(csv_path, str(tmp_path), snapshot, version)
+    assert _route('Tokyo', 'Kanazawa', 'fastest') == optimal_search(graph, 'Tokyo', 'Kanazawa', 'fastest')
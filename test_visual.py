@@ -0,0 +1,63 @@
+# Tests for the headless renderer (visual.py).
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import visual
+from graph import build_graph
+from router import optimal_search
+from synthetic import generate_frame
+from visual import compute_layout, custom_positions, layout_path, load_layout, render
+
+def test_layout_keeps_the_hand_made_positions(graph):
+    positions = compute_layout(graph)
+    assert positions.shape == (graph.num_stations, 2) and np.all(np.isfinite(positions))
+    for v, name in enumerate(graph.stations):
+        if name.strip() in custom_positions:
+            assert tuple(positions[v]) == custom_positions[name.strip()]
+
+def test_free_stations_get_distinct_positions():
+    graph = build_graph(generate_frame(2000))
+    positions = compute_layout(graph, fixed={})
+    assert np.all(np.isfinite(positions))
+    assert len(np.unique(np.round(positions, 9), axis=0)) == graph.num_stations
+
+def test_layout_cache_follows_the_csv(graph, csv_path, tmp_path, monkeypatch):
+    data = str(tmp_path / 'shinkansen.csv')
+    shutil.copy(csv_path, data)
+    directory = str(tmp_path / 'layouts')
+    positions = load_layout(graph, data, directory)
+    assert os.path.exists(layout_path(data, directory))
+
+    computed = []
+    monkeypatch.setattr(visual, 'compute_layout', lambda graph: computed.append(graph) or positions)
+    assert np.array_equal(load_layout(graph, data, directory), positions)
+    assert computed == []
+
+    df = pd.read_csv(data)
+    df.loc[0, 'Durations_(Min)'] += 1
+    df.to_csv(data, index=False)
+    load_layout(graph, data, directory)
+    assert len(computed) == 1
+
+@pytest.mark.parametrize('extension, magic', [('png', b'\x89PNG'), ('svg', b'<?xml')])
+def test_render_writes_the_file(graph, tmp_path, extension, magic):
+    output = str(tmp_path / f'network.{extension}')
+    route = optimal_search(graph, 'Tokyo', 'Kanazawa', 'fastest')
+    render(graph, compute_layout(graph), output, route, dpi=30)
+    with open(output, 'rb') as f:
+        assert f.read(len(magic)) == magic
+    if extension == 'svg':
+        with open(output) as f:
+            assert 'Tokyo -&gt; Kanazawa' in f.read()
+
+def test_render_a_large_network_without_labels(tmp_path):
+    graph = build_graph(generate_frame(5000))
+    output = str(tmp_path / 'synthetic.svg')
+    render(graph, compute_layout(graph, fixed={}), output, dpi=30)
+    with open(output) as f:
+        assert graph.stations[0] not in f.read()
@@ -1,28 +1,32 @@
-# File to visualize the Shinkansesn route graph
-
-import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
-
-# Load CSV file
-df = pd.read_csv("shinkansen.csv")
-
-# Create a directed multi-graph
-G = nx.MultiDiGraph()
-
-# Add nodes and edges from the CSV file
-for _, row in df.iterrows():
-    source = row["Source_Stations"]
-    destination = row["Destination_Stations"]
-    line = row["Line"]
-    distance = row["Distance_(Km)"]
-    cost = row["Cost_(Yen)"]
-    duration = row["Durations_(Min)"]
-    
-    # Add edge with attributes for each route
-    G.add_edge(source, destination, line=line, distance=distance, cost=cost, duration=duration)
+# Renderer for the Shinkansen route graph.
+#
+# Draws the network without a display, so it also runs on headless servers:
+#   - every segment goes into one LineCollection and every station into one
+#     scatter call, so a 100k-segment network draws in seconds,
+#   - the layout is computed once per dataset and cached under layouts/,
+#     tagged with the CSV's hash like the graph snapshots,
+#   - the figure is saved as PNG or SVG (by the output's extension), or shown
+#     in a window when no output is given,
+#   - a route from the searches can be drawn on top.
+# Station names and segment labels are only drawn on small networks, where
+# they stay readable.
+#
+#     python visual.py --output shinkansen.png
+#     python visual.py --output route.svg --route Tokyo Kanazawa --criterion fastest
+#     python visual.py --csv synthetic_100k.csv --output synthetic.png
+
+import argparse
+import os
+
+import numpy as np
 
-# Example of manually setting positions
+from graph import CSV_PATH, file_hash, load_graph
+from router import optimal_search
+
+LAYOUT_DIRECTORY = 'layouts'
+LABEL_LIMIT = 300  # Largest network (stations, segments) whose labels are drawn
+
+# Hand-made schematic positions of the real stations
 custom_positions = {
     # Tokaido Shinkansen (East to West)
     "Tokyo": (0, 3),
@@ -108,22 +112,202 @@ custom_positions = {
     "Niigata": (-4, 9),
 }
 
+# ------------------------------------------------------------------------------------
+#                                       LAYOUT
+# ------------------------------------------------------------------------------------
+
+# Station id pairs (u < v) joined by at least one arc, one row per pair
+def _pairs(graph):
+    tails, heads = graph.tails().astype(np.int64), graph.neighbors.astype(np.int64)
+    pairs = np.unique(np.column_stack([np.minimum(tails, heads), np.maximum(tails, heads)]), axis=0)
+    return pairs[pairs[:, 0] != pairs[:, 1]]
+
+# Positions for every station as float64[n, 2]. Stations in `fixed` (matched
+# on their stripped name) keep their position. The others are laid out as
+# radial trees: a breadth-first search from the fixed stations, or from the
+# best connected station of a component without any, gives each station an
+# angle sector in proportion to the size of its subtree and a radius of its
+# depth. Components without fixed stations are placed in a row underneath.
+def compute_layout(graph, fixed=custom_positions):
+    n = graph.num_stations
+    positions = np.full((n, 2), np.nan)
+    for v, name in enumerate(graph.stations):
+        if name.strip() in fixed:
+            positions[v] = fixed[name.strip()]
+
+    pairs = _pairs(graph)
+    ends = np.concatenate([pairs, pairs[:, ::-1]])
+    ends = ends[np.argsort(ends[:, 0], kind='stable')]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends[:, 0], minlength=n), out=offsets[1:])
+    offsets, neighbors = offsets.tolist(), ends[:, 1].tolist()
+    degree = np.diff(offsets)
+
+    parent = [-1] * n
+    depth = [0] * n
+    visited = [False] * n
+    order = []
+
+    def search(roots):
+        frontier = list(roots)
+        for root in roots:
+            visited[root] = True
+        while frontier:
+            order.extend(frontier)
+            next_frontier = []
+            for u in frontier:
+                for i in range(offsets[u], offsets[u + 1]):
+                    v = neighbors[i]
+                    if not visited[v]:
+                        visited[v] = True
+                        parent[v] = u
+                        depth[v] = depth[u] + 1
+                        next_frontier.append(v)
+            frontier = next_frontier
+
+    anchored = np.flatnonzero(~np.isnan(positions[:, 0])).tolist()
+    search(anchored)
+    roots = list(anchored)
+    # Free components, each from its best connected station
+    for v in np.argsort(-degree, kind='stable').tolist():
+        if not visited[v]:
+            roots.append(v)
+            search([v])
+
+    # Subtree sizes bottom-up, then angle sectors top-down
+    size = [1] * n
+    for v in reversed(order):
+        if parent[v] != -1:
+            size[parent[v]] += size[v]
+    children = [[] for _ in range(n)]
+    for v in order:
+        if parent[v] != -1:
+            children[parent[v]].append(v)
+    start, width = [0.0] * n, [2 * np.pi] * n
+    for v in order:
+        cursor = start[v]
+        for child in children[v]:
+            start[child] = cursor
+            width[child] = width[v] * size[child] / (size[v] - 1)
+            cursor += width[child]
+
+    # Fixed stations sit on the hand-made grid, whose spacing is 0.5
+    root_of = list(range(n))
+    for v in order:
+        if parent[v] != -1:
+            root_of[v] = root_of[parent[v]]
+    step = np.where(np.isnan(positions[:, 0])[root_of], 1.0, 0.25)
+    angle = np.array(start) + np.array(width) / 2
+    radius = np.array(depth) * step
+
+    # Free components in a row below everything fixed
+    x = 0.0
+    bottom = np.nanmin(positions[:, 1]) - 2 if anchored else 0.0
+    root_of = np.array(root_of)
+    for root in roots[len(anchored):]:
+        extent = max(1.0, float(radius[root_of == root].max()))
+        positions[root] = (x + extent, bottom - extent)
+        x += 2 * extent + 1
+
+    centre = positions[root_of]
+    free = np.isnan(positions[:, 0])
+    positions[free] = centre[free] + radius[free, None] * np.column_stack([np.cos(angle), np.sin(angle)])[free]
+    return positions
+
+def layout_path(csv_path=CSV_PATH, directory=LAYOUT_DIRECTORY):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(directory, f"{stem}.npz")
+
+# The layout of the dataset, from its cache file when that was computed for
+# the same CSV. Pass directory=None to always compute it.
+def load_layout(graph, csv_path=CSV_PATH, directory=LAYOUT_DIRECTORY):
+    if directory is None:
+        return compute_layout(graph)
+    csv_hash = file_hash(csv_path)
+    path = layout_path(csv_path, directory)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['csv_hash']) == csv_hash and data['stations'].tolist() == graph.stations:
+                return data['positions']
+    except (OSError, KeyError, ValueError):
+        pass
+    positions = compute_layout(graph)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, csv_hash=np.array(csv_hash), stations=np.array(graph.stations, dtype=str), positions=positions)
+        os.replace(temporary, path)
+    except OSError:
+        pass  # Read-only checkout: lay it out again next time
+    return positions
+
+# ------------------------------------------------------------------------------------
+#                                      RENDERING
+# ------------------------------------------------------------------------------------
+
+# Draw the network, and `route` (a result tuple from the searches) on top.
+# Saves to `output` (format from its extension) or, without one, opens a window.
+def render(graph, positions, output=None, route=None, title="Shinkansen Routes Visualization", figsize=(15, 10), dpi=150):
+    from matplotlib.collections import LineCollection
+
+    if output is None:
+        import matplotlib.pyplot as plt
+
+        figure = plt.figure(figsize=figsize)
+    else:
+        # A bare Figure renders through Agg/SVG directly, without pyplot or a display
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=figsize)
+    axes = figure.add_subplot()
+    n = graph.num_stations
+    pairs = _pairs(graph)
+    small = n <= LABEL_LIMIT and len(pairs) <= LABEL_LIMIT
 
-# Update the pos parameter in the drawing functions
-plt.figure(figsize=(15, 10))
+    axes.add_collection(LineCollection(positions[pairs], colors='gray', linewidths=1 if small else 0.3, zorder=1))
+    axes.scatter(positions[:, 0], positions[:, 1], s=200 if small else max(0.5, 20000 / n), c='skyblue', zorder=2, linewidths=0)
+    if small:
+        for v, name in enumerate(graph.stations):
+            axes.text(positions[v, 0], positions[v, 1], name, fontsize=8, ha='center', va='center', zorder=4)
+        # One label per station pair, like the old edge labels
+        offsets, neighbors, line_ids, _, _, duration = graph.as_lists()
+        labels = {}
+        for u in range(n):
+            for e in range(offsets[u], offsets[u + 1]):
+                labels[min(u, neighbors[e]), max(u, neighbors[e])] = f"{graph.lines[line_ids[e]]} ({duration[e]} min)"
+        for (u, v), label in labels.items():
+            x, y = (positions[u] + positions[v]) / 2
+            axes.text(x, y, label, fontsize=6, ha='center', va='center', zorder=3,
+                      bbox={'boxstyle': 'round', 'facecolor': 'white', 'edgecolor': 'none', 'alpha': 0.7})
 
-# Use custom positions if available; fallback to spring_layout for others
-pos = {node: custom_positions.get(node, pos) for node, pos in nx.spring_layout(G, seed=42).items()}
+    if route is not None and route[0]:
+        path, lines, distance, cost, duration, transits = route
+        points = positions[[graph.index(name) for name in path]]
+        axes.plot(points[:, 0], points[:, 1], color='crimson', linewidth=3, zorder=5)
+        axes.scatter(points[[0, -1], 0], points[[0, -1], 1], s=120, c='crimson', zorder=6)
+        title += f"\n{path[0]} -> {path[-1]}: {' -> '.join(line.strip() for line in lines)}, {duration} min, {cost} yen, {transits} transits"
 
-# Draw nodes and edges using the custom positions
-nx.draw_networkx_nodes(G, pos, node_size=200, node_color="skyblue")
-nx.draw_networkx_edges(G, pos, arrowstyle="->", arrowsize=10, edge_color="gray", width=1)
-nx.draw_networkx_labels(G, pos, font_size=8, font_family="sans-serif")
+    axes.autoscale()
+    axes.set_axis_off()
+    axes.set_title(title)
+    if output is None:
+        plt.show()
+    else:
+        figure.savefig(output, dpi=dpi, bbox_inches='tight')
 
-# Customizing edge labels
-edge_labels = {(u, v): f"{d['line']} ({d['duration']} min)" for u, v, d in G.edges(data=True)}
-nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=6)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Draw the route graph")
+    parser.add_argument('--csv', default=CSV_PATH)
+    parser.add_argument('--output', default=None, help="PNG or SVG file; opens a window if omitted")
+    parser.add_argument('--route', nargs=2, metavar=('START', 'GOAL'), default=None, help="draw the best route between two stations")
+    parser.add_argument('--criterion', default='fastest')
+    parser.add_argument('--layouts', default=LAYOUT_DIRECTORY, help="layout cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="compute the layout without reading or writing the cache")
+    parser.add_argument('--dpi', type=int, default=150)
+    args = parser.parse_args()
 
-# Display the plot
-plt.title("Shinkansen Routes Visualization")
-plt.show()
+    graph = load_graph(args.csv)
+    positions = load_layout(graph, args.csv, None if args.no_cache else args.layouts)
+    route = optimal_search(graph, args.route[0], args.route[1], args.criterion) if args.route else None
+    render(graph, positions, args.output, route, dpi=args.dpi)